@@ -2,11 +2,15 @@ import aidac.dataframe.frame_wrapper as frame
 # from aidac.dataframe.LocalTable import read_csv
 from aidac.dataframe.Scheduler import Scheduler
 from aidac.data_source.DataSourceManager import *
+from aidac.exec.ResultCache import result_cache, DEFAULT_MAX_BYTES, DEFAULT_TTL
+from aidac.common.block_manager import block_manager, DEFAULT_MEMORY_BUDGET
+from aidac.data_source.DataSource import local_ds
 
 __name__ = 'aidac'
 
-def add_data_source(source: str, host: str, user: str, password: str, db: str, job_name: str = None, port: str = None):
-    manager.add_data_source(source, host, user, password, db, job_name, port)
+def add_data_source(source: str, host: str, user: str, password: str, db: str, job_name: str = None, port: str = None,
+                    **options):
+    manager.add_data_source(source, host, user, password, db, job_name, port, **options)
 
 
 def data_sources():
@@ -35,3 +39,48 @@ def read_remote_data(job: str, table_name: str):
     """
     source = manager.get_data_source(job)
     return frame.create_remote_table(source, table_name)
+
+
+def enable_result_cache(enabled: bool = True, max_bytes=DEFAULT_MAX_BYTES, ttl=DEFAULT_TTL):
+    """
+    Reuse the results of lineages computed before. A table changed other than through aidac is only noticed once
+    the ttl expires or invalidate_results is called, so the cache is disabled by default
+    @param enabled: whether results are cached, disabling drops the cached results
+    @param max_bytes: size of the cached results
+    @param ttl: seconds a result is reused, None to keep it until it is evicted or invalidated
+    @return:
+    """
+    result_cache.configure(enabled, max_bytes, ttl)
+
+
+def invalidate_results(job: str = None, table: str = None):
+    """
+    Drop cached results after a table was changed other than through aidac
+    @param job: data source of the table, all cached results are dropped if not given
+    @param table: changed table, all tables of the data source if not given
+    @return:
+    """
+    if job is None:
+        result_cache.clear()
+    else:
+        manager.get_data_source(job).invalidate_results(table)
+
+
+def set_memory_budget(memory_budget=DEFAULT_MEMORY_BUDGET, spill_dir: str = None):
+    """
+    Bound the memory used by materialized intermediate results, the least recently used ones are spilled to disk
+    @param memory_budget: bytes kept in memory, None to never spill
+    @param spill_dir: directory of the spilled results, a temporary directory if not given
+    @return:
+    """
+    block_manager.configure(memory_budget, spill_dir)
+
+
+def set_local_engine(engine: str):
+    """
+    Set how lineages on local frames are executed
+    @param engine: 'pandas' to replay the pandas calls, 'fused' to evaluate chains of filters, projections and heads
+    in one numpy pass, 'sqlite' to run the generated SQL of filters and projections in an in-memory SQLite
+    @return:
+    """
+    local_ds.set_engine(engine)
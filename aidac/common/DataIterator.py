@@ -1,9 +1,15 @@
-import numpy as np
+import pandas as pd
 
 
-def generator(data):
-    for row in data.to_numpy():
-        if row.dtype == np.int32 or np.int64:
-            row = row.astype(str)
-        yield row
+def _text(values):
+    """
+    @return: the values as text, nulls as None so that they are written as NULL
+    """
+    return [None if pd.api.types.is_scalar(v) and pd.isna(v) else str(v) for v in values]
+
 
+def generator(data):
+    # copy.write_row of the row by row transfer sends every value as text, each column keeps its own type so an
+    # integer column next to a float column is not written as 1.0
+    columns = [_text(data.iloc[:, idx].tolist()) for idx in range(data.shape[1])]
+    yield from zip(*columns)
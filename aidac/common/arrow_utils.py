@@ -0,0 +1,56 @@
+from __future__ import annotations
+
+import collections
+import io
+
+import pandas as pd
+
+try:
+    # optional, results are kept in numpy columns without it
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+except ImportError:
+    pa = None
+    pa_csv = None
+
+
+def available() -> bool:
+    return pa is not None
+
+
+def table_from_columns(table: collections.OrderedDict):
+    """
+    build an arrow table from decoded result columns, the buffers of numeric columns are wrapped without a copy
+    @param table: ordered dict of column name -> numpy array
+    @return: pyarrow Table
+    """
+    # python objects (text, dates, decimals) are converted once, None and NaN become null
+    arrays = [pa.array(arr, from_pandas=True) for arr in table.values()]
+    return pa.Table.from_arrays(arrays, names=list(table.keys()))
+
+
+def to_pandas(table) -> pd.DataFrame:
+    """
+    @param table: pyarrow Table
+    @return: dataframe whose columns are backed by the buffers of the arrow table
+    """
+    return table.to_pandas(types_mapper=pd.ArrowDtype)
+
+
+def is_arrow_backed(data: pd.DataFrame) -> bool:
+    return pa is not None and any(isinstance(dtype, pd.ArrowDtype) for dtype in data.dtypes)
+
+
+def csv_chunks(data: pd.DataFrame, chunksize: int):
+    """
+    serialize a dataframe into csv straight from its arrow buffers, nulls are written as unquoted empty fields
+    @param data:
+    @param chunksize: number of rows per buffer
+    @return: generator of csv bytes
+    """
+    table = pa.Table.from_pandas(data, preserve_index=False)
+    options = pa_csv.WriteOptions(include_header=False)
+    for batch in table.to_batches(max_chunksize=chunksize):
+        buf = io.BytesIO()
+        pa_csv.write_csv(batch, buf, options)
+        yield buf.getvalue()
@@ -0,0 +1,158 @@
+from __future__ import annotations
+
+import collections
+import os
+import shutil
+import tempfile
+import threading
+import weakref
+
+import numpy as np
+import pandas as pd
+
+# bytes of materialized results kept in memory before the least recently used ones are spilled to disk
+DEFAULT_MEMORY_BUDGET = 2 * 1024 ** 3
+# results smaller than this stay plain in memory dataframes
+MIN_BLOCK_BYTES = 1024 * 1024
+# numpy kinds (bool, int, uint, float, complex, timedelta, datetime) stored as raw arrays that can be memory mapped
+_MAPPABLE_KINDS = 'biufcmM'
+
+
+def _nbytes(data: pd.DataFrame) -> int:
+    return int(data.memory_usage(index=True, deep=False).sum())
+
+
+class Block:
+    """
+    A materialized result stored column by column. A resident block holds its dataframe, a spilled block holds
+    one file per column. Reading a spilled block maps the files back, the pages of a column are only read
+    from disk when an operation touches them.
+    """
+    def __init__(self, manager: BlockManager, data: pd.DataFrame):
+        self.manager = manager
+        self.nbytes = _nbytes(data)
+        self.data = data
+        # directory of the column files once spilled
+        self.path = None
+        # dataframe over the memory mapped column files
+        self.mapped = None
+
+    def get(self) -> pd.DataFrame:
+        return self.manager.fetch(self)
+
+    @property
+    def spilled(self) -> bool:
+        return self.path is not None
+
+
+class BlockManager:
+    """
+    Keeps the materialized intermediate results under a memory budget: the least recently used blocks are spilled
+    to memory mapped files in spill_dir (a temporary directory by default) and paged back in lazily.
+    The files of a block are removed when the block is no longer referenced.
+    """
+    def __init__(self, memory_budget=DEFAULT_MEMORY_BUDGET, spill_dir=None):
+        """
+        @param memory_budget: bytes of resident blocks, None to never spill
+        @param spill_dir: directory the spilled blocks are written to
+        """
+        self.memory_budget = memory_budget
+        self.spill_dir = spill_dir
+        # id of block -> weak reference to a resident block, in least recently used order
+        self._resident = collections.OrderedDict()
+        self._used = 0
+        self._lock = threading.RLock()
+
+    def configure(self, memory_budget=DEFAULT_MEMORY_BUDGET, spill_dir=None):
+        with self._lock:
+            self.memory_budget = memory_budget
+            self.spill_dir = spill_dir
+            self._evict()
+
+    @property
+    def used(self) -> int:
+        """
+        @return: bytes of the resident blocks
+        """
+        return self._used
+
+    def put(self, data):
+        """
+        register a materialized result
+        @param data:
+        @return: a block holding the data, the data itself if it is too small to be spilled
+        """
+        if not isinstance(data, pd.DataFrame) or _nbytes(data) < MIN_BLOCK_BYTES:
+            return data
+        block = Block(self, data)
+        with self._lock:
+            self._resident[id(block)] = weakref.ref(block)
+            self._used += block.nbytes
+            weakref.finalize(block, self._release, id(block), block.nbytes)
+            self._evict(keep=block)
+        return block
+
+    def fetch(self, block: Block) -> pd.DataFrame:
+        with self._lock:
+            if block.data is not None:
+                self._resident.move_to_end(id(block))
+                return block.data
+            if block.mapped is None:
+                block.mapped = self._load(block.path)
+            return block.mapped
+
+    def _release(self, key, nbytes):
+        with self._lock:
+            if self._resident.pop(key, None) is not None:
+                self._used -= nbytes
+
+    def _evict(self, keep: Block = None):
+        """
+        spill the least recently used blocks until the resident ones fit into the budget
+        @param keep: block that is not spilled, e.g. the one just added
+        """
+        if self.memory_budget is None:
+            return
+        for key in list(self._resident):
+            if self._used <= self.memory_budget:
+                break
+            block = self._resident[key]()
+            if block is None or block is keep:
+                continue
+            self._spill(block)
+            del self._resident[key]
+            self._used -= block.nbytes
+
+    def _spill(self, block: Block):
+        path = tempfile.mkdtemp(prefix='aidac_block_', dir=self.spill_dir)
+        data = block.data
+        for i, (_, series) in enumerate(data.items()):
+            arr = series.to_numpy() if isinstance(series.dtype, np.dtype) else None
+            if arr is not None and arr.dtype.kind in _MAPPABLE_KINDS:
+                np.save(os.path.join(path, '{}.npy'.format(i)), arr)
+            else:
+                # python objects and extension arrays cannot be mapped, they are read back as a whole
+                series.to_pickle(os.path.join(path, '{}.pkl'.format(i)))
+        pd.to_pickle((list(data.columns), data.index), os.path.join(path, 'layout.pkl'))
+        block.path = path
+        block.data = None
+        weakref.finalize(block, shutil.rmtree, path, True)
+
+    @staticmethod
+    def _load(path) -> pd.DataFrame:
+        columns, index = pd.read_pickle(os.path.join(path, 'layout.pkl'))
+        arrays = {}
+        for i in range(len(columns)):
+            file = os.path.join(path, '{}.npy'.format(i))
+            if os.path.exists(file):
+                # copy on write, changes to the dataframe do not reach the file
+                arrays[i] = np.load(file, mmap_mode='c')
+            else:
+                arrays[i] = pd.read_pickle(os.path.join(path, '{}.pkl'.format(i))).array
+        # without copy the columns are not consolidated, so they stay backed by the mapped files
+        data = pd.DataFrame(arrays, index=index, copy=False)
+        data.columns = columns
+        return data
+
+
+block_manager = BlockManager()
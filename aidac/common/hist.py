@@ -1,8 +1,70 @@
+from __future__ import annotations
+
+import numpy as np
+import pandas as pd
+
+# number of most common values kept for a local column, the same as the default statistics target of postgres
+MAX_MCV = 100
+
+
+def mcv_key(val):
+    """
+    normalize a most common value so that values reported by a database (as text) and local values compare equal
+    """
+    if isinstance(val, (bool, np.bool_)):
+        return str(val).lower()
+    try:
+        return float(val)
+    except (TypeError, ValueError):
+        return str(val)
+
+
 class Histgram:
-    def __init__(self, table_name=None, null_frac=0, n_distinct=0, mcv=None):
+    def __init__(self, table_name=None, null_frac=0, n_distinct=0, mcv=None, mcf=None):
+        """
+        @param table_name:
+        @param null_frac: fraction of null values
+        @param n_distinct: number of distinct values
+        @param mcv: most common values
+        @param mcf: frequencies of the most common values, as fractions of all rows
+        """
         self.table_name = table_name
         self.null_frac = null_frac
         self.n_distinct = n_distinct
         self.mcv = mcv
+        self.mcf = mcf
+
+    @classmethod
+    def from_values(cls, table_name, values: pd.Series, max_mcv: int = MAX_MCV) -> Histgram:
+        """
+        compute the statistics of a local column
+        @param table_name:
+        @param values:
+        @param max_mcv: maximum number of most common values kept
+        @return:
+        """
+        total = len(values)
+        if total == 0:
+            return cls(table_name, 0, 0)
+        nulls = values.isnull().to_numpy()
+        arr = values.to_numpy()[~nulls]
+        try:
+            uniq, counts = np.unique(arr, return_counts=True)
+        except TypeError:
+            # values of mixed types cannot be sorted
+            counts_s = pd.Series(arr).value_counts()
+            uniq, counts = counts_s.index.to_numpy(), counts_s.to_numpy()
 
+        # like postgres, only values occurring more than once are common values
+        order = np.argsort(-counts, kind='stable')[:max_mcv]
+        order = order[counts[order] > 1]
+        return cls(table_name, nulls.sum() / total, len(uniq),
+                   [uniq[i] for i in order], [counts[i] / total for i in order])
 
+    def common_freqs(self) -> dict:
+        """
+        @return: normalized most common value -> frequency
+        """
+        if not self.mcv or not self.mcf:
+            return {}
+        return {mcv_key(v): f for v, f in zip(self.mcv, self.mcf)}
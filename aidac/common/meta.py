@@ -1,5 +1,11 @@
 class MetaInfo:
-    def __init__(self, cols=None, ncols=0, nrows=0):
+    def __init__(self, cols=None, ncols=0, nrows=0, width=0):
+        """
+        @param cols: columns of the table
+        @param ncols: number of columns
+        @param nrows: number of rows
+        @param width: average size of a row in bytes
+        """
         if cols is None:
             cols = []
 
@@ -9,3 +15,10 @@ class MetaInfo:
         else:
             self.ncols = len(cols)
         self.nrows = nrows
+        self.width = width
+
+    def size(self):
+        """
+        @return: estimated size of the table in bytes
+        """
+        return self.nrows * self.width
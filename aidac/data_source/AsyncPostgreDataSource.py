@@ -0,0 +1,165 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from contextlib import asynccontextmanager
+
+import pandas
+import psycopg
+
+from aidac.common.DataIterator import generator
+from aidac.data_source.BinaryCopyReader import BinaryCopyReader
+from aidac.data_source.ConnectionPool import AsyncConnectionPool
+from aidac.data_source.MetaCatalog import DESCRIPTION
+from aidac.data_source.PostgreDataSource import PostgreDataSource, ql, BULK_CHUNK_ROWS
+from aidac.data_source.ResultSet import ResultSet
+
+
+class AsyncPostgreDataSource(PostgreDataSource):
+    """
+    Postgres data source whose query execution and COPY transfers can be awaited.
+    It uses psycopg async connections, which are bound to the event loop that opened them, the blocking
+    interface of PostgreDataSource stays available (e.g. for planning).
+    """
+    def connect(self):
+        super().connect()
+        self._async_init = None
+        self._async_loop = None
+        # temporary tables of the async session, they are not visible to the session connection of the blocking
+        # interface and the other way round
+        self._async_session_tables = set()
+        self._async_session_pattern = None
+
+    async def _ensure_async(self):
+        """
+        open the async session connection and pool in the running loop, concurrent callers share one attempt
+        """
+        loop = asyncio.get_running_loop()
+        if self._async_loop is not loop:
+            stale = self._async_init
+            self._async_loop = loop
+            self._async_init = loop.create_task(self._open_async(stale))
+        await self._async_init
+
+    async def _open_async(self, stale=None):
+        """
+        @param stale: task that opened the connection and pool bound to a previous event loop, they are closed first
+        """
+        if stale is not None:
+            await self._close_stale(stale)
+        # the async session owns the temporary tables created by create_table_async
+        self._async_conn = await psycopg.AsyncConnection.connect(self._conninfo())
+        self._async_session_lock = asyncio.Lock()
+        self._async_pool = AsyncConnectionPool(
+            lambda: psycopg.AsyncConnection.connect(self._conninfo(), autocommit=True),
+            self.pool_min_size, self.pool_max_size, check_interval=self.pool_check_interval)
+        await self._async_pool.open()
+
+    async def _close_stale(self, stale):
+        if stale.done() and not stale.cancelled() and stale.exception() is None:
+            try:
+                await self._async_pool.close()
+            except Exception:
+                # the previous loop may have been closed while connections were in use
+                pass
+            await self._async_conn.close()
+        # the temporary tables were dropped with the session
+        self._drop_async_session_tables()
+
+    def _drop_async_session_tables(self):
+        tables, self._async_session_tables = self._async_session_tables, set()
+        self._async_session_pattern = None
+        for table in tables:
+            self.invalidate_metadata(table)
+
+    def _uses_async_session(self, qry) -> bool:
+        return self._async_session_pattern is not None and self._async_session_pattern.search(qry) is not None
+
+    async def close_async(self):
+        if self._async_loop is not None:
+            await self._async_init
+            await self._async_pool.close()
+            await self._async_conn.close()
+            self._async_loop = None
+            self._drop_async_session_tables()
+        self.close()
+
+    @asynccontextmanager
+    async def _async_cursor(self, qry):
+        """
+        borrow an async cursor to run the query on
+        @param qry:
+        @return: (connection, cursor)
+        """
+        await self._ensure_async()
+        if self._uses_async_session(qry):
+            async with self._async_session_lock:
+                async with self._async_conn.cursor() as cursor:
+                    yield self._async_conn, cursor
+        else:
+            async with self._async_pool.connection() as conn, conn.cursor() as cursor:
+                yield conn, cursor
+
+    async def execute_async(self, qry, *args) -> ResultSet | None:
+        async with self._async_cursor(qry) as (conn, cursor):
+            # without parameters, '%' in the query (e.g. LIKE patterns) must not be parsed as placeholders
+            await cursor.execute(qry, args if args else None)
+            if cursor.description is not None:
+                return ResultSet(cursor.description, await cursor.fetchall())
+            await conn.commit()
+            return None
+
+    async def retrieve_result_async(self, qry) -> ResultSet | None:
+        if self.fetch_mode == 'binary':
+            rs = await self._retrieve_binary_async(qry)
+            if rs is not None:
+                return rs
+        return await self.execute_async(qry)
+
+    async def _retrieve_binary_async(self, qry) -> ResultSet | None:
+        cols = await self.catalog.get_async(DESCRIPTION, qry, lambda: self._describe_async(qry))
+        if not BinaryCopyReader.supported(cols):
+            return None
+        async with self._async_cursor(qry) as (conn, cursor):
+            reader = BinaryCopyReader(cols)
+            async with cursor.copy(ql.copy_to_binary(qry)) as copy:
+                async for block in copy:
+                    if reader.feed(block):
+                        # decoding is cpu bound, keep it off the event loop
+                        await asyncio.to_thread(reader.decode)
+        table = await asyncio.to_thread(reader.finish)
+        return ResultSet.from_table(cols, table)
+
+    async def _describe_async(self, qry):
+        return (await self.execute_async(ql.describe_query(qry))).columns
+
+    async def create_table_async(self, table_name: str, cols: dict):
+        col_def = self._column_definition(cols)
+        qry = ql.create_table(table_name, col_def)
+        print('------------create tb-----------\n{}'.format(qry))
+        await self._ensure_async()
+        self._async_session_tables.add(table_name)
+        self._async_session_pattern = self._table_pattern(self._async_session_tables)
+        await self.execute_async(qry)
+        self.invalidate_metadata(table_name)
+        return col_def
+
+    async def import_table_async(self, table: str, cols: dict, data, chunksize: int = BULK_CHUNK_ROWS):
+        start = time.time()
+        column_name = ', '.join(list(cols.keys()))
+        async with self._async_cursor(table) as (conn, cursor):
+            if isinstance(data, pandas.DataFrame):
+                null_token, chunks = self._copy_chunks(data[list(cols.keys())], chunksize)
+                async with cursor.copy(ql.copy_csv(table, column_name, null_token)) as copy:
+                    while True:
+                        # serialize the next chunk in a worker thread while the loop keeps running
+                        buf = await asyncio.to_thread(next, chunks, None)
+                        if buf is None:
+                            break
+                        await copy.write(buf)
+            else:
+                async with cursor.copy(ql.copy_data(table, column_name)) as copy:
+                    for row in generator(data):
+                        await copy.write_row(row)
+        print('loading data time: '+str(time.time()-start))
+        self.invalidate_metadata(table)
@@ -0,0 +1,334 @@
+import collections
+import struct
+
+import numpy as np
+
+SIGNATURE = b'PGCOPY\n\xff\r\n\x00'
+# signature, flags field and header extension length
+HEADER_SIZE = len(SIGNATURE) + 8
+
+PG_EPOCH_DAYS = np.datetime64('2000-01-01', 'D')
+PG_EPOCH_US = np.datetime64('2000-01-01', 'us')
+
+# postgres type oid -> (binary format, output dtype) for fixed width types
+fixed_types = {16: ('?', np.bool_), 20: ('>i8', np.int64), 21: ('>i2', np.int16), 23: ('>i4', np.int32),
+               26: ('>u4', np.int64), 700: ('>f4', np.float32), 701: ('>f8', np.float64),
+               1082: ('>i4', 'date'), 1114: ('>i8', 'datetime64[us]')}
+# text like types (char, name, text, bpchar, varchar), decoded as utf-8 strings
+text_types = {18, 19, 25, 1042, 1043}
+NUMERIC = 1700
+
+NUMERIC_NEG = 0x4000
+NUMERIC_NAN = 0xC000
+NUMERIC_PINF = 0xD000
+NUMERIC_NINF = 0xF000
+
+# pending stream bytes decoded at a time, the stream is never buffered as a whole
+CHUNK_BYTES = 8 * 1024 * 1024
+# tuples checked at once for the fixed layout, the run grows while the tuples keep it and restarts after a null
+MIN_RUN_ROWS = 64
+MAX_RUN_ROWS = 1024 * 1024
+# tuples walked one by one after a null, more while nulls keep breaking the runs
+MIN_SCAN_ROWS = 16
+MAX_SCAN_ROWS = 64 * 1024
+
+_unpack_short = struct.Struct('>h').unpack_from
+_unpack_int = struct.Struct('>i').unpack_from
+
+
+def _type_code(col):
+    type_code = getattr(col, 'type_code', None)
+    if type_code is None and isinstance(col, tuple) and len(col) > 1:
+        type_code = col[1]
+    return type_code
+
+
+class BinaryCopyReader:
+    """
+    Decode the output of COPY ... TO STDOUT (FORMAT BINARY) into numpy columns.
+    Each tuple is: int16 field count, then for each field an int32 length (-1 for null) and the value bytes.
+    The stream is fed block by block and decoded in chunks. If all columns have a fixed width, runs of tuples
+    without nulls share one layout and are read as a structured array, only the tuples with nulls are walked
+    one by one. Tuples with text or numeric values are always walked one by one to find their fields, each
+    text value is then decoded on its own.
+    Other types, e.g. json, arrays or timestamps with time zone, are not supported and their queries are
+    fetched through the cursor instead.
+    """
+    def __init__(self, cols):
+        """
+        @param cols: cursor description of the copied query
+        """
+        self.columns = cols
+        self.type_codes = [_type_code(c) for c in cols]
+        self._layout = None
+        if all(t in fixed_types for t in self.type_codes):
+            fields = [('count', '>i2')]
+            for idx, t in enumerate(self.type_codes):
+                fields.append(('len{}'.format(idx), '>i4'))
+                fields.append(('val{}'.format(idx), fixed_types[t][0]))
+            self._layout = np.dtype(fields)
+            self._widths = np.array([np.dtype(fixed_types[t][0]).itemsize for t in self.type_codes])
+            self._value_offsets = np.array([self._layout.fields['val{}'.format(i)][1] for i in range(len(cols))])
+        self._pending = bytearray()
+        self._header = False
+        self._done = False
+        # column name -> decoded arrays of the chunks
+        self._parts = collections.OrderedDict((c.name, []) for c in cols)
+
+    @staticmethod
+    def supported(cols) -> bool:
+        """
+        check if all columns of a query can be decoded
+        @param cols: cursor description
+        @return:
+        """
+        return all(_type_code(c) in fixed_types or _type_code(c) in text_types or _type_code(c) == NUMERIC
+                   for c in cols)
+
+    def read(self, buf) -> collections.OrderedDict:
+        """
+        decode a complete binary copy stream
+        @param buf: bytes of the stream
+        @return: ordered dict of column name -> numpy array
+        """
+        self.feed(buf)
+        return self.finish()
+
+    def feed(self, block) -> bool:
+        """
+        append the next block of the stream
+        @param block:
+        @return: whether a chunk is pending and decode should be called
+        """
+        self._pending += block
+        return len(self._pending) >= CHUNK_BYTES
+
+    def decode(self):
+        """
+        decode the complete tuples pending
+        """
+        buf = self._pending
+        pos = 0
+        if not self._header:
+            if len(buf) < HEADER_SIZE:
+                return
+            if bytes(buf[:len(SIGNATURE)]) != SIGNATURE:
+                raise ValueError('Not a binary copy stream')
+            ext_len, = struct.unpack_from('>i', buf, len(SIGNATURE) + 4)
+            if len(buf) < HEADER_SIZE + ext_len:
+                return
+            pos = HEADER_SIZE + ext_len
+            self._header = True
+        if not self._done:
+            pos = self._decode_chunk(buf, pos)
+        self._pending = buf[pos:]
+
+    def finish(self) -> collections.OrderedDict:
+        """
+        decode the rest of the stream
+        @return: ordered dict of column name -> numpy array
+        """
+        self.decode()
+        if not self._done:
+            raise ValueError('Incomplete binary copy stream')
+        if not any(self._parts.values()):
+            # no tuples, the empty columns still get their types
+            empty = np.empty((0, len(self.columns)), dtype=np.int64)
+            self._decode_tuples(np.empty(0, dtype=np.uint8), empty, empty)
+        table = collections.OrderedDict()
+        for name, parts in self._parts.items():
+            table[name] = parts[0] if len(parts) == 1 else np.concatenate(parts)
+        return table
+
+    def _decode_chunk(self, buf, pos):
+        """
+        @return: position after the last complete tuple
+        """
+        if self._layout is None:
+            offsets, lengths, pos, self._done = self._scan(buf, pos)
+            if len(offsets):
+                self._decode_tuples(np.frombuffer(buf, dtype=np.uint8), offsets, lengths)
+            return pos
+        parts, pos = self._split(buf, pos)
+        if all(kind == 'run' for kind, _, _ in parts):
+            if parts:
+                # only tuples without nulls, their values are read from the structured arrays
+                data = np.concatenate([rows for _, _, rows in parts])
+                for idx, col in enumerate(self.columns):
+                    out = fixed_types[self.type_codes[idx]][1]
+                    self._parts[col.name].append(self._convert_fixed(data['val{}'.format(idx)], out, None))
+            return pos
+        offsets, lengths = [], []
+        for kind, start, rows in parts:
+            if kind == 'run':
+                starts = start + np.arange(len(rows), dtype=np.int64) * self._layout.itemsize
+                offsets.append(starts[:, None] + self._value_offsets)
+                lengths.append(np.broadcast_to(self._widths, (len(rows), len(self._widths))))
+            else:
+                offsets.append(start)
+                lengths.append(rows)
+        self._decode_tuples(np.frombuffer(buf, dtype=np.uint8), np.concatenate(offsets), np.concatenate(lengths))
+        return pos
+
+    def _decode_tuples(self, raw, offsets, lengths):
+        for idx, col in enumerate(self.columns):
+            self._parts[col.name].append(self._decode(raw, self.type_codes[idx], offsets[:, idx], lengths[:, idx]))
+
+    def _split(self, buf, pos):
+        """
+        split the complete tuples of a fixed width stream into runs with the fixed layout and tuples with nulls
+        @return: list of ('run', start, structured array) and ('tuples', value offsets, lengths) in stream order,
+        position after the last complete tuple
+        """
+        itemsize = self._layout.itemsize
+        parts = []
+        window = MIN_RUN_ROWS
+        scan_rows = MIN_SCAN_ROWS
+        while not self._done:
+            n = min(window, (len(buf) - pos) // itemsize)
+            run = 0
+            if n:
+                data = np.frombuffer(buf, dtype=self._layout, count=n, offset=pos)
+                fits = data['count'] == len(self.columns)
+                for idx, width in enumerate(self._widths):
+                    fits &= data['len{}'.format(idx)] == width
+                run = n if fits.all() else int(np.argmin(fits))
+                if run:
+                    parts.append(('run', pos, data[:run]))
+                    pos += run * itemsize
+            if n and run == n:
+                window = min(window * 2, MAX_RUN_ROWS)
+                scan_rows = MIN_SCAN_ROWS
+                continue
+            window = MIN_RUN_ROWS
+            # a tuple with nulls, the trailer or a tuple continuing in the next block
+            offsets, lengths, pos, self._done = self._scan(buf, pos, scan_rows)
+            if not len(offsets):
+                break
+            parts.append(('tuples', offsets, lengths))
+            scan_rows = min(scan_rows * 2, MAX_SCAN_ROWS)
+        return parts, pos
+
+    def _scan(self, buf, pos, max_rows=None):
+        """
+        walk the tuples one by one and record where the value of each field starts
+        @param max_rows: number of tuples to walk at most, all complete ones if None
+        @return: value offsets and lengths (-1 for null) with shape (rows, columns), position after the last
+        complete tuple and whether the end of the stream was reached
+        """
+        ncols = len(self.columns)
+        end = len(buf)
+        unpack_short, unpack_int = _unpack_short, _unpack_int
+        # value offsets of the walked tuples, the lengths are read in one go afterwards
+        starts = []
+        record = starts.append
+        nrows = 0
+        done = False
+        while (max_rows is None or nrows < max_rows) and pos + 2 <= end:
+            count, = unpack_short(buf, pos)
+            if count == -1:
+                pos += 2
+                done = True
+                break
+            if count != ncols:
+                raise ValueError('Expected {} fields, got {}'.format(ncols, count))
+            cur = pos + 2
+            for _ in range(ncols):
+                if cur + 4 > end:
+                    break
+                size, = unpack_int(buf, cur)
+                cur += 4
+                record(cur)
+                if size > 0:
+                    cur += size
+            else:
+                if cur <= end:
+                    pos = cur
+                    nrows += 1
+                    continue
+            # the tuple continues in the next block
+            break
+        offsets = np.array(starts[:nrows * ncols], dtype=np.int64).reshape(nrows, ncols)
+        lengths = self._gather(np.frombuffer(buf, dtype=np.uint8), offsets.reshape(-1) - 4, 4).view('>i4')
+        return offsets, lengths.astype(np.int64).reshape(nrows, ncols), pos, done
+
+    def _gather(self, raw, offsets, width):
+        """
+        gather fixed width values at the given offsets into one contiguous byte array
+        """
+        idx = offsets[:, None] + np.arange(width)
+        return raw[idx].reshape(-1)
+
+    def _decode(self, raw, type_code, offsets, lengths):
+        nulls = lengths < 0
+        if type_code in text_types:
+            # the value bytes are sliced out of the chunk by their length prefix
+            view = memoryview(raw)
+            col = np.empty(len(offsets), dtype=object)
+            col[:] = [None if size < 0 else str(view[off:off + size], 'utf-8')
+                      for off, size in zip(offsets.tolist(), lengths.tolist())]
+            return col
+        if type_code == NUMERIC:
+            return self._decode_numeric(raw, offsets, lengths)
+
+        fmt, out = fixed_types[type_code]
+        width = np.dtype(fmt).itemsize
+        # nulls have no value bytes, read from a valid position and mask them afterwards
+        safe = np.where(nulls, 0, offsets)
+        values = self._gather(raw, safe, width).view(fmt)
+        return self._convert_fixed(values, out, nulls if nulls.any() else None)
+
+    def _convert_fixed(self, values, out, nulls):
+        """
+        convert big endian values to the output type, null values become NaN / NaT / None
+        """
+        if out == 'date':
+            col = (PG_EPOCH_DAYS + values.astype(np.int64)).astype(object)
+            if nulls is not None:
+                col[nulls] = None
+            return col
+        if out == 'datetime64[us]':
+            col = PG_EPOCH_US + values.astype(np.int64).astype('timedelta64[us]')
+            if nulls is not None:
+                col[nulls] = np.datetime64('NaT')
+            return col
+        if nulls is None:
+            return values.astype(out)
+        if np.dtype(out).kind == 'b':
+            col = values.astype(object)
+            col[nulls] = None
+            return col
+        col = values.astype(np.float64)
+        col[nulls] = np.nan
+        return col
+
+    def _decode_numeric(self, raw, offsets, lengths):
+        """
+        numeric is stored as int16 ndigits, int16 weight, uint16 sign, uint16 dscale followed by
+        ndigits base 10000 digits, the first digit is multiplied by 10000^weight
+        """
+        nulls = lengths < 0
+        safe = np.where(nulls, 0, offsets)
+        header = self._gather(raw, safe, 8).view('>i2').reshape(-1, 4)
+        ndigits = header[:, 0].astype(np.int64)
+        weight = header[:, 1].astype(np.int64)
+        sign = header[:, 2].astype(np.int64) & 0xFFFF
+
+        # the digits form an integer that is scaled once, so values with up to 15 significant digits convert
+        # exactly like float(Decimal) does
+        mantissa = np.zeros(len(offsets), dtype=np.float64)
+        max_digits = int(ndigits[~nulls].max()) if (~nulls).any() else 0
+        for k in range(max_digits):
+            has_digit = (k < ndigits) & ~nulls
+            if has_digit.any():
+                digit = self._gather(raw, safe[has_digit] + 8 + 2*k, 2).view('>i2')
+                mantissa[has_digit] = mantissa[has_digit] * 10000 + digit
+        exponent = (weight - ndigits + 1).astype(np.float64)
+        with np.errstate(over='ignore'):
+            col = np.where(exponent >= 0, mantissa * np.power(10000.0, np.maximum(exponent, 0)),
+                           mantissa / np.power(10000.0, np.maximum(-exponent, 0)))
+        col[sign == NUMERIC_NEG] *= -1
+        col[sign == NUMERIC_PINF] = np.inf
+        col[sign == NUMERIC_NINF] = -np.inf
+        col[(sign == NUMERIC_NAN) | nulls] = np.nan
+        return col
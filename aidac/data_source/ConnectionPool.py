@@ -0,0 +1,297 @@
+import asyncio
+import threading
+import time
+from contextlib import contextmanager, asynccontextmanager
+
+from aidac.data_source.exceptions import DataSourceException
+
+DEFAULT_MIN_SIZE = 1
+DEFAULT_MAX_SIZE = 5
+# seconds to wait for a free connection before giving up
+DEFAULT_TIMEOUT = 30
+# idle connections are pinged before reuse if they have not been used for this many seconds
+DEFAULT_CHECK_INTERVAL = 30
+
+
+class ConnectionPool:
+    """
+    Thread safe pool of database connections
+    At least min_size connections are kept open, at most max_size connections are opened at the same time.
+    Connections are health checked when they are handed out and replaced if they are broken.
+    """
+    def __init__(self, connect, min_size: int = DEFAULT_MIN_SIZE, max_size: int = DEFAULT_MAX_SIZE,
+                 timeout: float = DEFAULT_TIMEOUT, check_interval: float = DEFAULT_CHECK_INTERVAL):
+        """
+        @param connect: function without arguments that opens a new connection
+        @param min_size: number of connections opened upfront and kept open
+        @param max_size: maximum number of connections
+        @param timeout: seconds to wait for a free connection
+        @param check_interval: idle seconds after which a connection is pinged before reuse, None to never ping
+        """
+        if min_size < 0 or max_size < 1 or min_size > max_size:
+            raise DataSourceException('Invalid pool size: min {}, max {}'.format(min_size, max_size))
+        self._connect = connect
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.check_interval = check_interval
+        # idle connections as (connection, time returned to the pool)
+        self._idle = []
+        # connections open or being opened
+        self._size = 0
+        self._closed = False
+        self._cond = threading.Condition()
+        for _ in range(min_size):
+            self._size += 1
+            self._idle.append((self._open(), time.time()))
+
+    def _open(self):
+        """
+        open a connection for a slot reserved by incrementing _size under the lock, the slot is freed if it fails
+        """
+        try:
+            return self._connect()
+        except BaseException:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+
+    def _discard(self, conn):
+        with self._cond:
+            self._size -= 1
+            self._cond.notify()
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    @staticmethod
+    def _is_broken(conn) -> bool:
+        return conn.closed or getattr(conn, 'broken', False)
+
+    def _healthy(self, conn, idle_since, ping=False) -> bool:
+        if self._is_broken(conn):
+            return False
+        if ping or (self.check_interval is not None and time.time() - idle_since > self.check_interval):
+            try:
+                conn.execute('SELECT 1')
+            except Exception:
+                return False
+        return True
+
+    def getconn(self):
+        """
+        take a connection out of the pool, open a new one if all are in use and the pool is not full
+        @return: connection
+        """
+        deadline = time.time() + self.timeout
+        while True:
+            # only the choice is made under the lock, other threads are not blocked while connecting or pinging
+            with self._cond:
+                idle = self._reserve(deadline)
+            if idle is None:
+                return self._open()
+            conn, idle_since = idle
+            if self._healthy(conn, idle_since):
+                return conn
+            self._discard(conn)
+
+    def _reserve(self, deadline):
+        """
+        wait until an idle connection or a free slot is available, must be called holding the lock
+        @param deadline:
+        @return: (connection, idle since) taken from the idle connections, None if a slot was reserved for a new one
+        """
+        while True:
+            if self._closed:
+                raise DataSourceException('Connection pool is closed')
+            if self._idle:
+                return self._idle.pop()
+            if self._size < self.max_size:
+                self._size += 1
+                return None
+            remaining = deadline - time.time()
+            if remaining <= 0 or not self._cond.wait(remaining):
+                raise DataSourceException('No connection available after {} seconds'.format(self.timeout))
+
+    def putconn(self, conn):
+        """
+        return a connection to the pool, an unfinished transaction is rolled back
+        @param conn:
+        @return:
+        """
+        with self._cond:
+            if self._closed or self._is_broken(conn):
+                self._discard(conn)
+            else:
+                try:
+                    conn.rollback()
+                    self._idle.append((conn, time.time()))
+                except Exception:
+                    self._discard(conn)
+            refill = self._size < self.min_size and not self._closed
+            if refill:
+                self._size += 1
+            self._cond.notify()
+        if refill:
+            try:
+                conn = self._open()
+            except Exception:
+                # the pool refills on the next request
+                return
+            with self._cond:
+                self._idle.append((conn, time.time()))
+                self._cond.notify()
+
+    @contextmanager
+    def connection(self):
+        """
+        context manager that borrows a connection and gives it back afterwards
+        """
+        conn = self.getconn()
+        try:
+            yield conn
+        finally:
+            self.putconn(conn)
+
+    def check(self):
+        """
+        ping all idle connections and replace the broken ones
+        @return: number of connections replaced
+        """
+        with self._cond:
+            idle, self._idle = self._idle, []
+            replaced = 0
+            for conn, _ in idle:
+                if self._healthy(conn, None, ping=True):
+                    self._idle.append((conn, time.time()))
+                else:
+                    self._discard(conn)
+                    replaced += 1
+            while self._size < self.min_size:
+                self._size += 1
+                self._idle.append((self._open(), time.time()))
+            return replaced
+
+    def close(self):
+        """
+        close all idle connections, connections in use are closed when they are returned
+        """
+        with self._cond:
+            self._closed = True
+            for conn, _ in self._idle:
+                self._discard(conn)
+            self._idle = []
+            self._cond.notify_all()
+
+
+class AsyncConnectionPool(ConnectionPool):
+    """
+    asyncio version of the pool for async connections, it has to be used inside one event loop
+    """
+    def __init__(self, connect, min_size: int = DEFAULT_MIN_SIZE, max_size: int = DEFAULT_MAX_SIZE,
+                 timeout: float = DEFAULT_TIMEOUT, check_interval: float = DEFAULT_CHECK_INTERVAL):
+        """
+        @param connect: coroutine function without arguments that opens a new connection
+        """
+        if min_size > max_size:
+            raise DataSourceException('Invalid pool size: min {}, max {}'.format(min_size, max_size))
+        # connections can only be opened inside the event loop, see open()
+        super().__init__(connect, 0, max_size, timeout, check_interval)
+        self.min_size = min_size
+        self._cond = asyncio.Condition()
+
+    async def _open(self):
+        # reserve the slot before awaiting so concurrent requests do not exceed max_size
+        self._size += 1
+        try:
+            return await self._connect()
+        except BaseException:
+            self._size -= 1
+            raise
+
+    async def _discard(self, conn):
+        self._size -= 1
+        try:
+            await conn.close()
+        except Exception:
+            pass
+
+    async def _healthy(self, conn, idle_since, ping=False) -> bool:
+        if self._is_broken(conn):
+            return False
+        if ping or (self.check_interval is not None and time.time() - idle_since > self.check_interval):
+            try:
+                await conn.execute('SELECT 1')
+            except Exception:
+                return False
+        return True
+
+    async def open(self):
+        """
+        open the min_size connections upfront
+        """
+        while self._size < self.min_size:
+            self._idle.append((await self._open(), time.time()))
+
+    async def getconn(self):
+        async with self._cond:
+            try:
+                await asyncio.wait_for(self._cond.wait_for(self._available), self.timeout)
+            except asyncio.TimeoutError:
+                raise DataSourceException('No connection available after {} seconds'.format(self.timeout))
+            return await self._take()
+
+    def _available(self):
+        if self._closed:
+            raise DataSourceException('Connection pool is closed')
+        return bool(self._idle) or self._size < self.max_size
+
+    async def _take(self):
+        while self._idle:
+            conn, idle_since = self._idle.pop()
+            if await self._healthy(conn, idle_since):
+                return conn
+            await self._discard(conn)
+        return await self._open()
+
+    async def putconn(self, conn):
+        async with self._cond:
+            if self._closed or self._is_broken(conn):
+                await self._discard(conn)
+            else:
+                try:
+                    await conn.rollback()
+                    self._idle.append((conn, time.time()))
+                except Exception:
+                    await self._discard(conn)
+            self._cond.notify()
+
+    @asynccontextmanager
+    async def connection(self):
+        conn = await self.getconn()
+        try:
+            yield conn
+        finally:
+            await self.putconn(conn)
+
+    async def check(self):
+        async with self._cond:
+            idle, self._idle = self._idle, []
+            replaced = 0
+            for conn, _ in idle:
+                if await self._healthy(conn, None, ping=True):
+                    self._idle.append((conn, time.time()))
+                else:
+                    await self._discard(conn)
+                    replaced += 1
+            return replaced
+
+    async def close(self):
+        async with self._cond:
+            self._closed = True
+            for conn, _ in self._idle:
+                await self._discard(conn)
+            self._idle = []
+            self._cond.notify_all()
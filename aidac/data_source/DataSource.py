@@ -1,3 +1,7 @@
+from aidac.data_source.MetaCatalog import MetaCatalog, ESTIMATE
+from aidac.exec.ResultCache import result_cache
+
+
 class DataSource:
     def __init__(self, host, username, password, dbname=None, job_name=None, port=None):
         self.host = host
@@ -9,6 +13,8 @@ class DataSource:
         self.__conn = None
         self.__cursor = None
         self.mapping = {}
+        # cached metadata used by the planner
+        self.catalog = MetaCatalog()
 
     def __str__(self):
         return self.job_name
@@ -16,6 +22,13 @@ class DataSource:
     def connect(self):
         pass
 
+    def close(self):
+        """
+        Release the connections of the data source
+        @return:
+        """
+        pass
+
     def ls_tables(self):
         """
         List all user tables in current database
@@ -44,6 +57,23 @@ class DataSource:
     def _execute(self, query: str):
         pass
 
+    def retrieve_result(self, query: str):
+        """
+        Execute a query and fetch the whole result set, data sources can override it with faster fetch modes
+        @param query:
+        @return: ResultSet
+        """
+        return self._execute(query)
+
+    def stream_result(self, query: str, itersize: int):
+        """
+        Execute a query and fetch the result in chunks, by default the whole result is one chunk
+        @param query:
+        @param itersize: number of rows per chunk
+        @return: generator of ResultSet
+        """
+        yield self.retrieve_result(query)
+
     def table_columns(self, table: str):
         """
         Retrieve the column metadata of a table
@@ -52,10 +82,11 @@ class DataSource:
         """
         pass
 
-    def row_count(self, table:str):
+    def row_count(self, table:str, exact: bool = False):
         """
         Get the row count of a table
         @param table:
+        @param exact: whether an estimated row count is acceptable
         @return: # row
         """
         pass
@@ -69,10 +100,58 @@ class DataSource:
     def get_estimation(self, qry):
         pass
 
+    def invalidate_estimates(self):
+        """
+        Drop cached estimates, e.g. after the data in the source changed
+        @return:
+        """
+        self.catalog.invalidate(ESTIMATE)
+
+    def invalidate_metadata(self, table: str = None):
+        """
+        Drop cached metadata of a table, or of the whole data source if no table is given
+        @param table:
+        @return:
+        """
+        if table is None:
+            self.catalog.invalidate()
+        else:
+            self.catalog.invalidate_table(table)
+        self.invalidate_results(table)
+
+    def invalidate_results(self, table: str = None):
+        """
+        Drop cached results computed from a table, or from any table of the data source if no table is given.
+        Has to be called when a table is changed other than through this data source
+        @param table:
+        @return:
+        """
+        if table is None:
+            result_cache.invalidate_job(self.job_name)
+        else:
+            result_cache.invalidate_table(self.job_name, table)
+
+
+# engines running the lineages on local frames: pandas replays the pandas calls, fused evaluates chains of filters,
+# projections and heads in one numpy pass, sqlite runs the generated SQL
+LOCAL_ENGINES = ('pandas', 'fused', 'sqlite')
+
 
 class LocalDataSource(DataSource):
+    engine = 'pandas'
+
     def __init__(self):
-        self.job_name = '_local_ds'
+        super().__init__(None, None, None, job_name='_local_ds')
+
+    def set_engine(self, engine: str):
+        """
+        Set how lineages on local frames are executed
+        @param engine: one of LOCAL_ENGINES
+        @return:
+        """
+        if engine not in LOCAL_ENGINES:
+            raise ValueError('Unsupported local engine {}, expected one of {}'.format(engine, LOCAL_ENGINES))
+        self.engine = engine
 
 
 local_ds = LocalDataSource()
@@ -2,6 +2,7 @@ import uuid
 
 from aidac.data_source.DataSource import DataSource, local_ds
 from aidac.data_source.PostgreDataSource import PostgreDataSource
+from aidac.data_source.AsyncPostgreDataSource import AsyncPostgreDataSource
 from aidac.data_source.exceptions import DataSourceException
 
 LOCAL_DS = '_local_ds'
@@ -10,7 +11,8 @@ class DataSourceManager:
     def __init__(self):
         self.sources = {local_ds.job_name: local_ds}
 
-    def add_data_source(self, source: str, host: str, user: str, password: str, db: str, job_name: str, port: str):
+    def add_data_source(self, source: str, host: str, user: str, password: str, db: str, job_name: str, port: str,
+                        **options):
         """
         Create a data source of specified source type
         @param source: data source type
@@ -20,12 +22,14 @@ class DataSourceManager:
         @param password:
         @param db: database name
         @param job_name: user given job name which uniquely identify the data source
+        @param options: data source specific options, e.g. pool_min_size / pool_max_size for postgres
         @return:
         """
         if job_name in self.sources:
             raise DataSourceException("Job {} already exists".format(job_name))
 
-        self.sources[job_name] = data_source_factory.create_data_source(source, host, user, password, db, job_name, port)
+        self.sources[job_name] = data_source_factory.create_data_source(source, host, user, password, db, job_name, port,
+                                                                       **options)
         self.sources[job_name].connect()
 
     def tables(self) -> dict:
@@ -56,11 +60,13 @@ class DataSourceFactory:
         pass
 
     def create_data_source(self, source: str, host: str, user: str, password: str, db: str, job_name: str = None,
-                           port: str = None):
+                           port: str = None, **options):
         if job_name is None:
             job_name = source+'_'+str(uuid.uuid4())
         if source == 'postgres':
-            return PostgreDataSource(host, user, password, db, job_name, port)
+            return PostgreDataSource(host, user, password, db, job_name, port, **options)
+        if source == 'postgres_async':
+            return AsyncPostgreDataSource(host, user, password, db, job_name, port, **options)
 
 
 data_source_factory = DataSourceFactory()
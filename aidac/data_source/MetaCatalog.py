@@ -0,0 +1,104 @@
+import threading
+import time
+
+# seconds a cached entry stays valid, None to keep entries until they are invalidated
+DEFAULT_TTL = 300
+
+TABLES = 'tables'
+COLUMNS = 'columns'
+ROW_COUNT = 'row_count'
+HIST = 'hist'
+ESTIMATE = 'estimate'
+# cursor description of a query result, keyed by query text
+DESCRIPTION = 'description'
+
+# kinds of entries that are keyed by a table name
+TABLE_KINDS = (COLUMNS, ROW_COUNT, HIST)
+
+
+class MetaCatalog:
+    """
+    Per data source cache of metadata (table list, column metadata, row counts, histograms, estimates and
+    result descriptions)
+    Entries expire after ttl seconds or when they are explicitly invalidated.
+    The catalog is shared by the threads of the executor, e.g. concurrent transfers invalidate it while others
+    read it, so entries are only read, loaded and dropped holding the lock
+    """
+    def __init__(self, ttl=DEFAULT_TTL):
+        self.ttl = ttl
+        # (kind, key) -> (time loaded, value)
+        self._entries = {}
+        # loaders may read other entries of the catalog
+        self._lock = threading.RLock()
+        # incremented by every invalidation, an async load started before it is not stored
+        self._generation = 0
+
+    def _cached(self, kind, key, now):
+        entry = self._entries.get((kind, key))
+        if entry is not None and (self.ttl is None or now - entry[0] <= self.ttl):
+            return entry
+        return None
+
+    def get(self, kind: str, key, loader):
+        """
+        get a cached value, load and cache it if it is missing or expired
+        @param kind: kind of metadata, e.g. COLUMNS
+        @param key: key inside the kind, e.g. the table name
+        @param loader: function without arguments that retrieves the value from the data source
+        @return:
+        """
+        with self._lock:
+            now = time.time()
+            entry = self._cached(kind, key, now)
+            if entry is not None:
+                return entry[1]
+            value = loader()
+            self._entries[(kind, key)] = (now, value)
+            return value
+
+    async def get_async(self, kind: str, key, loader):
+        """
+        same as get, but the loader is a coroutine function, the lock is not held while it is awaited
+        """
+        with self._lock:
+            now = time.time()
+            entry = self._cached(kind, key, now)
+            if entry is not None:
+                return entry[1]
+            generation = self._generation
+        value = await loader()
+        with self._lock:
+            if generation == self._generation:
+                self._entries[(kind, key)] = (now, value)
+        return value
+
+    def invalidate(self, kind: str = None, key=None):
+        """
+        drop cached entries
+        @param kind: only drop entries of this kind, all entries if None
+        @param key: only drop the entry with this key
+        @return:
+        """
+        with self._lock:
+            self._generation += 1
+            if kind is None:
+                self._entries.clear()
+                return
+            for k in list(self._entries):
+                if k[0] == kind and (key is None or k[1] == key):
+                    del self._entries[k]
+
+    def invalidate_table(self, table: str):
+        """
+        drop everything cached about a table, e.g. after it was created or its data changed
+        estimates and result descriptions are dropped as well as any query may read the table
+        @param table:
+        @return:
+        """
+        with self._lock:
+            self._generation += 1
+            for k in list(self._entries):
+                kind, key = k
+                if kind in (TABLES, ESTIMATE, DESCRIPTION) or (kind in TABLE_KINDS and (
+                        key == table or (isinstance(key, tuple) and key[0] == table))):
+                    del self._entries[k]
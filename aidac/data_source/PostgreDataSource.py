@@ -1,13 +1,21 @@
 from __future__ import annotations
 
 import datetime
+import re
+import threading
+import uuid
+from contextlib import contextmanager
 
 import numpy as np
 import pandas
 
+from aidac.common import arrow_utils
 from aidac.common.DataIterator import generator
 from aidac.common.column import Column
+from aidac.data_source.BinaryCopyReader import BinaryCopyReader
+from aidac.data_source.ConnectionPool import ConnectionPool, DEFAULT_MIN_SIZE, DEFAULT_MAX_SIZE, DEFAULT_CHECK_INTERVAL
 from aidac.data_source.DataSource import DataSource
+from aidac.data_source.MetaCatalog import TABLES, COLUMNS, ROW_COUNT, HIST, ESTIMATE, DESCRIPTION
 from aidac.data_source.QueryLoader import QueryLoader
 import psycopg
 
@@ -30,36 +38,153 @@ typeConverter_rev = {'integer': np.int32, 'character varying': np.object, 'doubl
 
 constant_converter = {'YES': True, 'NO': False}
 
+# number of rows serialized into one COPY buffer by the bulk loader
+BULK_CHUNK_ROWS = 100000
+NULL_TOKEN = '\\N'
+
+# number of rows fetched per round trip by a server side cursor
+DEFAULT_ITERSIZE = 50000
+
+# count_estimate is shared by all data sources on the same database, do not replace it concurrently
+_estimation_func_lock = threading.Lock()
+
+# rows: fetch the result as row tuples, binary: stream the result with COPY TO in binary format, results with
+# column types the binary reader does not support (see BinaryCopyReader) are still fetched as row tuples
+FETCH_MODES = ('rows', 'binary')
+# numpy: results are dataframes of numpy columns, arrow: results are arrow backed dataframes (requires pyarrow)
+RESULT_FORMATS = ('numpy', 'arrow')
+
 
 class PostgreDataSource(DataSource):
-    def connect(self):
-        self.port = 5432 if self.port is None else self.port
+    fetch_mode = 'rows'
+    result_format = 'numpy'
+    # whether count_estimate has been created on the current connection
+    _estimation_ready = False
+
+    def __init__(self, host, username, password, dbname=None, job_name=None, port=None,
+                 pool_min_size: int = DEFAULT_MIN_SIZE, pool_max_size: int = DEFAULT_MAX_SIZE,
+                 pool_check_interval: float = DEFAULT_CHECK_INTERVAL):
+        """
+        @param pool_min_size: number of pooled connections kept open
+        @param pool_max_size: maximum number of pooled connections
+        @param pool_check_interval: idle seconds after which a pooled connection is pinged before reuse
+        """
+        super().__init__(host, username, password, dbname, job_name, port)
+        self.pool_min_size = pool_min_size
+        self.pool_max_size = pool_max_size
+        self.pool_check_interval = pool_check_interval
+        self.pool = None
 
-        self.__conn = psycopg.connect(
-            """host={} 
+    def _conninfo(self):
+        return """host={} 
             port={} 
             dbname={} 
             user={} 
             password={}""".format(self.host, self.port, self.dbname, self.username, self.password)
-        )
+
+    def _open_connection(self, autocommit=False):
+        return psycopg.connect(self._conninfo(), autocommit=autocommit)
+
+    def connect(self):
+        self.port = 5432 if self.port is None else self.port
+
+        # the session connection owns the temporary tables created by create_table,
+        # every other query runs on a pooled connection
+        self.__conn = self._open_connection()
         self.__cursor = self.__conn.cursor()
+        self._session_lock = threading.RLock()
+        self._session_tables = set()
+        self._session_pattern = None
+        if self.pool is not None:
+            self.pool.close()
+        self.pool = ConnectionPool(lambda: self._open_connection(autocommit=True), self.pool_min_size,
+                                   self.pool_max_size, check_interval=self.pool_check_interval)
+        self._estimation_ready = False
+        self.catalog.invalidate()
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.close()
+            self.pool = None
+        self.__conn.close()
+
+    def _uses_session(self, qry) -> bool:
+        """
+        check if a query reads one of the temporary tables, which are only visible to the session connection
+        """
+        return self._session_pattern is not None and self._session_pattern.search(qry) is not None
+
+    @contextmanager
+    def _cursor(self, qry, session=False):
+        """
+        borrow a cursor to run the query on
+        @param qry:
+        @param session: run on the session connection even if the query does not name a temporary table
+        @return: (connection, cursor)
+        """
+        if self.pool is None or session or self._uses_session(qry):
+            with self._session_lock:
+                yield self.__conn, self.__cursor
+        else:
+            with self.pool.connection() as conn, conn.cursor() as cursor:
+                yield conn, cursor
 
     def ls_tables(self):
         qry = ql.list_tables()
-        return self._execute(qry).get_result_ls()
+        # temporary tables are only listed on the connection that created them
+        return self.catalog.get(TABLES, None,
+                                lambda: self._execute(qry, session=bool(self._session_tables)).get_result_ls())
 
-    def import_table(self, table: str, cols: dict, data):
+    def import_table(self, table: str, cols: dict, data, chunksize: int = BULK_CHUNK_ROWS):
         # todo: allow to specify the columns to be inserted, maybe also create a col object for cols
-        # todo: right now data iterate rows, rooms for optimization later
         import time
         start = time.time()
         column_name = ', '.join(list(cols.keys()))
-        with self.__cursor.copy(ql.copy_data(table, column_name)) as copy:
-            for row in generator(data):
-                copy.write_row(row)
-        print('loading data time: '+str(start-time.time()))
+        with self._cursor(table) as (conn, cursor):
+            if isinstance(data, pandas.DataFrame):
+                self._bulk_copy(cursor, table, column_name, data[list(cols.keys())], chunksize)
+            else:
+                with cursor.copy(ql.copy_data(table, column_name)) as copy:
+                    for row in generator(data):
+                        copy.write_row(row)
+        print('loading data time: '+str(time.time()-start))
+        self.invalidate_metadata(table)
+
+    def _bulk_copy(self, cursor, table: str, column_name: str, data: pandas.DataFrame, chunksize: int):
+        """
+        serialize whole columns into COPY csv format and send them in large buffers
+        values keep their native text representation, nulls are written as NULL_TOKEN
+        @param cursor: cursor of the connection that can see the table
+        @param table: table to copy the data to (must exist forehead)
+        @param column_name: comma separated columns to be inserted
+        @param data: pandas dataframe with the columns in the same order
+        @param chunksize: number of rows serialized per buffer
+        """
+        null_token, chunks = self._copy_chunks(data, chunksize)
+        with cursor.copy(ql.copy_csv(table, column_name, null_token)) as copy:
+            for buf in chunks:
+                copy.write(buf)
+
+    @classmethod
+    def _copy_chunks(cls, data: pandas.DataFrame, chunksize: int):
+        """
+        @return: (null token, generator of csv buffers) of a dataframe
+        """
+        if arrow_utils.is_arrow_backed(data):
+            # written straight from the arrow buffers, nulls are empty fields and strings are always quoted
+            return '', arrow_utils.csv_chunks(data, chunksize)
+        return NULL_TOKEN, cls._csv_chunks(data, chunksize)
+
+    @staticmethod
+    def _csv_chunks(data: pandas.DataFrame, chunksize: int):
+        for begin in range(0, len(data), chunksize):
+            chunk = data.iloc[begin:begin+chunksize]
+            yield chunk.to_csv(header=False, index=False, na_rep=NULL_TOKEN)
 
     def table_columns(self, table: str):
+        return self.catalog.get(COLUMNS, table, lambda: self._load_table_columns(table))
+
+    def _load_table_columns(self, table: str):
         qry = ql.table_columns(table)
         rs = self._execute(qry)
         # expected return value from pg:
@@ -67,14 +192,22 @@ class PostgreDataSource(DataSource):
         cols = [Column(x[2], typeConverter_rev[x[3]], x[1], x[0], constant_converter[x[-1]], x[2], source_table=x[1]) for x in rs.data]
         return cols
 
-    def row_count(self, table: str):
+    def row_count(self, table: str, exact: bool = False):
         """
-
+        Get the row count of a table
         @param table:
+        @param exact: run COUNT(*), otherwise use the planner statistics (pg_class.reltuples) when available
         @return:
         """
-        qry = ql.row_card(table)
-        rows = self._execute(qry).get_value()
+        if exact:
+            return self._execute(ql.row_card(table)).get_value()
+        return self.catalog.get(ROW_COUNT, table, lambda: self._load_row_count(table))
+
+    def _load_row_count(self, table: str):
+        rows = self._execute(ql.row_card_estimate(table)).get_value()
+        # reltuples is -1 (or 0 before pg 14) if the table was never analyzed
+        if not rows or rows <= 0:
+            rows = self._execute(ql.row_card(table)).get_value()
         return rows
 
     def create_table(self, table_name: str, cols: dict):
@@ -84,54 +217,161 @@ class PostgreDataSource(DataSource):
         @param cols: data column definition
         @return: in db column definition
         """
+        col_def = self._column_definition(cols)
+        qry = ql.create_table(table_name, col_def)
+        print('------------create tb-----------\n{}'.format(qry))
+        with self._session_lock:
+            self._add_session_table(table_name)
+            self._execute(qry)
+        self.invalidate_metadata(table_name)
+        return col_def
+
+    @staticmethod
+    def _column_definition(cols: dict):
         col_def = []
         for cname, col in cols.items():
             db_type = typeConverter[col.dtype]
             # print(f'converting: {col.dtype} -> {db_type}')
             col_def.append(str(cname)+' '+db_type)
-        col_def = ', '.join(col_def)
+        return ', '.join(col_def)
 
-        qry = ql.create_table(table_name, col_def)
-        print('------------create tb-----------\n{}'.format(qry))
-        self._execute(qry)
-        return col_def
+    def _add_session_table(self, table_name: str):
+        self._session_tables.add(table_name)
+        self._session_pattern = self._table_pattern(self._session_tables)
+
+    @staticmethod
+    def _table_pattern(tables):
+        """
+        @return: pattern finding any of the table names in a query
+        """
+        return re.compile(r'\b({})\b'.format('|'.join(map(re.escape, tables))), re.IGNORECASE)
 
     def retrieve_table(self, table_name):
         qry = ql.retrieve_table(table_name)
         rs = self._execute(qry)
         return rs.get_result_table()
 
+    def set_fetch_mode(self, mode: str):
+        """
+        Set how query results are fetched by retrieve_result
+        @param mode: one of FETCH_MODES
+        @return:
+        """
+        if mode not in FETCH_MODES:
+            raise ValueError('Unsupported fetch mode {}, expected one of {}'.format(mode, FETCH_MODES))
+        self.fetch_mode = mode
+
+    def set_result_format(self, fmt: str):
+        """
+        Set the kind of dataframes query results are materialized into
+        @param fmt: one of RESULT_FORMATS
+        @return:
+        """
+        if fmt not in RESULT_FORMATS:
+            raise ValueError('Unsupported result format {}, expected one of {}'.format(fmt, RESULT_FORMATS))
+        if fmt == 'arrow' and not arrow_utils.available():
+            raise ValueError('The arrow result format requires pyarrow')
+        self.result_format = fmt
+
+    def retrieve_result(self, qry) -> ResultSet | None:
+        if self.fetch_mode == 'binary':
+            rs = self._retrieve_binary(qry)
+            if rs is not None:
+                return rs
+        return self._execute(qry)
+
+    def stream_result(self, qry, itersize: int = DEFAULT_ITERSIZE):
+        """
+        Execute a query with a named server side cursor and fetch the result in chunks
+        @param qry:
+        @param itersize: number of rows per chunk
+        @return: generator of ResultSet
+        """
+        with self._cursor(qry) as (conn, _):
+            # a server side cursor has to live inside a transaction
+            with conn.transaction(), conn.cursor(name='aidac_'+uuid.uuid4().hex) as cursor:
+                cursor.itersize = itersize
+                cursor.execute(qry)
+                while True:
+                    rows = cursor.fetchmany(itersize)
+                    if not rows:
+                        break
+                    yield ResultSet(cursor.description, rows)
+
+    def _retrieve_binary(self, qry) -> ResultSet | None:
+        """
+        stream the query result with COPY TO STDOUT (FORMAT BINARY) and decode it into numpy columns
+        @param qry:
+        @return: None if the result has column types the binary reader does not support, e.g. json
+        """
+        cols = self.describe_result(qry)
+        if not BinaryCopyReader.supported(cols):
+            return None
+        with self._cursor(qry) as (conn, cursor):
+            reader = BinaryCopyReader(cols)
+            with cursor.copy(ql.copy_to_binary(qry)) as copy:
+                for block in copy:
+                    if reader.feed(block):
+                        reader.decode()
+        return ResultSet.from_table(cols, reader.finish())
+
+    def describe_result(self, qry):
+        """
+        @param qry:
+        @return: cursor description of the query result, cached by query text
+        """
+        return self.catalog.get(DESCRIPTION, qry, lambda: self._execute(ql.describe_query(qry)).columns)
+
     def get_hist(self, table_name:str, column_name:str):
+        return self.catalog.get(HIST, (table_name, column_name), lambda: self._load_hist(table_name, column_name))
+
+    def _load_hist(self, table_name:str, column_name:str):
+        """
+        Load the statistics postgres keeps for a column
+        @param table_name:
+        @param column_name:
+        @return: (table name, null fraction, distinct values, most common values, their frequencies),
+                 None if the table has not been analyzed
+        """
         qry = ql.get_hist(table_name, column_name)
         rs = self._execute(qry)
-        # n_distinct = -1 if all values are distinct, otherwise a negative fraction is used
-        # todo: maybe we can optimise this later
-        table_name, null_frac, n_distinct, mcv = rs.get_value()
-        # need to calculate the actual distinct values
-        n_distinct = self.row_count(table_name) * (-n_distinct)
-        return table_name, null_frac, n_distinct, mcv
+        if not rs.data:
+            return None
+        table_name, null_frac, n_distinct, mcv, mcf = rs.get_value()
+        # a negative n_distinct is the number of distinct values divided by the row count (-1 if all are distinct)
+        if n_distinct < 0:
+            n_distinct = self.row_count(table_name) * (-n_distinct)
+        return table_name, null_frac, n_distinct, mcv, mcf
 
     def get_estimation(self, qry):
-        self._execute(ql.drop_estimation_func())
-        self._execute(ql.create_estimation_func())
-        qry = ql.get_estimation(qry)
-        return self._execute(qry).get_value()
-
-    def _execute(self, qry) -> ResultSet | None:
-        self.__cursor.execute(qry)
-        if self.__cursor.description is not None:
-            # as no record returned for insert, update queries
-            # todo: change column type here
-            rs = ResultSet(self.__cursor.description, self.__cursor.fetchall())
-            return rs
-        return None
-
-    def _execute(self, qry, *args) -> ResultSet | None:
-        self.__cursor.execute(qry, args)
-        if self.__cursor.description is not None:
-            # as no record returned for insert, update queries
-            # todo: change column type here
-            rs = ResultSet(self.__cursor.description, self.__cursor.fetchall())
-            return rs
-        self.__conn.commit()
-        return None
+        """
+        Estimate the row count and row width of a query from its plan, estimates are cached by query text
+        @param qry:
+        @return: (rows, width)
+        """
+        return self.catalog.get(ESTIMATE, qry, lambda: self._load_estimation(qry))
+
+    def _load_estimation(self, qry):
+        self._prepare_estimation()
+        return self._execute(ql.get_estimation(qry)).get_value()
+
+    def _prepare_estimation(self):
+        if not self._estimation_ready:
+            with _estimation_func_lock:
+                # the helper function only needs to be (re)created once per connection
+                # it is replaced in place, so estimations of other data sources never miss it
+                if not self._estimation_ready:
+                    self._execute(ql.create_estimation_func())
+                    self._estimation_ready = True
+
+    def _execute(self, qry, *args, session=False) -> ResultSet | None:
+        with self._cursor(qry, session) as (conn, cursor):
+            # without parameters, '%' in the query (e.g. LIKE patterns) must not be parsed as placeholders
+            cursor.execute(qry, args if args else None)
+            if cursor.description is not None:
+                # as no record returned for insert, update queries
+                # todo: change column type here
+                rs = ResultSet(cursor.description, cursor.fetchall())
+                return rs
+            conn.commit()
+            return None
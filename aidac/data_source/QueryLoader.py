@@ -49,9 +49,38 @@ class QueryLoader:
         """
         return self.load_query('copy_data').format(table_name, col)
 
+    def copy_csv(self, table_name, col, null):
+        """
+        Copy csv formatted data from STDIN
+        @param table_name: table to copy the data to (must exist forehead)
+        @param col: columns to be inserted
+        @param null: string that represents a null value
+        @return:
+        """
+        return self.load_query('copy_csv').format(table_name, col, null)
+
+    def copy_to_binary(self, qry):
+        """
+        Copy the result of a query to STDOUT in binary format
+        @param qry: query to be copied
+        @return:
+        """
+        return self.load_query('copy_to_binary').format(qry)
+
+    def describe_query(self, qry):
+        """
+        Get the result columns of a query without fetching any row
+        @param qry:
+        @return:
+        """
+        return self.load_query('describe_query').format(qry)
+
     def row_card(self, table):
         return self.load_query('row_num').format(table)
 
+    def row_card_estimate(self, table):
+        return self.load_query('row_num_estimate').format(table)
+
     def column_card(self, table):
         return self.load_query('column_num').format(table)
 
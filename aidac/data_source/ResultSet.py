@@ -1,13 +1,110 @@
 import collections
+import operator
 from collections.abc import Iterable
 
 import numpy as np
+import pandas as pd
+
+from aidac.common import arrow_utils
+
+try:
+    # optional C extension built from aidac/python_module
+    from convert import convert as _c_convert
+except ImportError:
+    _c_convert = None
+
+# postgres type oid -> numpy dtype used for the columnar conversion
+# types not listed here (text, date, json ...) are kept as python objects
+oid_converter = {16: np.bool_, 20: np.int64, 21: np.int16, 23: np.int32, 26: np.int64,
+                 700: np.float32, 701: np.float64, 1700: np.float64,
+                 1114: 'datetime64[us]'}
+
+
+def _column_dtype(col):
+    """
+    infer the numpy dtype of a column from the cursor description
+    @param col: a column in the cursor description
+    @return: numpy dtype, None if the type cannot be inferred
+    """
+    type_code = getattr(col, 'type_code', None)
+    if type_code is None and isinstance(col, tuple) and len(col) > 1:
+        type_code = col[1]
+    return oid_converter.get(type_code)
+
+
+def _to_column(values, dtype):
+    """
+    convert a sequence of python values to a numpy array in bulk
+    nullable integer columns become float columns with NaN, nullable booleans stay as objects
+    @param values: the values of one column
+    @param dtype: expected numpy dtype, None to keep the values as objects
+    @return: numpy array
+    """
+    if dtype is None:
+        return np.array(values, dtype=object)
+    dtype = np.dtype(dtype)
+    if dtype.kind != 'b':
+        # fast path, numpy converts the values directly (None becomes NaN / NaT for float and datetime)
+        try:
+            return np.array(values, dtype=dtype)
+        except (TypeError, ValueError):
+            pass
+    arr = np.array(values, dtype=object)
+    nulls = np.equal(arr, None)
+    if not nulls.any():
+        return arr.astype(dtype)
+    if dtype.kind in 'iu':
+        return arr.astype(np.float64)
+    if dtype.kind in 'fM':
+        return arr.astype(dtype)
+    return arr
 
 
 class ResultSet:
-    def __init__(self, cols: Iterable, data: Iterable):
+    def __init__(self, cols: Iterable, data: Iterable, columnar=True, accelerated=True):
+        """
+        @param cols: cursor description
+        @param data: list of fetched row tuples
+        @param columnar: convert the rows to columns in bulk, otherwise convert cell by cell
+        @param accelerated: use the convert C extension for the columnar conversion if it is installed
+        """
         self.columns = cols
         self.data = data
+        self.columnar = columnar
+        self.accelerated = accelerated
+        self._table_ = None
+
+    @classmethod
+    def from_table(cls, cols: Iterable, table: collections.OrderedDict):
+        """
+        wrap columns that are already converted (e.g. decoded from a binary copy)
+        @param cols: cursor description
+        @param table: ordered dict of column name -> numpy array
+        @return:
+        """
+        rs = cls(cols, None)
+        rs._table_ = table
+        return rs
+
+    @classmethod
+    def concat(cls, chunks: Iterable):
+        """
+        concatenate result set chunks (e.g. from a streamed query) into one result set
+        @param chunks: result sets with the same columns
+        @return:
+        """
+        tables = []
+        cols = None
+        for rs in chunks:
+            cols = rs.columns
+            tables.append(rs.get_result_table())
+        if not tables:
+            return None
+
+        od = collections.OrderedDict()
+        for name in tables[0]:
+            od[name] = np.concatenate([t[name] for t in tables])
+        return cls.from_table(cols, od)
 
     def get_result_ls(self):
         """
@@ -40,6 +137,78 @@ class ResultSet:
         return rs
 
     def get_result_table(self):
+        if self._table_ is not None:
+            return self._table_
+        if self.columnar:
+            return self._get_columnar_table()
+        return self._get_row_table()
+
+    def to_arrow(self):
+        """
+        @return: the result as a pyarrow Table, built once from the result columns
+        """
+        if getattr(self, '_arrow_', None) is None:
+            self._arrow_ = arrow_utils.table_from_columns(self.get_result_table())
+        return self._arrow_
+
+    def to_frame(self, arrow: bool = False) -> pd.DataFrame:
+        """
+        @param arrow: return a dataframe with arrow backed columns sharing the buffers of the result,
+        otherwise the numpy columns are copied into a consolidated dataframe
+        @return:
+        """
+        if arrow and arrow_utils.available():
+            return arrow_utils.to_pandas(self.to_arrow())
+        return pd.DataFrame(self.get_result_table())
+
+    def _get_columnar_table(self):
+        """
+        gather each column of the fetched rows and convert it with the dtype from the cursor description
+        @return: ordered dict of column name -> numpy array
+        """
+        od = collections.OrderedDict()
+        if not self.data:
+            # keep the column names and types of an empty result
+            for col in self.columns:
+                od[col.name] = np.empty(0, dtype=_column_dtype(col) or object)
+            return od
+
+        if self.accelerated and _c_convert is not None:
+            converted = self._c_convert_table()
+            if converted is not None:
+                return converted
+
+        rows = self.data if isinstance(self.data, list) else list(self.data)
+        for idx, col in enumerate(self.columns):
+            # one list per column, transposing all rows with zip(*rows) at once is slower on tall results
+            od[col.name] = _to_column(list(map(operator.itemgetter(idx), rows)), _column_dtype(col))
+        return od
+
+    def _c_convert_table(self):
+        """
+        convert the rows with the C extension, the arrays are then cast to the dtypes of the cursor description
+        @return: ordered dict of column name -> numpy array, None if the C extension failed
+        """
+        names = [col.name for col in self.columns]
+        if len(set(names)) != len(names):
+            # the extension returns a dict keyed by column name
+            return None
+        rows = self.data if isinstance(self.data, list) else list(self.data)
+        try:
+            converted = _c_convert(rows, names, len(rows), len(names))
+        except (TypeError, ValueError, IndexError, KeyError):
+            return None
+
+        od = collections.OrderedDict()
+        for col in self.columns:
+            arr = converted[col.name]
+            dtype = _column_dtype(col)
+            if dtype is not None and arr.dtype != dtype:
+                arr = _to_column(arr, dtype) if arr.dtype == object else arr.astype(dtype)
+            od[col.name] = arr
+        return od
+
+    def _get_row_table(self):
         od = collections.OrderedDict()
 
         def _gen_type(data, row, col):
@@ -0,0 +1,93 @@
+from __future__ import annotations
+
+import sqlite3
+import threading
+import weakref
+
+import numpy as np
+import pandas as pd
+
+# numpy kinds (bool, int, uint, float) sqlite stores with the same meaning
+_NATIVE_KINDS = 'biuf'
+
+
+def supported(data: pd.DataFrame, compared=()) -> bool:
+    """
+    check if a frame can be loaded without changing how its values compare, e.g. timestamps would become text
+    that the generated SQL compares as strings
+    @param data:
+    @param compared: columns used in filters, a null never matches there in SQL while pandas keeps it for <>
+    @return:
+    """
+    for _, series in data.items():
+        if not isinstance(series.dtype, np.dtype):
+            return False
+        if series.dtype.kind in _NATIVE_KINDS:
+            continue
+        if series.dtype != object or pd.api.types.infer_dtype(series, skipna=True) not in ('string', 'empty'):
+            return False
+    return not any(data[c].isnull().any() for c in compared)
+
+
+class SQLiteEngine:
+    """
+    Executes the generated SQL of a lineage on local frames in an in-memory SQLite database, so a chain of
+    filters and projections runs as one query instead of one pandas call per transform.
+    A frame is loaded once and reused by later queries until its data is replaced or the frame is released.
+    """
+    def __init__(self):
+        self._conn = None
+        # queries may come from the worker threads of the executor, they share the connection one at a time
+        self._lock = threading.RLock()
+        # table name -> weak reference to the data loaded into it
+        self._loaded = {}
+        # tables of released frames, dropped before the next query
+        self._released = []
+
+    def execute(self, sql: str, tables: dict, columns: dict = None) -> pd.DataFrame:
+        """
+        @param sql: query on the tables
+        @param tables: table name -> local dataframe
+        @param columns: expected output columns of the query, used to restore boolean columns
+        @return: the query result
+        @raise sqlite3.Error: if sqlite cannot run the query, e.g. it uses postgres specific syntax
+        """
+        with self._lock:
+            conn = self._connection()
+            for name, df in tables.items():
+                self._load(conn, name, df)
+            cursor = conn.execute(sql)
+            names = [d[0] for d in cursor.description]
+            result = pd.DataFrame.from_records(cursor.fetchall(), columns=names)
+        if columns:
+            for cname, col in columns.items():
+                # sqlite has no boolean type, they are returned as integers
+                if cname in result.columns and col.dtype in (bool, np.bool_) and not result[cname].isnull().any():
+                    result[cname] = result[cname].astype(bool)
+        return result
+
+    def _connection(self):
+        if self._conn is None:
+            self._conn = sqlite3.connect(':memory:', check_same_thread=False)
+        while self._released:
+            name = self._released.pop()
+            self._loaded.pop(name, None)
+            self._conn.execute('DROP TABLE IF EXISTS "{}"'.format(name))
+        return self._conn
+
+    def _load(self, conn, name, df):
+        stored = df._stored_
+        ref = self._loaded.get(name)
+        if ref is not None and ref() is stored:
+            return
+        df.data.to_sql(name, conn, index=False, if_exists='replace')
+        if ref is None:
+            weakref.finalize(df, self._release, name)
+        self._loaded[name] = weakref.ref(stored)
+
+    def _release(self, name):
+        # called when the frame is garbage collected, possibly while a query runs, so the table is dropped later
+        self._released.append(name)
+
+
+sqlite_engine = SQLiteEngine()
@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import asyncio
 import weakref
 from collections.abc import Iterable
 
@@ -7,6 +8,10 @@ from aidac.data_source.DataSourceManager import manager
 from aidac.common.meta import MetaInfo
 import aidac.dataframe.frame as frame
 from aidac.exec.Executable import *
+from aidac.exec import ResultCache
+from aidac.exec.ParallelExecutor import ParallelExecutor, DEFAULT_WORKERS
+from aidac.dataframe.optimizer import push_down_filters, prune_columns, reorder_joins, \
+    push_down_partial_aggregates, share_common_inputs, push_down_limits
 
 LOCAL_DS = '_local'
 
@@ -35,18 +40,54 @@ def is_local(df1: frame.DataFrame, df2: frame.DataFrame):
 
 
 class Scheduler:
-    def __init__(self):
+    def __init__(self, parallel=True, max_workers=None, source_limits=None):
+        """
+        @param parallel: run independent branches of the plan concurrently
+        @param max_workers: number of worker threads of the parallel executor
+        @param source_limits: job name -> max number of concurrent nodes on that data source
+        """
         self.sources = {}
         self.source_manager = manager
+        self.parallel = parallel
+        self.executor = ParallelExecutor(max_workers or DEFAULT_WORKERS, source_limits)
 
-    def execute(self, df: frame.DataFrame):
+    def execute(self, df: frame.DataFrame, chunksize=None):
         """
         materialize the lineage, execute util the data to be transfered to another data source
         @param df:
+        @param chunksize: if given, return the result as a generator of dataframe chunks instead of storing it
+        @return:
+        """
+        root_ex = self._plan(df)
+        if self.parallel:
+            return self.executor.run(root_ex, chunksize)
+        return root_ex.process(chunksize)
+
+    async def execute_async(self, df: frame.DataFrame):
+        """
+        materialize the lineage without blocking the event loop
+        the plan is built in a worker thread as the estimations are blocking calls
+        @param df:
         @return:
         """
+        root_ex = await asyncio.to_thread(self._plan, df)
+        return await root_ex.process_async()
+
+    def _plan(self, df: frame.DataFrame):
+        """
+        build the executable tree of the lineage and pick the data sources to run it on
+        @param df:
+        @return: planned RootExecutable
+        """
+        # id of a dataframe -> its executable, a dataframe read by several others is executed once
+        built = {}
+
         def _gen_pipe(df):
+            if id(df) in built:
+                built[id(df)].refs += 1
+                return built[id(df)]
             ex1 = Executable(df)
+            built[id(df)] = ex1
             stack = [df]
             while stack:
                 cur = stack.pop()
@@ -67,10 +108,18 @@ class Scheduler:
                         ex1.add_prereq(sblock)
             return ex1
         # self._dfs_link_ds(df)
+        # results computed before are reused, the lineage is fingerprinted before it is rewritten
+        ResultCache.lookup(df)
+        push_down_filters(df)
+        push_down_limits(df)
+        reorder_joins(df)
+        push_down_partial_aggregates(df)
+        prune_columns(df)
+        share_common_inputs(df)
         ex = _gen_pipe(df)
         root_ex = RootExecutable()
         root_ex.add_prereq(ex)
         my_plan = root_ex.plan()
         print(my_plan)
-        return root_ex.process()
+        return root_ex
 
@@ -11,12 +11,13 @@ import numpy as np
 from typing import Union, List, Dict
 
 from aidac.common.aidac_types import *
+from aidac.common.block_manager import Block
 from _distutils_hack import override
 
 from aidac.common.column import Column
 from aidac.data_source.DataSource import DataSource, local_ds
 from aidac.dataframe.transforms import *
-from aidac.exec.Executable import Executable
+from aidac.exec.Executable import Executable, iter_chunks
 import pandas as pd
 import uuid
 
@@ -58,7 +59,7 @@ def binary_op_local_frame_wrapper(func):
         df = func(self, other)
         df.source_table = self.source_table
         df._saved_func_name_ = func_name
-        df._saved_args_ = other
+        df._saved_args_ = (other,)
         return df
     return inner
 
@@ -165,18 +166,47 @@ class DataFrame:
         tb = DataFrame(transform=trans, ds=self.data_source)
         return tb
 
-    def materialize(self):
+    def materialize(self, chunksize=None):
+        """
+        @param chunksize: if given, the result is not kept in the dataframe but returned as an iterator of
+        pandas dataframes with at most chunksize rows, so results larger than the memory can be processed
+        @return:
+        """
+        if chunksize:
+            if self.data is not None:
+                return iter_chunks(self.data, chunksize)
+            return sc.execute(self, chunksize)
         if self.data is None:
             sc.execute(self)
         return self.data
 
+    async def materialize_async(self):
+        """
+        materialize the dataframe without blocking the event loop, so many lineages can be in flight at once
+        @return:
+        """
+        if self.data is None:
+            await sc.execute_async(self)
+        return self.data
+
     @property
     def data(self):
         return self._data_
 
+    @property
+    def _data_(self):
+        # a materialized result may be a block managed by the block manager, it is paged in when read
+        stored = self._stored_
+        return stored.get() if isinstance(stored, Block) else stored
+
+    @_data_.setter
+    def _data_(self, data):
+        self._stored_ = data
+
     def clear_lineage(self):
         del self._transform_
         self._transform_ = None
+        lineage_changed()
 
     def set_ds(self, ds):
         self._ds_ = ds
@@ -221,6 +251,8 @@ class DataFrame:
                 cols = {}
                 # create columns using pandas index column name and types
                 for cname, ctype in zip(self._data_.dtypes.index, self._data_.dtypes):
+                    # extension dtypes, e.g. arrow backed columns, are typed by their numpy equivalent
+                    ctype = getattr(ctype, 'numpy_dtype', ctype)
                     if isinstance(ctype, np.dtype):
                         ctype = ctype.type
                     cols[cname] = Column(cname, ctype)
@@ -37,7 +37,9 @@ class WFrame:
         self._frame_stubs.append(new_df)
         self._tail_frame = new_df
 
-    def materialize(self):
+    def materialize(self, chunksize=None):
+        if chunksize:
+            return self._tail_frame.materialize(chunksize)
         self._tail_frame.materialize()
         if len(self._frame_stubs) > 1:
             for df in self._frame_stubs[:-1]:
@@ -45,6 +47,15 @@ class WFrame:
                     df._data_ = self._tail_frame[df.columns.keys()]
                     df.clear_lineage()
 
+    async def materialize_async(self):
+        data = await self._tail_frame.materialize_async()
+        if len(self._frame_stubs) > 1:
+            for df in self._frame_stubs[:-1]:
+                if df.data is None:
+                    df._data_ = self._tail_frame[df.columns.keys()]
+                    df.clear_lineage()
+        return data
+
     #####################################33
     # Dataframe method wrapper
     ########################################33
@@ -0,0 +1,937 @@
+from __future__ import annotations
+
+import copy
+import functools
+import re
+
+import numpy as np
+import pandas as pd
+
+from aidac.common.aidac_types import is_type, ArrayLike
+from aidac.common.hist import Histgram
+from aidac.dataframe import frame
+from aidac.exec.Executable import get_hist, local_width, row_limit
+from aidac.exec.ResultCache import lineage_fingerprint, Uncacheable
+from aidac.exec.utils import estimate_join_selectivity
+from aidac.data_source.DataSourceManager import LOCAL_DS
+from aidac.dataframe.transforms import SQLProjectionTransform, SQLJoinTransform, SQLFilterTransform, SQLQuery, \
+    SQLGroupByTransform, SQLAGG_Transform, SQLGroupedAggTransform, SQLHeadTransform, SQLOrderTransform, \
+    PUSHABLE_SIDES, lineage_changed
+
+# comparison operator of a SQLFilterTransform -> DataFrame method building the same filter
+COMPARE_FUNCS = {'=': '__eq__', '<>': '__ne__', '>': '__gt__', '>=': '__ge__', '<': '__lt__', '<=': '__le__'}
+COMBINE_FUNCS = {'AND': '__and__', 'OR': '__or__'}
+
+# aggregate functions that can be computed from partial aggregates, 'avg' / 'mean' from a partial sum and count
+DECOMPOSABLE_FUNCS = {'count', 'sum', 'min', 'max', 'avg', 'mean'}
+# a join input is aggregated before the join if its estimated groups are at most this fraction of its rows
+PARTIAL_AGG_MAX_RATIO = 0.5
+# number of source rows of a partial aggregate
+PARTIAL_ROWS = 'aidac_rows'
+# join type -> input whose rows all appear in the join result, so the first n rows of the result come from at most
+# n of its rows
+LIMIT_PRESERVED_SIDE = {'left': 0, 'right': 1}
+
+# words of a query expression that are not column names
+QUERY_KEYWORDS = {'and', 'or', 'not', 'in', 'is', 'null', 'between', 'like', 'ilike', 'true', 'false'}
+_IDENTIFIER = re.compile(r'[A-Za-z_][A-Za-z0-9_]*')
+_STRING_LITERAL = re.compile(r'\'[^\']*\'|"[^"]*"')
+
+
+class Predicate:
+    """
+    A filter taken from the lineage that can be re-applied on another dataframe.
+    It is either a comparison of columns with a constant, an AND / OR of two predicates or a query expression.
+    Column names refer to the dataframe the filter was applied on.
+    """
+    def __init__(self, op, columns=None, other=None, children=None, expr=None):
+        self.op = op
+        self.columns = columns or []
+        self.other = other
+        self.children = children or []
+        self.expr = expr
+
+    def all_columns(self):
+        cols = list(self.columns)
+        for child in self.children:
+            cols.extend(child.all_columns())
+        return cols
+
+    def can_rename(self):
+        # a query expression is kept as text, so its columns cannot be renamed
+        return self.expr is None
+
+    def _build_key(self, df, mapping):
+        if self.op in COMBINE_FUNCS:
+            left = self.children[0]._build_key(df, mapping)
+            right = self.children[1]._build_key(df, mapping)
+            return getattr(left, COMBINE_FUNCS[self.op])(right)
+        names = [mapping[c] for c in self.columns]
+        proj = df[names[0]] if len(names) == 1 else df[names]
+        return getattr(proj, COMPARE_FUNCS[self.op])(self.other)
+
+    def apply(self, df, mapping):
+        """
+        filter a dataframe with this predicate
+        @param df:
+        @param mapping: column name used by the predicate -> column name in df
+        @return: filtered dataframe, it is evaluated right away if df is local
+        """
+        if self.expr is not None:
+            return df.query(self.expr)
+        return df[self._build_key(df, mapping)]
+
+    def local_safe(self):
+        """
+        a multi column key on a local dataframe is a frame mask, which pandas applies cell-wise instead of row-wise
+        """
+        return len(self.columns) <= 1 and all(c.local_safe() for c in self.children)
+
+
+def _predicate_from_key(key, src) -> Predicate | None:
+    trans = key.transform
+    if not isinstance(trans, SQLFilterTransform):
+        return None
+    if trans._op_ in COMBINE_FUNCS:
+        left = _predicate_from_key(trans._source_, src)
+        right = _predicate_from_key(trans._other_, src)
+        if left is None or right is None:
+            return None
+        return Predicate(trans._op_, children=[left, right])
+    if trans._op_ not in COMPARE_FUNCS or isinstance(trans._other_, frame.DataFrame):
+        return None
+
+    # the compared columns have to be plain columns selected from the filtered dataframe
+    fsrc = trans._source_
+    if not isinstance(fsrc.transform, SQLProjectionTransform) or fsrc.transform._source_ is not src:
+        return None
+    cols = []
+    for col in fsrc.columns.values():
+        if col.column_expr:
+            return None
+        cols.append(col.srccol[0])
+    return Predicate(trans._op_, columns=cols, other=trans._other_)
+
+
+def _predicate_from_query(trans: SQLQuery, src) -> Predicate | None:
+    expr = _STRING_LITERAL.sub('', trans._query_)
+    cols = []
+    for word in _IDENTIFIER.findall(expr):
+        if word in src.columns:
+            cols.append(word)
+        elif word.lower() not in QUERY_KEYWORDS:
+            return None
+    return Predicate(None, columns=cols, expr=trans._query_)
+
+
+def extract_filter(df):
+    """
+    @param df:
+    @return: (filtered source, predicate) if df only filters the rows of its source, otherwise None
+    """
+    trans = df.transform
+    if isinstance(trans, SQLQuery):
+        pred = _predicate_from_query(trans, trans._source_)
+        return (trans._source_, pred) if pred else None
+    if isinstance(trans, SQLProjectionTransform) and is_type(trans._source_, ArrayLike):
+        src, key = trans._source_[0], trans._source_[1]
+        if list(trans.columns.keys()) != list(src.columns.keys()):
+            return None
+        pred = _predicate_from_key(key, src)
+        return (src, pred) if pred else None
+    return None
+
+
+def _pushable_to(df, pred: Predicate) -> bool:
+    return df.data is None or pred.local_safe()
+
+
+def _push_through_join(src, pred: Predicate):
+    """
+    move the filter to the side of the join that owns all its columns
+    @return: the rewritten join, None if the filter cannot be moved
+    """
+    trans = src.transform
+    sides = [trans._source1_, trans._source2_]
+    if sides[0].table_name == sides[1].table_name:
+        return None
+    side_idx = None
+    mapping = {}
+    for cname in pred.all_columns():
+        col = trans.columns.get(cname)
+        if col is None:
+            return None
+        idx = 0 if col.tablename == sides[0].table_name else 1
+        if side_idx is not None and idx != side_idx:
+            return None
+        if col.srccol[0] != cname and not pred.can_rename():
+            return None
+        side_idx = idx
+        mapping[cname] = col.srccol[0]
+    if side_idx is None or side_idx not in PUSHABLE_SIDES.get(trans._jointype_, ()):
+        return None
+    if not _pushable_to(sides[side_idx], pred):
+        return None
+
+    sides[side_idx] = pred.apply(sides[side_idx], mapping)
+    return sides[0].merge(sides[1], **src._saved_kwargs_)
+
+
+def _push_through_projection(src, pred: Predicate):
+    """
+    move the filter below a projection that only selects columns of its source
+    @return: the rewritten projection, None if the filter cannot be moved
+    """
+    trans = src.transform
+    base = trans._source_
+    if is_type(base, ArrayLike) or not all(isinstance(c, str) for c in trans._projcols_):
+        return None
+    mapping = {}
+    for cname in pred.all_columns():
+        col = trans.columns.get(cname)
+        if col is None or col.column_expr:
+            return None
+        if col.srccol[0] != cname and not pred.can_rename():
+            return None
+        mapping[cname] = col.srccol[0]
+    if not _pushable_to(base, pred):
+        return None
+    return pred.apply(base, mapping)[list(trans._projcols_)]
+
+
+def _replace(df, new):
+    """
+    make df compute the same as new while keeping its identity, as parents and the user hold references to it
+    """
+    if new.data is not None:
+        df._data_ = new.data
+        df._transform_ = None
+    else:
+        df._transform_ = new.transform
+        df._saved_func_name_ = new._saved_func_name_
+        df._saved_args_ = new._saved_args_
+        df._saved_kwargs_ = new._saved_kwargs_
+    df._ds_ = new._ds_
+    lineage_changed()
+
+
+def _main_sources(df):
+    trans = df.transform
+    if trans is None:
+        return []
+    if isinstance(trans, SQLJoinTransform):
+        return [trans._source1_, trans._source2_]
+    sources = trans.sources()
+    if is_type(sources, ArrayLike):
+        # the other entries are filter keys which are evaluated together with the first source
+        return [sources[0]]
+    return [sources] if isinstance(sources, frame.DataFrame) else []
+
+
+def push_down_filters(df, _visited=None):
+    """
+    Rewrite the lineage of df so that filters are evaluated as close to the source tables as possible:
+    a filter on a join result is moved to the join input owning its columns and a filter on a projection
+    is moved below it. This way a filter runs on the data source that owns the data, before it is transferred.
+    @param df:
+    @return:
+    """
+    if _visited is None:
+        _visited = set()
+    if id(df) in _visited or df.data is not None or df.transform is None:
+        return
+    _visited.add(id(df))
+
+    # optimize the inputs first, a filter moved into them may turn them into joins / projections
+    for src in _main_sources(df):
+        push_down_filters(src, _visited)
+
+    extracted = extract_filter(df)
+    if extracted is None:
+        return
+    src, pred = extracted
+    if src.data is not None:
+        return
+    if isinstance(src.transform, SQLJoinTransform):
+        new = _push_through_join(src, pred)
+    elif isinstance(src.transform, SQLProjectionTransform):
+        new = _push_through_projection(src, pred)
+    else:
+        new = None
+    if new is None:
+        return
+    _replace(df, new)
+    for s in _main_sources(df):
+        push_down_filters(s, _visited)
+
+
+def _push_limit(df):
+    """
+    move a head on a join across data sources, possibly ordered and projected, to the input the join preserves,
+    with the ordering if it is on columns of that input (a top-n query): the input then only sends n rows
+    @return: the rewritten head, None if the limit cannot be moved
+    """
+    n = df.transform._num_
+    if not isinstance(n, int) or n < 0:
+        return None
+    steps = []
+    cur = df.transform._source_
+    # projections only select columns, so the order keys keep their names down to the join
+    while cur.data is None and (_is_plain_projection(cur.transform) or
+                                (isinstance(cur.transform, SQLOrderTransform) and
+                                 not any(isinstance(s.transform, SQLOrderTransform) for s in steps))):
+        steps.append(cur)
+        cur = cur.transform._source_
+    join = cur
+    if join.data is not None or not isinstance(join.transform, SQLJoinTransform) or join._saved_func_name_ != 'merge':
+        return None
+    trans = join.transform
+    sides = list(trans.sources())
+    if trans._jointype_ not in LIMIT_PRESERVED_SIDE or not _cross_source(sides) \
+            or sides[0].table_name == sides[1].table_name:
+        return None
+    idx = LIMIT_PRESERVED_SIDE[trans._jointype_]
+    side = sides[idx]
+    limit = row_limit(side)
+    if limit is not None and limit <= n:
+        return None
+
+    order = next((s.transform for s in steps if isinstance(s.transform, SQLOrderTransform)), None)
+    if order is None:
+        sides[idx] = side.head(n)
+    else:
+        keys = [order._order_] if isinstance(order._order_, str) else list(order._order_)
+        side_keys = []
+        for key in keys:
+            col = trans.columns.get(key)
+            if col is None or col.column_expr or col.tablename != side.table_name:
+                return None
+            side_keys.append(col.srccol[0])
+        sides[idx] = side.sort_values(side_keys, ascending=order._ascending_).head(n)
+
+    new = sides[0].merge(sides[1], **join._saved_kwargs_)
+    for step in reversed(steps):
+        if isinstance(step.transform, SQLOrderTransform):
+            new = new.sort_values(step.transform._order_, ascending=step.transform._ascending_)
+        else:
+            new = new[list(step.transform._projcols_)]
+    return new.head(n)
+
+
+def push_down_limits(df, _visited=None):
+    """
+    Rewrite the lineage of df so that a head (or an ordering followed by a head) on an outer join across data
+    sources is also applied to the join input whose rows are all kept, on the data source owning it.
+    Only the rows that can reach the result are transferred instead of the whole input.
+    @param df:
+    @return:
+    """
+    if _visited is None:
+        _visited = set()
+    if id(df) in _visited or df.data is not None or df.transform is None:
+        return
+    _visited.add(id(df))
+
+    if isinstance(df.transform, SQLHeadTransform) and df._saved_func_name_ == 'head':
+        new = _push_limit(df)
+        if new is not None:
+            _replace(df, new)
+    for src in _main_sources(df):
+        push_down_limits(src, _visited)
+
+
+def _ordered(df, names):
+    return [c for c in df.columns if c in names]
+
+
+def _referenced_columns(col, src_cols):
+    """
+    @return: the source columns a projected column is computed from
+    """
+    if col.column_expr:
+        return {w for w in _IDENTIFIER.findall(_STRING_LITERAL.sub('', col.column_expr)) if w in src_cols}
+    return {col.srccol[0]}
+
+
+def _is_plain_projection(trans):
+    return isinstance(trans, SQLProjectionTransform) and not is_type(trans._source_, ArrayLike) \
+        and all(isinstance(c, str) for c in trans._projcols_)
+
+
+def _narrow(df, needed: set):
+    """
+    @return: a dataframe computing the needed columns of df (and maybe join keys), None if df is not narrowed
+    """
+    if not needed < set(df.columns):
+        return None
+    new = _prune(df, needed)
+    if new is None:
+        new = df[_ordered(df, needed)]
+    return new
+
+
+def _join_keys(keys):
+    if keys is None:
+        return set()
+    return {keys} if isinstance(keys, str) else set(keys)
+
+
+def _prune(df, needed: set):
+    """
+    rewrite the lineage below df so that it only computes the needed columns
+    @return: the rewritten dataframe, None if nothing could be pruned
+    """
+    if df.data is not None or df.transform is None:
+        return None
+    trans = df.transform
+    if isinstance(trans, SQLJoinTransform):
+        sides = [trans._source1_, trans._source2_]
+        if sides[0].table_name == sides[1].table_name:
+            return None
+        keys = [_join_keys(k) for k in trans.join_cols]
+        # columns sharing a name are suffixed differently by pandas and sql, keep them as they are
+        if (set(sides[0].columns) & set(sides[1].columns)) - (keys[0] & keys[1]):
+            return None
+        side_needed = [set(keys[0]), set(keys[1])]
+        for cname in needed:
+            col = trans.columns[cname]
+            side_needed[0 if col.tablename == sides[0].table_name else 1].add(col.srccol[0])
+        new_sides = [_narrow(side, need) for side, need in zip(sides, side_needed)]
+        if new_sides[0] is None and new_sides[1] is None:
+            return None
+        new_sides = [new if new is not None else side for new, side in zip(new_sides, sides)]
+        return new_sides[0].merge(new_sides[1], **df._saved_kwargs_)
+
+    if _is_plain_projection(trans):
+        base = trans._source_
+        base_needed = set()
+        for cname in needed:
+            base_needed |= _referenced_columns(trans.columns[cname], base.columns)
+        new_base = _narrow(base, base_needed)
+        if new_base is None:
+            return None
+        return new_base[_ordered(df, needed)]
+
+    extracted = extract_filter(df)
+    if extracted is not None:
+        src, pred = extracted
+        new_src = _narrow(src, needed | set(pred.all_columns()))
+        if new_src is None or not _pushable_to(new_src, pred):
+            return None
+        return pred.apply(new_src, {c: c for c in pred.all_columns()})
+    return None
+
+
+def prune_columns(df, _visited=None):
+    """
+    Rewrite the lineage of df so that the inputs below a column projection only produce the columns that are
+    referenced above them. Join inputs keep the join keys and the needed columns, so both the fetched results
+    and the transferred tables get narrower.
+    @param df:
+    @return:
+    """
+    if _visited is None:
+        _visited = set()
+    if id(df) in _visited or df.data is not None or df.transform is None:
+        return
+    _visited.add(id(df))
+
+    trans = df.transform
+    if _is_plain_projection(trans):
+        base = trans._source_
+        needed = set()
+        for col in trans.columns.values():
+            needed |= _referenced_columns(col, base.columns)
+        new_base = _prune(base, needed)
+        if new_base is not None:
+            _replace(df, new_base[list(trans._projcols_)])
+    for src in _main_sources(df):
+        prune_columns(src, _visited)
+
+
+def _is_inner_join(df):
+    trans = df.transform
+    return df.data is None and isinstance(trans, SQLJoinTransform) and trans._jointype_ == 'inner' \
+        and not df._saved_kwargs_.get('sort')
+
+
+def _key_list(keys):
+    return [keys] if isinstance(keys, str) else list(keys)
+
+
+class JoinGraph:
+    """
+    The inputs (leaves) of a tree of inner joins and the equality predicates connecting them.
+    Columns are given as (leaf index, column name in the leaf).
+    """
+    def __init__(self):
+        self.leaves = []
+        self.preds = []
+
+    def index(self, df) -> int:
+        # dataframes compare element-wise, look them up by identity
+        return next(i for i, leaf in enumerate(self.leaves) if leaf is df)
+
+    def _trace(self, df, cname):
+        """
+        @return: the leaf column an output column of a join in the tree comes from
+        """
+        while _is_inner_join(df):
+            trans = df.transform
+            col = trans.columns[cname]
+            df = trans._source1_ if col.tablename == trans._source1_.table_name else trans._source2_
+            cname = col.srccol[0]
+        return self.index(df), cname
+
+    def _collect(self, df):
+        if not _is_inner_join(df):
+            self.leaves.append(df)
+            return
+        trans = df.transform
+        self._collect(trans._source1_)
+        self._collect(trans._source2_)
+        left, right = trans.join_cols
+        for lk, rk in zip(_key_list(left), _key_list(right)):
+            self.preds.append((self._trace(trans._source1_, lk), self._trace(trans._source2_, rk)))
+
+    @classmethod
+    def of(cls, df) -> JoinGraph | None:
+        """
+        @return: the join graph of the inner join tree rooted at df, None if its joins cannot be reordered
+        """
+        graph = cls()
+        try:
+            graph._collect(df)
+        except KeyError:
+            # a join key was renamed by a suffix as both inputs have a column of that name
+            return None
+        names = [c for leaf in graph.leaves for c in leaf.columns]
+        tables = [leaf.table_name for leaf in graph.leaves]
+        # with distinct names every order gives the same columns without suffixes
+        if len(set(names)) != len(names) or len(set(tables)) != len(tables):
+            return None
+        return graph
+
+
+class JoinPlan:
+    """
+    A join of some leaves of a join graph with its estimated size, location and the bytes transferred to build it.
+    The cost of a plan is the sum of the transferred bytes and the sizes of its intermediate results.
+    """
+    def __init__(self, leaves: frozenset, rows, width, location, cost, df=None, children=None):
+        self.leaves = leaves
+        self.rows = rows
+        self.width = width
+        self.location = location
+        self.cost = cost
+        self.df = df
+        self.children = children
+
+    def size(self):
+        return self.rows * self.width
+
+
+class JoinOrderer:
+    """
+    Greedy join ordering: starting from the leaves, the pair of connected plans that is cheapest to join is
+    joined until one plan is left. Joining two plans on different data sources transfers the smaller one,
+    so small tables are joined with each other before being shipped, instead of shipping a large intermediate.
+    """
+    def __init__(self, graph: JoinGraph):
+        self.graph = graph
+        self._hists = {}
+
+    def _leaf_plan(self, idx):
+        leaf = self.graph.leaves[idx]
+        if leaf.data is not None:
+            rows, width = len(leaf.data), local_width(leaf.data)
+        elif leaf.data_source is None or leaf.data_source.job_name == LOCAL_DS:
+            # the input combines several data sources or is not computed yet
+            return None
+        else:
+            rows, width = leaf.data_source.get_estimation(leaf.genSQL)
+        return JoinPlan(frozenset([idx]), rows, width, leaf.data_source.job_name, 0, df=leaf)
+
+    def _hist(self, leaf_col, rows):
+        if leaf_col not in self._hists:
+            idx, cname = leaf_col
+            self._hists[leaf_col] = get_hist(self.graph.leaves[idx], cname)
+        hist = self._hists[leaf_col]
+        if hist is None:
+            return Histgram(None, 0, rows)
+        hist = copy.copy(hist)
+        hist.n_distinct = min(hist.n_distinct, rows) if rows else hist.n_distinct
+        return hist
+
+    def _connecting(self, p1: JoinPlan, p2: JoinPlan):
+        """
+        @return: the predicates joining two plans, oriented as (column of p1, column of p2)
+        """
+        preds = []
+        for a, b in self.graph.preds:
+            if a[0] in p1.leaves and b[0] in p2.leaves:
+                preds.append((a, b))
+            elif b[0] in p1.leaves and a[0] in p2.leaves:
+                preds.append((b, a))
+        return preds
+
+    def _join(self, p1: JoinPlan, p2: JoinPlan, preds) -> JoinPlan:
+        selectivity = 1
+        for a, b in preds:
+            selectivity *= estimate_join_selectivity(self._hist(a, p1.rows), self._hist(b, p2.rows))
+        rows = p1.rows * p2.rows * selectivity
+        width = p1.width + p2.width
+        # the smaller input is sent to the data source of the larger one
+        small, large = (p1, p2) if p1.size() <= p2.size() else (p2, p1)
+        transfer = small.size() if p1.location != p2.location else 0
+        cost = p1.cost + p2.cost + transfer + rows * width
+        return JoinPlan(p1.leaves | p2.leaves, rows, width, large.location, cost, children=(p1, p2, preds))
+
+    def _cost_of(self, df, plans) -> JoinPlan:
+        """
+        @return: the plan joining the leaves in the order written by the user
+        """
+        if not _is_inner_join(df):
+            return plans[self.graph.index(df)]
+        trans = df.transform
+        p1 = self._cost_of(trans._source1_, plans)
+        p2 = self._cost_of(trans._source2_, plans)
+        return self._join(p1, p2, self._connecting(p1, p2))
+
+    def order(self, df) -> JoinPlan | None:
+        """
+        @return: the greedy plan if it is cheaper than the written order, otherwise None
+        """
+        plans = [self._leaf_plan(i) for i in range(len(self.graph.leaves))]
+        if any(p is None for p in plans):
+            return None
+        written = self._cost_of(df, plans)
+
+        remaining = list(plans)
+        while len(remaining) > 1:
+            best = None
+            for i in range(len(remaining)):
+                for j in range(i + 1, len(remaining)):
+                    preds = self._connecting(remaining[i], remaining[j])
+                    # never introduce a cross product
+                    if not preds:
+                        continue
+                    joined = self._join(remaining[i], remaining[j], preds)
+                    if best is None or joined.cost < best[0].cost:
+                        best = joined, i, j
+            if best is None:
+                return None
+            joined, i, j = best
+            remaining = [p for k, p in enumerate(remaining) if k not in (i, j)] + [joined]
+        greedy = remaining[0]
+        return greedy if greedy.cost < written.cost else None
+
+    def build(self, plan: JoinPlan):
+        """
+        @return: the dataframe joining the leaves as given by the plan
+        """
+        if plan.df is not None:
+            return plan.df
+        p1, p2, preds = plan.children
+        left_on = [a[1] for a, _ in preds]
+        right_on = [b[1] for _, b in preds]
+        if len(preds) == 1:
+            left_on, right_on = left_on[0], right_on[0]
+        return self.build(p1).merge(self.build(p2), left_on=left_on, right_on=right_on, how='inner')
+
+
+def reorder_joins(df, _visited=None):
+    """
+    Rewrite each tree of inner joins in the lineage of df into the join order with the least estimated transfer
+    and intermediate result sizes. Only trees of 3 or more inputs whose columns do not share names are reordered,
+    a projection on the new tree keeps the column order of the original one.
+    @param df:
+    @return:
+    """
+    if _visited is None:
+        _visited = set()
+    if id(df) in _visited or df.data is not None or df.transform is None:
+        return
+    _visited.add(id(df))
+
+    if not _is_inner_join(df):
+        for src in _main_sources(df):
+            reorder_joins(src, _visited)
+        return
+
+    graph = JoinGraph.of(df)
+    for leaf in graph.leaves if graph is not None else _main_sources(df):
+        reorder_joins(leaf, _visited)
+    if graph is None or len(graph.leaves) < 3:
+        return
+    orderer = JoinOrderer(graph)
+    plan = orderer.order(df)
+    if plan is not None:
+        _replace(df, orderer.build(plan)[list(df.columns)])
+
+
+def _partial_name(func, col):
+    # postgres folds unquoted names to lower case
+    return 'aidac_{}_{}'.format(func, col).lower()
+
+
+def _agg_outputs(trans):
+    """
+    @return: the output columns of an aggregation as (name, source column, function), function is None for a
+             group column, or None if an aggregate is not decomposable
+    """
+    outputs = []
+    for name, col in trans.columns.items():
+        if not trans._is_dict_:
+            func = trans.func
+        elif col.srccol[0] in trans.collist and col.agg_func is not None:
+            func = col.agg_func
+        else:
+            func = None
+        if func is not None and func not in DECOMPOSABLE_FUNCS:
+            return None
+        outputs.append((name, col.srccol[0], func))
+    return outputs
+
+
+def _pandas_layout(trans, source_cols, groupcols):
+    """
+    @return: the columns pandas gives the aggregation as (key, source column, function)
+    """
+    if not trans._is_dict_:
+        return [(c, c, trans.func) for c in source_cols if c not in groupcols]
+    multi = any(not isinstance(ops, str) for ops in trans.collist.values())
+    layout = []
+    for col, ops in trans.collist.items():
+        for op in [ops] if isinstance(ops, str) else ops:
+            layout.append(((col, op) if multi else col, col, op))
+    return layout
+
+
+def _combine_sql(col, func, partial) -> str:
+    """
+    @return: the expression combining the partial aggregates of a column
+    """
+    if partial:
+        if func in ('min', 'max'):
+            return '{}({})'.format(func, _partial_name(func, col))
+        count = 'sum({})'.format(_partial_name('count', col))
+        total = 'sum({})'.format(_partial_name('sum', col))
+    else:
+        # a column that is not aggregated below the join stands for aidac_rows rows
+        if func in ('min', 'max'):
+            return '{}({})'.format(func, col)
+        count = 'sum(CASE WHEN {} IS NULL THEN 0 ELSE {} END)'.format(col, PARTIAL_ROWS)
+        total = 'sum({} * {})'.format(col, PARTIAL_ROWS)
+    if func == 'count':
+        return count
+    if func == 'sum':
+        return total
+    return 'CAST({} AS DOUBLE PRECISION) / NULLIF({}, 0)'.format(total, count)
+
+
+def _partials_of(func):
+    """
+    @return: the partial aggregates an aggregate function is combined from
+    """
+    return ['sum', 'count'] if func in ('avg', 'mean') else [func]
+
+
+def _partial_pandas(data, groupcols, named):
+    return data.groupby(groupcols, sort=False, dropna=False).agg(**named).reset_index()
+
+
+def _combine_pandas(data, groupcols, layout, partial_cols, sort):
+    """
+    combine the partial aggregates locally, the result is laid out as pandas lays out the original aggregation
+    """
+    work = data[groupcols].copy()
+    aggs = {}
+    for _, col, func in layout:
+        partial = col in partial_cols
+        for part in _partials_of(func):
+            if partial:
+                work[part + col] = data[_partial_name(part, col)]
+            elif part == 'count':
+                # a column that is not aggregated below the join stands for aidac_rows rows
+                work[part + col] = data[PARTIAL_ROWS].where(data[col].notnull(), 0)
+            elif part == 'sum':
+                work[part + col] = data[col] * data[PARTIAL_ROWS]
+            else:
+                work[part + col] = data[col]
+            # counts are combined by adding them up
+            aggs[part + col] = 'sum' if part == 'count' else part
+    grouped = work.groupby(groupcols, sort=sort).agg(aggs)
+
+    result = {}
+    for key, col, func in layout:
+        if func in ('avg', 'mean'):
+            result[key] = grouped['sum' + col] / grouped['count' + col].replace(0, np.nan)
+        else:
+            result[key] = grouped[func + col]
+    rs = pd.DataFrame(result, index=grouped.index)
+    if layout and isinstance(layout[0][0], tuple):
+        rs.columns = pd.MultiIndex.from_tuples(rs.columns)
+    return rs
+
+
+def _aggregated_join(gb_source):
+    """
+    @return: the join below a grouping, looking through a projection that only selects join columns
+    """
+    if _is_plain_projection(gb_source.transform) \
+            and all(not c.column_expr and c.srccol[0] == name for name, c in gb_source.columns.items()):
+        gb_source = gb_source.transform._source_
+    if gb_source.data is None and isinstance(gb_source.transform, SQLJoinTransform):
+        return gb_source
+    return None
+
+
+def _cross_source(sides) -> bool:
+    jobs = [s.data_source.job_name if s.data_source is not None else None for s in sides]
+    return None in jobs or jobs[0] != jobs[1]
+
+
+def _partial_side(join, groupcols):
+    """
+    choose the join input reducing the most rows when aggregated by its join keys and group columns
+    @return: (input index, its group columns), None if no input is worth aggregating
+    """
+    trans = join.transform
+    best = None
+    for idx, side in enumerate(trans.sources()):
+        if side.data is not None or side.data_source is None or side.data_source.job_name == LOCAL_DS:
+            continue
+        pcols = _key_list(trans.join_cols[idx])
+        pcols += [g for g in groupcols if g in side.columns and g not in pcols]
+        rows, _ = side.data_source.get_estimation(side.genSQL)
+        groups = 1
+        for cname in pcols:
+            hist = get_hist(side, cname)
+            groups *= hist.n_distinct if hist is not None else rows
+        groups = min(groups, rows)
+        if groups <= rows * PARTIAL_AGG_MAX_RATIO and (best is None or rows - groups > best[0]):
+            best = rows - groups, idx, pcols
+    return best[1:] if best is not None else None
+
+
+def _split_aggregate(df):
+    """
+    aggregate a join input before the join and combine the partial aggregates after it
+    @return: the rewritten aggregation, None if it cannot be split
+    """
+    trans = df.transform
+    gb = trans._source_.transform
+    join = _aggregated_join(gb._source_)
+    if join is None or join.transform._jointype_ not in ('inner', 'inner join'):
+        return None
+    sides = list(join.transform.sources())
+    # the columns of the inputs have to keep their names in the join
+    if set(sides[0].columns) & set(sides[1].columns) or not _cross_source(sides):
+        return None
+    outputs = _agg_outputs(trans)
+    if outputs is None:
+        return None
+    groupcols = list(gb._groupcols_)
+    chosen = _partial_side(join, groupcols)
+    if chosen is None:
+        return None
+    idx, pcols = chosen
+    side = sides[idx]
+
+    # columns of the aggregated input that are not grouped are replaced by their partial aggregates
+    layout = _pandas_layout(trans, trans._source_.columns, groupcols)
+    needed = {(c, f) for _, c, f in outputs if f is not None} | {(c, f) for _, c, f in layout}
+    partial_cols = {c for c, _ in needed if c in side.columns and c not in pcols}
+    items = [(c, c, None) for c in pcols]
+    named = {}
+    for col, func in sorted(needed):
+        if col not in partial_cols:
+            continue
+        for part in _partials_of(func):
+            name = _partial_name(part, col)
+            if name not in named:
+                dtype = np.int64 if part == 'count' else side.columns[col].dtype
+                items.append(('{}({})'.format(part, col), name, dtype))
+                named[name] = (col, part)
+    items.append(('count(*)', PARTIAL_ROWS, np.int64))
+    named[PARTIAL_ROWS] = (pcols[0], 'size')
+
+    partial = frame.DataFrame(ds=side.data_source, transform=SQLGroupedAggTransform(side, pcols, items))
+    partial._saved_func_name_ = 'pipe'
+    partial._saved_args_ = (functools.partial(_partial_pandas, groupcols=pcols, named=named),)
+    sides[idx] = partial
+    new_join = sides[0].merge(sides[1], **join._saved_kwargs_)
+
+    final_items = []
+    for name, col, func in outputs:
+        if func is None:
+            final_items.append((col, name, None))
+        else:
+            dtype = np.float64 if func in ('avg', 'mean') else \
+                np.int64 if func == 'count' else trans.columns[name].dtype
+            final_items.append((_combine_sql(col, 'avg' if func == 'mean' else func, col in partial_cols),
+                                name, dtype))
+    combined = frame.DataFrame(ds=new_join.data_source,
+                               transform=SQLGroupedAggTransform(new_join, groupcols, final_items, gb.sort))
+    combined._saved_func_name_ = 'pipe'
+    combined._saved_args_ = (functools.partial(_combine_pandas, groupcols=groupcols, layout=layout,
+                                               partial_cols=partial_cols, sort=gb.sort),)
+    return combined
+
+
+def push_down_partial_aggregates(df, _visited=None):
+    """
+    Rewrite aggregations of a join across data sources so that the input with many rows per join key is
+    aggregated on its own data source first (count, sum, min, max and avg as sum / count are decomposable):
+    only one row per key and group is transferred and the partial aggregates are combined after the join.
+    @param df:
+    @return:
+    """
+    if _visited is None:
+        _visited = set()
+    if id(df) in _visited or df.data is not None or df.transform is None:
+        return
+    _visited.add(id(df))
+
+    trans = df.transform
+    if isinstance(trans, SQLAGG_Transform) and trans._source_.data is None \
+            and isinstance(trans._source_.transform, SQLGroupByTransform):
+        new = _split_aggregate(df)
+        if new is not None:
+            _replace(df, new)
+    for src in _main_sources(df):
+        push_down_partial_aggregates(src, _visited)
+
+
+def _shared_input(df, seen: dict):
+    """
+    @param seen: fingerprint -> the first dataframe found with it
+    @return: the dataframe computing the same result as df that all readers use
+    """
+    try:
+        return seen.setdefault(lineage_fingerprint(df), df)
+    except Uncacheable:
+        return df
+
+
+def share_common_inputs(df, _seen=None, _visited=None):
+    """
+    Make joins whose inputs compute the same result (e.g. the same local table pruned to the same columns for two
+    joins) read one dataframe, the scheduler then executes and transfers that input once for all of them.
+    @param df:
+    @return:
+    """
+    if _visited is None:
+        _seen, _visited = {}, set()
+    if id(df) in _visited or df.data is not None or df.transform is None:
+        return
+    _visited.add(id(df))
+
+    for src in _main_sources(df):
+        share_common_inputs(src, _seen, _visited)
+    trans = df.transform
+    if isinstance(trans, SQLJoinTransform) and df._saved_func_name_ == 'merge':
+        left, right = _shared_input(trans._source1_, _seen), _shared_input(trans._source2_, _seen)
+        if left is not trans._source1_ or right is not trans._source2_:
+            _replace(df, left.merge(right, **df._saved_kwargs_))
@@ -0,0 +1,273 @@
+from __future__ import annotations
+
+import copy
+import re
+
+# string literals and numbers are matched as a whole so that the words inside them are never taken for columns
+_TOKEN = re.compile(r'\'[^\']*\'|"[^"]*"|\d[\w.]*|[A-Za-z_]\w*(?:\.[A-Za-z_]\w*)?')
+_NAME = re.compile(r'[A-Za-z_]\w*')
+_LITERAL = re.compile(r'\'[^\']*\'|"[^"]*"')
+
+
+def substitute(expr: str, mapping: dict) -> str:
+    """
+    replace the column names in an expression by the expressions they stand for
+    @param expr:
+    @param mapping: column name -> expression
+    @return:
+    """
+    if not mapping:
+        return expr
+    return _TOKEN.sub(lambda m: mapping.get(m.group(0), m.group(0)), expr)
+
+
+def _enclosed(expr: str) -> bool:
+    """
+    whether the whole expression is inside one pair of parentheses
+    """
+    if not expr.startswith('(') or not expr.endswith(')'):
+        return False
+    # blank out literals, they may contain parentheses
+    expr = _LITERAL.sub(lambda m: '_' * len(m.group(0)), expr)
+    depth = 0
+    for i, char in enumerate(expr):
+        if char == '(':
+            depth += 1
+        elif char == ')':
+            depth -= 1
+            if depth == 0 and i != len(expr) - 1:
+                return False
+    return True
+
+
+def parenthesize(expr: str) -> str:
+    """
+    put an expression in parentheses unless it is a single name / constant or already enclosed
+    """
+    if _TOKEN.fullmatch(expr) or _enclosed(expr):
+        return expr
+    return '(' + expr + ')'
+
+
+class QueryBlock:
+    """
+    A single SELECT statement built from the transforms of a lineage.
+    A transform adds its clauses to the block of its source if the result stays the same, otherwise the source
+    block becomes a subquery of a new block. This way a chain of projections, filters, orderings and limits
+    is sent as one flat query instead of one nested subquery per transform.
+    The clauses of a block are evaluated in the order FROM, WHERE, GROUP BY, SELECT, DISTINCT, ORDER BY, LIMIT.
+    Expressions handed to a block refer to its output columns, they are rewritten to its input columns.
+    """
+    def __init__(self, from_clause: str, table: str = None, table_columns=None):
+        """
+        @param from_clause: text of the FROM clause
+        @param table: name of the table if the block reads a single table
+        @param table_columns: column names of that table
+        """
+        self.from_clause = from_clause
+        self.table = table
+        self.table_columns = list(table_columns) if table_columns is not None else []
+        # list of (expression, alias), None for SELECT *
+        self.select = None
+        self.where = []
+        self.group_by = []
+        # whether the select list computes aggregates, with or without a group by
+        self.aggregated = False
+        self.distinct = False
+        # list of (expression, 'asc' / 'desc' / None)
+        self.order_by = []
+        self.limit = None
+        self.offset = None
+
+    @classmethod
+    def subquery(cls, sql: str, alias: str) -> QueryBlock:
+        return cls('(' + sql + ') ' + alias)
+
+    def copy(self) -> QueryBlock:
+        block = copy.copy(self)
+        block.select = list(self.select) if self.select is not None else None
+        block.where = list(self.where)
+        block.group_by = list(self.group_by)
+        block.order_by = list(self.order_by)
+        return block
+
+    def wrap(self, alias: str) -> QueryBlock:
+        """
+        @return: a new block reading the result of this block
+        """
+        return QueryBlock.subquery(self.sql(), alias)
+
+    def _outputs(self) -> dict:
+        if self.select is None:
+            return {}
+        return {alias: parenthesize(expr) for expr, alias in self.select if alias is not None}
+
+    def ref(self, expr: str) -> str:
+        """
+        rewrite an expression on the output columns of this block to its input columns
+        """
+        return substitute(expr, self._outputs())
+
+    @staticmethod
+    def _order_resolves(order_by, select) -> bool:
+        # ORDER BY takes a plain name for the output column of that name first, it must not be shadowed
+        if select is None:
+            return True
+        aliases = {alias: expr for expr, alias in select if alias is not None}
+        return all(aliases.get(expr, expr) == expr for expr, _ in order_by)
+
+    def _limited(self) -> bool:
+        return self.limit is not None or self.offset is not None
+
+    def can_filter(self) -> bool:
+        # filtering after an aggregation, distinct or limit would change their result
+        return not (self.aggregated or self.distinct or self._limited())
+
+    def can_project(self, items) -> bool:
+        if self.aggregated or self.distinct:
+            return False
+        return self._order_resolves(self.order_by, [(self.ref(expr), alias) for expr, alias in items])
+
+    def can_sort(self, keys) -> bool:
+        if self.distinct or self._limited():
+            return False
+        return self._order_resolves([(self.ref(k), d) for k, d in keys], self.select)
+
+    def can_aggregate(self) -> bool:
+        return self.can_filter() and not self.order_by
+
+    def add_where(self, cond: str):
+        self.where.append(self.ref(cond))
+
+    def set_select(self, items):
+        """
+        @param items: list of (expression, alias)
+        """
+        self.select = [(self.ref(expr), alias) for expr, alias in items]
+
+    def aggregate(self, items, groupcols=(), sort=False):
+        """
+        @param items: list of (expression, alias) computed per group
+        @param groupcols: columns to group by, the whole block is one group if empty
+        @param sort: order the result by the group columns
+        """
+        self.group_by = [self.ref(c) for c in groupcols]
+        self.select = [(self.ref(expr), alias) for expr, alias in items]
+        self.aggregated = True
+        if sort:
+            self.order_by = [(g, None) for g in self.group_by]
+
+    def set_order(self, keys):
+        """
+        @param keys: list of (expression, direction)
+        """
+        self.order_by = [(self.ref(k), d) for k, d in keys]
+
+    def set_limit(self, n: int):
+        self.limit = n if self.limit is None else min(self.limit, n)
+
+    def output_order(self):
+        """
+        @return: the ORDER BY keys as (output column, direction), None if the block is not ordered or is ordered
+        by an expression that is not an output column
+        """
+        if not self.order_by:
+            return None
+        if self.select is None:
+            outputs = {}
+        else:
+            outputs = {parenthesize(expr): alias if alias is not None else expr for expr, alias in self.select}
+        keys = []
+        for expr, d in self.order_by:
+            name = outputs.get(expr)
+            if name is None and self.select is None and _NAME.fullmatch(expr):
+                name = expr
+            if name is None or not _NAME.fullmatch(name):
+                return None
+            keys.append((name, d))
+        return keys
+
+    def can_tail(self) -> bool:
+        # an ordered block is read in reversed order, otherwise the offset counts its rows, so it must not be grouped
+        return not self._limited() and (self.output_order() is not None or self.can_filter())
+
+    def tail(self, n: int, alias: str) -> QueryBlock:
+        """
+        keep the last n rows
+        @param n:
+        @param alias: name this block is read by if the result is computed by a block reading it
+        @return: the block computing the last n rows, this one or a block reading it
+        """
+        keys = self.output_order()
+        if keys is None:
+            # without an order the rows are counted to skip all but the last n, none when there are fewer rows as
+            # a negative offset is an error
+            count = 'SELECT COUNT(*) FROM ' + self.from_clause + self._where_text()
+            self.limit = n
+            self.offset = 'GREATEST((' + count + ') - ' + str(n) + ', 0)'
+            return self
+        # the last n rows in order are the first n rows in reversed order, which are then sorted back
+        self.order_by = [(expr, 'asc' if d == 'desc' else 'desc') for expr, d in self.order_by]
+        self.limit = n
+        block = self.wrap(alias)
+        block.order_by = keys
+        return block
+
+    def inline(self, alias: str, keep_filter: bool):
+        """
+        read the table of this block directly in the FROM clause of a join instead of using a subquery
+        @param alias: name the join refers to this block by
+        @param keep_filter: whether the WHERE conditions of this block can be evaluated after the join
+        @return: (from item, output column -> qualified column, qualified conditions), None if it is not possible
+        """
+        if self.table is None or self.aggregated or self.distinct or self.order_by or self._limited():
+            return None
+        if self.where and not keep_filter:
+            return None
+        if self.select is not None and not all(_NAME.fullmatch(expr) for expr, _ in self.select):
+            return None
+        qualified = {c: alias + '.' + c for c in self.table_columns}
+        if self.select is None:
+            outputs = qualified
+        else:
+            outputs = {a: alias + '.' + expr for expr, a in self.select}
+        item = self.table if alias == self.table else self.table + ' ' + alias
+        return item, outputs, [substitute(c, qualified) for c in self.where]
+
+    def _where_text(self) -> str:
+        if not self.where:
+            return ''
+        if len(self.where) == 1:
+            return ' WHERE ' + self.where[0]
+        return ' WHERE ' + ' AND '.join(parenthesize(c) for c in self.where)
+
+    def sql(self) -> str:
+        if self.select is None:
+            cols = '*'
+        else:
+            cols = ', '.join(expr if alias is None else expr + ' AS ' + alias for expr, alias in self.select)
+        text = 'SELECT ' + ('DISTINCT ' if self.distinct else '') + cols + ' FROM ' + self.from_clause
+        text += self._where_text()
+        if self.group_by:
+            text += ' GROUP BY ' + ', '.join(self.group_by)
+        if self.order_by:
+            text += ' ORDER BY ' + ', '.join(expr + (' ' + d if d else '') for expr, d in self.order_by)
+        if self.limit is not None:
+            text += ' LIMIT ' + str(self.limit)
+        if self.offset is not None:
+            text += ' OFFSET ' + self.offset
+        return text
+
+
+def block_of(df) -> QueryBlock:
+    """
+    @return: the query block computing df, it is a copy the caller can extend in place
+    """
+    trans = df.transform
+    if trans is None:
+        return QueryBlock(df.table_name, df.table_name, df.columns)
+    gen_block = getattr(trans, 'gen_block', None)
+    block = gen_block() if gen_block is not None else None
+    if block is None:
+        return QueryBlock.subquery(trans.genSQL, df.table_name)
+    return block
@@ -12,6 +12,7 @@ from typing import List
 from aidac.common.aidac_types import *
 from aidac.dataframe import frame
 from aidac.common.column import Column
+from aidac.dataframe.sql_builder import QueryBlock, block_of
 
 JOIN_TYPE = {
     'inner': 'INNER JOIN',
@@ -22,6 +23,19 @@ JOIN_TYPE = {
     'cross': 'CROSS JOIN'
 }
 
+# join type -> which sides a filter on the join result can be moved to
+# a filter on the null supplying side of an outer join would change the result
+PUSHABLE_SIDES = {'inner': (0, 1), 'inner join': (0, 1), 'cross': (0, 1), 'left': (0,), 'right': (1,), 'outer': ()}
+
+# bumped whenever a lineage is changed in place (a dataframe is materialized or rewritten),
+# the sql cached by the transforms before that may refer to the old lineage
+_lineage_epoch = 0
+
+
+def lineage_changed():
+    global _lineage_epoch
+    _lineage_epoch += 1
+
 
 class Transform:
     def transform_name(self):
@@ -92,7 +106,8 @@ class AlgebraicTransform(Transform):
     # The columns that will be produced once this transform is applied on its source.
     def columns(self):
         if not self._columns_:
-            self._columns_ = copy.deepcopy(self._source_.columns)
+            # columns are not modified once created, so they are shared with the source
+            self._columns_ = self._source_.columns
         return self._columns_
 
     @property
@@ -111,22 +126,64 @@ class SQLTransform(Transform):
     def __init__(self, source):
         self._columns_ = None
         self._source_ = source
+        # query block and sql of this transform and the lineage epoch they were built in
+        self._block_ = None
+        self._sql_ = None
+        self._cache_epoch_ = None
 
     @property
     # The columns that will be produced once this transform is applied on its source.
     def columns(self):
         if (not self._columns_):
-            self._columns_ = copy.deepcopy(self._source_.columns)
+            # columns are not modified once created, so they are shared with the source
+            self._columns_ = self._source_.columns
         return self._columns_
 
     # The SQL equivalent of applying this transformation in the database.
     @property
     def genSQL(self):
-        return self._source_
+        block = self._cached_block()
+        if block is None:
+            return self._source_
+        if self._sql_ is None:
+            self._sql_ = block.sql()
+        return self._sql_
 
     def sources(self):
         return self._source_
 
+    def _build_block(self) -> QueryBlock | None:
+        """
+        @return: the query block computing the result of this transform, None if it is not expressed as one
+        """
+        return None
+
+    def _cached_block(self) -> QueryBlock | None:
+        # the sql of the whole upstream lineage is generated once, not again by every downstream access
+        epoch = _lineage_epoch
+        if self._cache_epoch_ != epoch:
+            self._block_ = self._build_block()
+            self._sql_ = None
+            self._cache_epoch_ = epoch
+        return self._block_
+
+    def gen_block(self) -> QueryBlock | None:
+        """
+        @return: a copy of the query block of this transform which can be extended, None if there is no block
+        """
+        block = self._cached_block()
+        return block.copy() if block is not None else None
+
+    @staticmethod
+    def _source_block(source, compatible) -> QueryBlock:
+        """
+        @param source:
+        @param compatible: function telling whether the clauses of the transform can be added to a block
+        @return: the block of the source if it is compatible, otherwise a block reading it as a subquery
+        """
+        block = block_of(source)
+        return block if compatible(block) else block.wrap(source.table_name)
+
     def _construct_col(self, src_cols: dict, srccol: str, projcoln:str, coltransform: str|None, table_name):
         sdbtables = []
         srccols = []
@@ -189,29 +246,11 @@ class SQLAggregateTransform(SQLTransform):
             self._gen_column(self._source_)
         return self._columns_
 
-    @property
-    def genSQL(self):
-        projcoltxt = None
-        for c in self.columns:  # Prepare the list of columns going into the select statement.
-            col = self.columns[c]
-            projcoltxt = ((projcoltxt + ', ') if (projcoltxt) else '') + ((col.column_expr if (
-                col.column_expr) else col.srccol[0]) + ' AS ' + col.name)
-
-        groupcoltxt = None
-
-        for g in self._groupcols_:
-            groupcoltxt = ((groupcoltxt + ", ") if groupcoltxt else "") + g
-
-        if not groupcoltxt:
-            sql_text = ('SELECT ' + projcoltxt + ' FROM '
-                        + '(' + self._source_.genSQL + ') ' + self._source_.table_name  # Source table transform SQL.
-                        )
-        else:
-            sql_text = ('SELECT ' + projcoltxt + ' FROM '
-                        + '(' + self._source_.genSQL + ') ' + self._source_.table_name  # Source table transform SQL.
-                        ) + " GROUP BY " + groupcoltxt
-
-        return sql_text
+    def _build_block(self):
+        items = [(col.column_expr if col.column_expr else col.srccol[0], col.name) for col in self.columns.values()]
+        block = self._source_block(self._source_, QueryBlock.can_aggregate)
+        block.aggregate(items, [g for g in self._groupcols_ if g])
+        return block
 
 
 class SQLBinaryOperationTransform(SQLTransform):
@@ -248,7 +287,9 @@ class SQLBinaryOperationTransform(SQLTransform):
     @property
     def columns(self):
         if not self._columns_:
-            self._columns_ = super().columns
+            # the expressions are set on copies, the source columns are shared by other transforms
+            self._columns_ = collections.OrderedDict(
+                (col_name, copy.copy(col)) for col_name, col in self._source_.columns.items())
             for col_name in self._columns_:
                 # todo: update column name
                 col = self._columns_[col_name]
@@ -256,21 +297,15 @@ class SQLBinaryOperationTransform(SQLTransform):
                 col.column_expr = self._col_exp(col)
         return self._columns_
 
-    @property
-    def genSQL(self, partial=False):
-        if partial:
-            return self._source_.genSQL
-        else:
-            projcoltxt = None
-            for col_name in self.columns:
-                col = self.columns[col_name]
-                projcoltxt = ((projcoltxt + ', ') if projcoltxt else '') + ((col.column_expr if (
-                    col.column_expr) else col.srccol[0]) + ' AS ' + col.name)
-
-            if hasattr(self._source_, 'transform') and isinstance(self._source_.transform, SQLBinaryOperationTransform):
-                return 'SELECT ' + projcoltxt + ' FROM (' + self._source_.genSQL(True) + ') ' + self._source_.table_name
-            else:
-                return 'SELECT ' + projcoltxt + ' FROM (' + self._source_.genSQL + ') ' + self._source_.table_name
+    def _build_block(self):
+        items = [(col.column_expr if col.column_expr else col.srccol[0], col.name) for col in self.columns.values()]
+        # the column expressions of chained operations are composed, they refer to the source of the first one
+        base = self._source_
+        while isinstance(base.transform, SQLBinaryOperationTransform):
+            base = base.transform._source_
+        block = self._source_block(base, lambda b: b.can_project(items))
+        block.set_select(items)
+        return block
 
 
 class SQLProjectionTransform(SQLTransform):
@@ -318,28 +353,24 @@ class SQLProjectionTransform(SQLTransform):
             self._gen_column(self._source_[0]) if is_type(self._source_, ArrayLike) else self._gen_column(self._source_)
         return self._columns_
 
-    @property
-    def genSQL(self):
-        projcoltxt = None
-        for c in self.columns:  # Prepare the list of columns going into the select statement.
-            col = self.columns[c];
-            projcoltxt = ((projcoltxt + ', ') if (projcoltxt) else '') + ((col.column_expr if (
-                col.column_expr) else col.srccol[0]) + ' AS ' + col.name);
+    def _build_block(self):
+        items = [(col.column_expr if col.column_expr else col.srccol[0], col.name) for col in self.columns.values()]
 
         # we need to append the selection part here
         if is_type(self._source_, ArrayLike):
             assert isinstance(self._source_[1].transform, SQLFilterTransform)
-            cond_text = ' '+self._source_[1].transform.gen_condition()
+            cond = self._source_[1].transform.gen_clauses()
             src_table = self._source_[0]
         else:
-            cond_text = ''
+            cond = None
             src_table = self._source_
 
-        sql_text = ('SELECT ' + projcoltxt + ' FROM '
-                    + '(' + src_table.genSQL + ') ' + src_table.table_name  # Source table transform SQL.
-                    + cond_text)
-
-        return sql_text
+        block = self._source_block(src_table,
+                                   lambda b: b.can_project(items) and (cond is None or b.can_filter()))
+        if cond is not None:
+            block.add_where(cond)
+        block.set_select(items)
+        return block
 
     def multi_source(self) -> bool:
         return False
@@ -388,7 +419,7 @@ class SQLJoinTransform(SQLTransform):
                         proj_name = c.name + suffix
                     else:
                         proj_name = c.name
-                    pc = copy.deepcopy(c);  # Make a copy of the source column specs.
+                    pc = copy.copy(c);  # Make a copy of the source column specs.
                     pc.name = proj_name  # Reset the mutable fields for projected column.
                     if tableName:
                         pc.tablename = tableName;
@@ -404,35 +435,39 @@ class SQLJoinTransform(SQLTransform):
             # self.__columns__ = { **__extractsrccols__(src1cols, self._src1projcols_), **__extractsrccols__(src2cols, self._src2projcols_) };
         return self._columns_
 
-    @property
-    def genSQL(self):
-
-        projcoltxt = None;
-        for c in self.columns:  # Prepare the list of columns going into the select statement.
-            col = self.columns[c]
-            projcoltxt = ((projcoltxt + ', ') if projcoltxt else '') + (
-                        col.tablename + '.' + col.srccol[0] + ' AS ' + col.name)
-
-        jointxt = None;  # The join condition SQL.
-
-        if (self._jointype_ == 'cross'):
-            jointxt = '';
-        elif (isinstance(self._src1joincols_, str)):
-            jointxt = ' ON ' + self._source1_.table_name + '.' + self._src1joincols_ + ' = ' + self._source2_.table_name + '.' + self._src2joincols_
+    def _build_block(self):
+        sides = [self._source1_, self._source2_]
+        from_items = []
+        outputs = []
+        conds = []
+        for idx, side in enumerate(sides):
+            alias = side.table_name
+            # a side only reading a table is joined directly, its filter is kept if it can be evaluated after the join
+            block = block_of(side)
+            inlined = block.inline(alias, idx in PUSHABLE_SIDES.get(self._jointype_, ()))
+            if inlined is None:
+                from_items.append('(' + block.sql() + ') ' + alias)
+                outputs.append({c: alias + '.' + c for c in side.columns})
+            else:
+                from_items.append(inlined[0])
+                outputs.append(inlined[1])
+                conds.extend(inlined[2])
+
+        jointxt = None  # The join condition SQL.
+        if self._jointype_ == 'cross':
+            jointxt = ''
+        elif isinstance(self._src1joincols_, str):
+            jointxt = ' ON ' + outputs[0][self._src1joincols_] + ' = ' + outputs[1][self._src2joincols_]
         else:
             for j in range(len(self._src1joincols_)):
-                jointxt = ((jointxt + ' AND ') if (jointxt) else ' ON ') + self._source1_.table_name + '.' + \
-                          self._src1joincols_[j] + ' = ' + self._source2_.table_name + '.' + self._src2joincols_[j];
-
+                jointxt = ((jointxt + ' AND ') if jointxt else ' ON ') + outputs[0][self._src1joincols_[j]] \
+                          + ' = ' + outputs[1][self._src2joincols_[j]]
 
-        sqlText = ('SELECT ' + projcoltxt + ' FROM '
-                   + '(' + self._source1_.genSQL + ') ' + self._source1_.table_name  # SQL for source table 1
-                   + ' ' + JOIN_TYPE[self._jointype_] + ' '
-                   + '(' + self._source2_.genSQL + ') ' + self._source2_.table_name  # SQL for source table 2
-                   + jointxt
-                   )
-
-        return sqlText
+        block = QueryBlock(from_items[0] + ' ' + JOIN_TYPE[self._jointype_] + ' ' + from_items[1] + jointxt)
+        block.where = conds
+        block.select = [(outputs[0 if col.tablename == self._source1_.table_name else 1][col.srccol[0]], col.name)
+                        for col in self.columns.values()]
+        return block
 
 
 class SQLRenameTransform(SQLTransform):
@@ -517,33 +552,12 @@ class SQLOrderTransform(SQLTransform):
             self._columns_ = self._source_.columns
         return self._columns_
 
-    @property
-    def genSQL(self):
-
-        srccols = self._source_.columns
+    def _build_block(self):
         ordered_col = [self._order_] if isinstance(self._order_, str) else self._order_
-
-        sql_text = 'ORDER BY '
-
-        key_res = ''
-        sort_order = ''
-        # print(ordered_col)
-        # for key_ in range(len(ordered_col)):
-        #     key = ordered_col[key_]
-        #     if key.endswith("#asc"):
-        #         key_res = key[:-4]
-        #         sort_order = 'asc'
-        #     elif key.endswith("#desc"):
-        #         key_res = key[:-5]
-        #         sort_order = 'desc'
-        #     else:
-        #         key_res = key
-        #         sort_order = 'asc'
-        #     sql_text += key_res + ' ' + sort_order + ' '
-        for key_ in ordered_col:
-            sql_text = sql_text + key_ + ' ' + (('asc') if self._ascending_ else 'desc') + ', '
-        sql_text = sql_text[:-2]
-        return self._source_.genSQL + ' ' + sql_text
+        keys = [(key_, 'asc' if self._ascending_ else 'desc') for key_ in ordered_col]
+        block = self._source_block(self._source_, lambda b: b.can_sort(keys))
+        block.set_order(keys)
+        return block
 
 
 
@@ -558,10 +572,10 @@ class SQLHeadTransform(SQLTransform):
             self._columns_ = self._source_.columns
         return self._columns_
 
-    @property
-    def genSQL(self):
-        sql_text = self._source_.genSQL + ' LIMIT ' + str(self._num_)
-        return sql_text
+    def _build_block(self):
+        block = self._source_block(self._source_, lambda b: b.offset is None)
+        block.set_limit(self._num_)
+        return block
 
 
 class SQLTailTransform(SQLTransform):
@@ -575,11 +589,9 @@ class SQLTailTransform(SQLTransform):
             self._columns_ = self._source_.columns
         return self._columns_
 
-    @property
-    def genSQL(self):
-        sql_text = self._source_.genSQL + ' LIMIT ' + str(self._num_) + ' OFFSET' + ' (' + 'SELECT COUNT(*) FROM ' \
-                   + self._source_.table_name + ') ' + '- ' + str(self._num_)
-        return sql_text
+    def _build_block(self):
+        block = self._source_block(self._source_, QueryBlock.can_tail)
+        return block.tail(self._num_, self._source_.table_name)
 
 
 class SQLInsertTransform(SQLTransform):
@@ -674,31 +686,12 @@ class SQLGroupByTransform(SQLTransform):
 
         return sql_text
 
-    @property
-    def genSQL(self):
-        projcoltxt = None
-        for c in self.columns:  # Prepare the list of columns going into the select statement.
-            if c in self._groupcols_:
-                col = self.columns[c]
-
-                projcoltxt = ((projcoltxt + ', ') if (projcoltxt) else '') + ((col.column_expr if (
-                    col.column_expr) else col.srccol[0]) + ' AS ' + col.name)
-
-        groupcoltxt = None
-        if self._groupcols_:
-            for g in self._groupcols_:
-                groupcoltxt = ((groupcoltxt + ', ') if (groupcoltxt) else '') + g
-
-        sort_coltxt = None
-        if self.sort:
-            for col in self._groupcols_:
-                sort_coltxt = ((sort_coltxt + ", ") if (sort_coltxt) else "") + col
-
-        sqlText = ('SELECT ' + projcoltxt +' FROM '
-                   + '(' + self._source_.genSQL + ') ' + self._source_.table_name  # Source table transform SQL.
-                   + ((' GROUP BY ' + groupcoltxt) if (groupcoltxt) else '' ) + ((" ORDER BY " + sort_coltxt) if self.sort else '')
-                   )
-        return sqlText
+    def _build_block(self):
+        items = [(col.column_expr if col.column_expr else col.srccol[0], col.name)
+                 for c, col in self.columns.items() if c in self._groupcols_]
+        block = self._source_block(self._source_, QueryBlock.can_aggregate)
+        block.aggregate(items, self._groupcols_, self.sort)
+        return block
 
 
 
@@ -717,31 +710,24 @@ class SQLFillNA(SQLTransform):
     def _gen_column(self, _source_):
         pass
 
-    @property
-    def genSQL(self):
-        # TODO : find a general solution to support filling all blanks/ filling particular columns
-        sqltext = 'SELECT '
-        # col_to_fill = self.columns if isinstance(self._col_to_fill, list) and len(self._col_to_fill) == 0
-        # elif isinstance()
+    def _build_block(self):
         if isinstance(self._col_to_fill, list) and len(self._col_to_fill) == 0:
-            col_to_fill = []
-            for c in self.columns:
-                col = self.columns[c]  # type Column
-                col_to_fill.append(col.name)
-
+            col_to_fill = list(self.columns)
         elif isinstance(self._col_to_fill, str):
             col_to_fill = [self._col_to_fill]
         else:
             col_to_fill = self._col_to_fill
 
-        for col_name in col_to_fill:
-            sqltext = sqltext + ' coalesce' + '( ' + col_name + ',' + "'" + str(
-                self._target_val_) + "'" + ') ' + ' AS ' + col_name + ","
-        ### to be finished
-        sqltext = sqltext[:-1]
-        sqltext = sqltext + ' FROM ' + '(' + self._source_.genSQL + ') ' + self._source_.table_name
-
-        return sqltext
+        items = []
+        for c in self.columns:
+            col = self.columns[c]  # type Column
+            if col.name in col_to_fill:
+                items.append(('coalesce(' + col.name + ", '" + str(self._target_val_) + "')", col.name))
+            else:
+                items.append((col.name, col.name))
+        block = self._source_block(self._source_, lambda b: b.can_project(items))
+        block.set_select(items)
+        return block
 
 class SQLContainsTransform(SQLTransform):
 
@@ -757,44 +743,32 @@ class SQLContainsTransform(SQLTransform):
             self._columns_ = self._source_.columns
         return self._columns_
 
-    @property
-    def genSQL(self):
+    def _build_block(self):
         col = None
         for c in self.columns:
             col = self.columns[c]
 
-
         is_all_alnum = True
 
         for i in self._pattern_:
             if not i.isalnum():
                 is_all_alnum = False
 
+        pattern = self._pattern_
         if self._regex_ and is_all_alnum:
-            self._pattern_ = '%' + self._pattern_ + '%'
-
-        # sqltext = 'SELECT * FROM ' + '(' + self._source_.genSQL + ') ' + self._source_.table_name + ' WHERE ' + col.name + ' '
+            pattern = '%' + pattern + '%'
 
         if not self._case_:
-            sqltext = 'SELECT * FROM ' + '(' + self._source_.genSQL + ') ' + self._source_.table_name + ' WHERE ' + 'LOWER' + '(' + col.name + ')' + ' '
-            self._pattern_ = self._pattern_.lower()
-            if self._regex_:
-                sqltext += 'LIKE' + ' ' + "'" + self._pattern_ + "'"
-                return sqltext
-            else:
-                sqltext += 'LIKE' + ' ' + "'" + '%' + self._pattern_ + '%' + "'"
-                return sqltext
-
+            target = 'LOWER' + '(' + col.name + ')'
+            pattern = pattern.lower()
         else:
-            sqltext = 'SELECT * FROM ' + '(' + self._source_.genSQL + ') ' + self._source_.table_name + ' WHERE ' + col.name + ' '
-            if self._regex_:
-                sqltext += 'LIKE' + ' ' + "'" + self._pattern_ + "'"
-                return sqltext
-            else:
-                sqltext += 'LIKE' + ' ' + "'" + '%' + self._pattern_ + '%' + "'"
-                return sqltext
-        # if self._regex_:
-        #     sqltext += 'LIKE' + ' ' + self._pattern_
+            target = col.name
+        if not self._regex_:
+            pattern = '%' + pattern + '%'
+
+        block = self._source_block(self._source_, QueryBlock.can_filter)
+        block.add_where(target + ' LIKE ' + "'" + pattern + "'")
+        return block
 
 
 
@@ -814,19 +788,11 @@ class SQLDropduplicateTransform(SQLTransform):
             self._gen_column(self._source_)
         return self._columns_
 
-    @property
-    def genSQL(self):
-
-        projcoltxt = None
-
-        for c in self.columns:
-            col = self.columns[c]  # generate the column name
-            projcoltxt = ((projcoltxt + ', ') if (projcoltxt) else '') + col.name
-
-        sqlText = ('SELECT DISTINCT ' + projcoltxt + ' FROM '
-                   + '(' + self._source_.genSQL + ') ' + self._source_.table_name  # Source table transform SQL.
-                   )
-        return sqlText
+    def _build_block(self):
+        block = self._source_block(self._source_, QueryBlock.can_aggregate)
+        block.set_select([(self.columns[c].name, self.columns[c].name) for c in self.columns])
+        block.distinct = True
+        return block
 
     def _gen_column(self, source):
         self._columns_ = self._source_.columns
@@ -852,8 +818,7 @@ class SQLQuery(SQLTransform):
             self._columns_ = self._source_.columns
         return self._columns_
 
-    @property
-    def genSQL(self):
+    def _build_block(self):
 
         cur = ''
         count = 0
@@ -872,9 +837,9 @@ class SQLQuery(SQLTransform):
 
             cur += char
 
-        query = self._source_.genSQL + ' WHERE ' + cur
-
-        return query
+        block = self._source_block(self._source_, QueryBlock.can_filter)
+        block.add_where(cur)
+        return block
 
 
 class SQLFilterTransform(SQLTransform):
@@ -990,32 +955,27 @@ class SQLFilterTransform(SQLTransform):
         where_clause = 'WHERE '+ self.gen_clauses()
         return where_clause
 
-    @property
-    def genSQL(self):
-        sqltext = "SELECT "
-
+    def _build_block(self):
         if self._op_ == "<>":  # ne
             wrong_type_op = '='
         else:
             # all other cases should return false
             wrong_type_op = '<>'
 
+        items = []
         for c in self.columns:
             col = self.columns[c]
             col_type = col.dtype
-            # print(" COLUMN DATETYPE IS : ", col_type)
             col_name = col.name
             if self.is_same_type(self._other_, col_type):
-                # print("dddddddd")
-                sqltext += "CASE WHEN " + col_name + " " + self._op_ + " " + self._format_const(self._other_) + " THEN TRUE ELSE FALSE END AS " + col_name + ", "
+                items.append(("CASE WHEN " + col_name + " " + self._op_ + " " + self._format_const(self._other_)
+                              + " THEN TRUE ELSE FALSE END", col_name))
             else:
-                sqltext += "CASE WHEN" + " 1 " + wrong_type_op + " 1 THEN TRUE ELSE FALSE END AS " + col_name + ", "
-
-        sqltext = sqltext[:-2]
+                items.append(("CASE WHEN" + " 1 " + wrong_type_op + " 1 THEN TRUE ELSE FALSE END", col_name))
 
-        sqltext += ' FROM ' + '(' + self._source_.genSQL + ') ' + self._source_.table_name  # Source table transform SQL.
-
-        return sqltext
+        block = self._source_block(self._source_, lambda b: b.can_project(items))
+        block.set_select(items)
+        return block
 
 
 class SQLQuery(SQLTransform):
@@ -1030,8 +990,7 @@ class SQLQuery(SQLTransform):
             self._columns_ = self._source_.columns
         return self._columns_
 
-    @property
-    def genSQL(self):
+    def _build_block(self):
 
         cur = ''
         count = 0
@@ -1050,9 +1009,9 @@ class SQLQuery(SQLTransform):
 
             cur += char
 
-        query = self._source_.genSQL + ' WHERE ' + cur
-
-        return query
+        block = self._source_block(self._source_, QueryBlock.can_filter)
+        block.add_where(cur)
+        return block
 
 
 # class SQLFilterTransform(SQLTransform):
@@ -1141,7 +1100,7 @@ class SQLAGG_Transform(SQLTransform):
                 column = self._construct_col(src_cols, srccol, projcoln, coltransform, str(source))
                 columns[projcoln] = column
                 colcount += 1
-            return columns, colcount
+        return columns, colcount
 
     def _gen_column(self, source):
 
@@ -1209,49 +1168,69 @@ class SQLAGG_Transform(SQLTransform):
             columns, colcount = self._add_groupby_cols(source, columns, colcount)
             self._columns_ = columns
 
-    @property
-    def genSQL(self):
-
-        has_groupby = False
-
-        if isinstance(self._source_.transform, SQLGroupByTransform):
-            has_groupby = True
-
-        # print("check if has groupby previously",has_groupby)
-
-        tb_name = self._source_.table_name
-        targetcol = None
-        if len(self.collist) == 0:
-            targetcol = "(*)"
-        projcoltxt = None
-
-        # affected_cols = self._source_.
+    def _build_block(self):
+        items = []
         if not self._is_dict_:
             for c in self.columns:
-
                 col = self.columns[c]
-                projcoltxt = (( projcoltxt + ", ") if (projcoltxt) else '') + (( self.func +'('+ col.column_expr + ')' if (col.column_expr)
-                    else self.func +'('+col.srccol[0] + ')') + " AS " + col.name)
+                items.append((self.func + '(' + (col.column_expr if col.column_expr else col.srccol[0]) + ')', col.name))
         else:
             for c in self.columns:
                 col = self.columns[c]
                 if col.srccol[0] in self.collist and col.agg_func is not None:
-                    projcoltxt = ((projcoltxt + ", ") if (projcoltxt) else '') + ((col.agg_func + '(' + col.column_expr + ')' if (col.column_expr)
-                    else col.agg_func + '('+col.srccol[0] + ')') + " AS " + col.name)
+                    items.append((col.agg_func + '(' + (col.column_expr if col.column_expr else col.srccol[0]) + ')',
+                                  col.name))
                 else:
                     # these are groupby columns
-                    projcoltxt = ((projcoltxt + ", ") if (projcoltxt) else '') \
-                                 + (col.column_expr if col.column_expr else col.srccol[0]) + " AS " + col.name
-
-        if has_groupby:
+                    items.append((col.column_expr if col.column_expr else col.srccol[0], col.name))
 
-            sqlText = ("SELECT " + projcoltxt + " FROM "
-                        + self._source_.genSQL_compat )
+        if isinstance(self._source_.transform, SQLGroupByTransform):
+            # aggregate the groups in the same query block as the grouping
+            groupby = self._source_.transform
+            block = self._source_block(groupby._source_, QueryBlock.can_aggregate)
+            block.aggregate(items, groupby._groupcols_, groupby.sort)
         else:
-            sqlText = ("SELECT " + projcoltxt + " FROM "
-                       + "(" + self._source_.genSQL+ ") " + self._source_.table_name)
+            block = self._source_block(self._source_, QueryBlock.can_aggregate)
+            block.aggregate(items)
+        return block
+
+
+class SQLGroupedAggTransform(SQLTransform):
+    """
+    Aggregates of a grouped source given as sql expressions. The optimizer uses it to split an aggregation into
+    partial aggregates below a join and the combination of the partials above it.
+    """
+    def __init__(self, source, groupcols, items, sort=False):
+        """
+        @param source:
+        @param groupcols: columns to group by
+        @param items: output columns as (expression, alias, dtype), dtype is None for a column of the source
+        @param sort: order the result by the group columns
+        """
+        super().__init__(source)
+        self._groupcols_ = list(groupcols)
+        self._items_ = items
+        self.sort = sort
+
+    @property
+    def columns(self):
+        if not self._columns_:
+            src_cols = self._source_.columns
+            columns = collections.OrderedDict()
+            for expr, alias, dtype in self._items_:
+                if dtype is None:
+                    column = self._construct_col(src_cols, expr, alias, None, str(self._source_))
+                else:
+                    column = Column(alias, dtype, srccol=[alias])
+                    column.agg_func = expr
+                columns[alias] = column
+            self._columns_ = columns
+        return self._columns_
 
-        return sqlText
+    def _build_block(self):
+        block = self._source_block(self._source_, QueryBlock.can_aggregate)
+        block.aggregate([(expr, alias) for expr, alias, _ in self._items_], self._groupcols_, self.sort)
+        return block
 
 
 class SQLDropNA(SQLTransform):
@@ -1,5 +1,7 @@
 from __future__ import annotations
 
+import asyncio
+import sqlite3
 import sys
 
 import pandas as pd
@@ -10,14 +12,24 @@ import time
 from typing import Dict
 
 from aidac.common.DataIterator import generator
+from aidac.common.block_manager import block_manager
 from aidac.common.column import Column
 from aidac.common.hist import Histgram
 from aidac.common.meta import MetaInfo
 from aidac.dataframe import frame
 from aidac.exec.utils import *
+from aidac.exec import ResultCache
+from aidac.exec.FusedExecutor import FusedExecutor
 
+from aidac.data_source.DataSource import local_ds
+from aidac.data_source.SQLiteEngine import sqlite_engine, supported as sqlite_supported
 from aidac.data_source.DataSourceManager import manager, LOCAL_DS
 
+# join type -> inputs whose rows without a match are dropped, they can be reduced to the rows matching the other input
+SEMI_JOIN_SIDES = {'inner': (0, 1), 'left': (1,), 'right': (0,)}
+# the keys of a semi join reduction are sent in the query text up to this many, otherwise as a temporary table
+SEMI_JOIN_INLINE_KEYS = 1000
+
 
 def is_local(df1: frame.DataFrame, df2: frame.DataFrame):
     """
@@ -41,30 +53,140 @@ def is_local(df1: frame.DataFrame, df2: frame.DataFrame):
                     return True
         return False
 
+def iter_chunks(data: pd.DataFrame, chunksize: int):
+    """
+    split an already materialized dataframe into chunks
+    @param data:
+    @param chunksize: number of rows per chunk
+    @return: generator of dataframes
+    """
+    for start in range(0, len(data), chunksize):
+        yield data.iloc[start:start+chunksize]
+
+
+def local_width(data: pd.DataFrame, sample: int = 1000):
+    """
+    estimate the average size of a row of a local table in bytes
+    @param data:
+    @param sample: number of rows used to measure variable length columns
+    @return:
+    """
+    width = 0
+    for cname, dtype in data.dtypes.items():
+        if dtype != object:
+            width += dtype.itemsize
+        elif len(data):
+            # strings are sent as text, measure a sample of them
+            width += data[cname].head(sample).astype(str).str.len().mean()
+    return width
+
+
+def trace_column(df: frame.DataFrame, col: str):
+    """
+    follow a column down the lineage to the materialized or database table holding its values
+    @param df:
+    @param col:
+    @return: (table, column name in the table), None if the column is computed from other values
+    """
+    from aidac.dataframe.transforms import SQLJoinTransform, SQLProjectionTransform, SQLRenameTransform, \
+        SQLAggregateTransform, SQLBinaryOperationTransform, SQLAGG_Transform
+    while df.data is None and df.transform is not None:
+        trans = df.transform
+        column = df.columns.get(col)
+        if column is None or column.agg_func is not None \
+                or isinstance(trans, (SQLAggregateTransform, SQLBinaryOperationTransform, SQLAGG_Transform)):
+            return None
+        if isinstance(trans, SQLJoinTransform):
+            df = trans._source1_ if column.tablename == trans._source1_.table_name else trans._source2_
+            col = column.srccol[0]
+            continue
+        if isinstance(trans, (SQLProjectionTransform, SQLRenameTransform)):
+            if column.column_expr or not column.srccol:
+                return None
+            col = column.srccol[0]
+        src = trans.sources()
+        # a filtered projection keeps the filter keys next to its source
+        df = src[0] if isinstance(src, (tuple, list)) else src
+        if not isinstance(df, frame.DataFrame):
+            return None
+    return df, col
+
+
+def row_limit(df: frame.DataFrame):
+    """
+    bound the rows of a dataframe by the heads and tails in its lineage, followed down to the first transform
+    that can produce more rows than it reads, e.g. a join
+    @param df:
+    @return: max number of rows, None if the rows are not bounded
+    """
+    from aidac.dataframe.transforms import SQLHeadTransform, SQLTailTransform, SQLProjectionTransform, \
+        SQLFilterTransform, SQLQuery, SQLOrderTransform, SQLRenameTransform, SQLBinaryOperationTransform, \
+        SQLFillNA, SQLDropNA, SQLDropduplicateTransform
+    # transforms returning at most the rows of their source, aggregates are excluded as they return a row on no rows
+    bounded = (SQLProjectionTransform, SQLFilterTransform, SQLQuery, SQLOrderTransform, SQLRenameTransform,
+               SQLBinaryOperationTransform, SQLFillNA, SQLDropNA, SQLDropduplicateTransform)
+    limit = None
+    while df._stored_ is None and df.transform is not None:
+        trans = df.transform
+        if isinstance(trans, (SQLHeadTransform, SQLTailTransform)):
+            if isinstance(trans._num_, int) and trans._num_ >= 0:
+                limit = trans._num_ if limit is None else min(limit, trans._num_)
+        elif not isinstance(trans, bounded):
+            return limit
+        src = trans.sources()
+        df = src[0] if isinstance(src, (tuple, list)) else src
+        if not isinstance(df, frame.DataFrame):
+            return limit
+    if df._stored_ is not None:
+        rows = len(df._data_)
+        limit = rows if limit is None else min(limit, rows)
+    return limit
+
+
 def get_meta(df: frame.DataFrame):
     if df._data_ is not None:
-        meta = MetaInfo(df.columns, len(df.columns), len(df._data_))
+        meta = MetaInfo(df.columns, len(df.columns), len(df._data_), local_width(df._data_))
         return meta
     else:
+        limit = row_limit(df)
         while df.transform is not None:
-            df = df.transform.sources()
+            src = df.transform.sources()
+            df = src[0] if isinstance(src, (tuple, list)) else src
         nr = df.data_source.row_count(df.table_name)
+        if limit is not None:
+            nr = min(nr, limit)
         meta = MetaInfo(df.columns, len(df.columns), nr)
         return meta
 
 
 def get_hist(df: frame.DataFrame, col: str):
+    """
+    statistics of a column, taken from the table holding its values: computed from the data of a local table
+    or read from the statistics the database keeps
+    @param df:
+    @param col:
+    @return: Histgram, None if no statistics are available
+    """
+    from aidac.dataframe.frame_wrapper import WFrame
+    if isinstance(df, WFrame):
+        df = df._tail_frame
+    traced = trace_column(df, col)
+    if traced is None:
+        return None
+    df, col = traced
     if df._data_ is not None:
-        total = len(df.data)
-        n_null = df.data[col].isnull().sum()
-        n_distinct = len(np.unique(df.data[col].to_numpy()))
-        hist = Histgram(df.table_name, n_null/total, n_distinct)
-    else:
-        while df.transform is not None:
-            df = df.transform.sources()
-        table_name, null_frac, n_distinct, mcv = df.data_source.get_hist(df.table_name, col)
-        hist = Histgram(table_name, null_frac, n_distinct, mcv)
-    return hist
+        return Histgram.from_values(df.table_name, df.data[col])
+    stats = df.data_source.get_hist(df.table_name, col)
+    if not stats:
+        return None
+    return Histgram(*stats)
+
+
+def result_frame(ds, rs) -> pd.DataFrame:
+    """
+    @return: the query result as a dataframe in the result format of the data source
+    """
+    return rs.to_frame(arrow=getattr(ds, 'result_format', None) == 'arrow')
 
 
 class Executable:
@@ -76,6 +198,8 @@ class Executable:
         self.estimated_width = None
         # result set sent back required
         self.rs_required = False
+        # number of executables this one is a prerequisite of
+        self.refs = 1
 
     def to_be_executed_locally(self, df):
         """
@@ -94,21 +218,119 @@ class Executable:
                 return self.to_be_executed_locally(df.transform.sources())
         return True
     
-    def perform_local_operation(self, df):
+    def run_local_operation(self, df):
+        """
+        execute a lineage on local frames with the engine of the local data source
+        @param df:
+        @return:
+        """
+        if local_ds.engine == 'sqlite' and df.data is None:
+            data = self._run_local_sql(df)
+            if data is not None:
+                return data
+        elif local_ds.engine == 'fused' and df.data is None:
+            start = time.time()
+            data = FusedExecutor(self.perform_local_operation).run(df)
+            print('fused local time = {}'.format(time.time()-start))
+            return data
+        return self.perform_local_operation(df)
+
+    @staticmethod
+    def _run_local_sql(df):
+        """
+        run the generated SQL of a lineage on its local input frames in SQLite
+        @return: the result, None if the lineage cannot be run by SQLite
+        """
+        from aidac.dataframe.transforms import SQLProjectionTransform, SQLRenameTransform, SQLFilterTransform, \
+            SQLQuery
+        # filters and projections give the same rows and columns in SQL and pandas, sqlite scanning their input
+        # in the order it was loaded. Other transforms are replayed with pandas: joins as sqlite does not keep
+        # the row order of merge and names both inputs share are suffixed differently, aggregations as they
+        # return their groups as the index
+        local_sql = (SQLProjectionTransform, SQLRenameTransform, SQLFilterTransform, SQLQuery)
+        tables = {}
+        # (dataframe, column) pairs compared by filters
+        compared = []
+        stack = [df]
+        while stack:
+            cur = stack.pop()
+            if not isinstance(cur, frame.DataFrame):
+                return None
+            if cur.data is not None:
+                tables[cur.table_name] = cur
+                continue
+            trans = cur.transform
+            if not isinstance(trans, local_sql):
+                return None
+            if isinstance(trans, SQLQuery):
+                compared.extend((trans._source_, c) for c in trans._source_.columns)
+            elif isinstance(trans, SQLFilterTransform):
+                if isinstance(trans._other_, frame.DataFrame):
+                    # the other side of AND / OR or a compared column
+                    stack.append(trans._other_)
+                    if trans._op_ not in ('AND', 'OR'):
+                        compared.extend((trans._other_, c) for c in trans._other_.columns)
+                if trans._op_ not in ('AND', 'OR'):
+                    compared.extend((trans._source_, c) for c in trans._source_.columns)
+            sources = trans.sources()
+            stack.extend(sources if isinstance(sources, (tuple, list)) else [sources])
+
+        null_checked = {name: set() for name in tables}
+        for src, col in compared:
+            traced = trace_column(src, col)
+            if traced is None or traced[0].table_name not in tables:
+                # a computed value is compared, its nulls cannot be checked on the inputs
+                return None
+            null_checked[traced[0].table_name].add(traced[1])
+        for name, cur in tables.items():
+            if not sqlite_supported(cur.data, null_checked[name]):
+                return None
+        try:
+            sql = df.genSQL
+        except Exception:
+            # a transform without a SQL counterpart
+            return None
+
+        start = time.time()
+        try:
+            data = sqlite_engine.execute(sql, tables, df.columns)
+        except sqlite3.Error as e:
+            print('local sql failed, replaying the lineage with pandas: {}'.format(e))
+            return None
+        print('local sql time = {}'.format(time.time()-start))
+        return data
+
+    def perform_local_operation(self, df, evaluate=None):
+        """
+        replay the pandas calls of a lineage
+        @param df:
+        @param evaluate: function computing the sources of df, the sources are replayed as well by default
+        @return:
+        """
         if df.data is not None:
             return df.data
+        if evaluate is None:
+            evaluate = self.perform_local_operation
 
         sources = df.transform.sources()
 
         # todo: do we also want to save the intermediate results?
         if isinstance(sources, tuple):
-            data1 = self.perform_local_operation(sources[0])
-            data2 = self.perform_local_operation(sources[1])
+            data1 = evaluate(sources[0])
+            data2 = evaluate(sources[1])
             func = getattr(pd.DataFrame, df._saved_func_name_)
             data = func(data1, data2, **df._saved_kwargs_)
+        elif isinstance(sources, list):
+            # rows selected by a mask computed from the same source, e.g. df[df['a'] > 5]
+            data = evaluate(sources[0])
+            mask = evaluate(sources[1])
+            if isinstance(mask, pd.DataFrame):
+                # a mask of several columns keeps the rows where all of them hold, as the generated SQL does
+                mask = mask.all(axis=1)
+            data = data[mask]
         else:
             if sources.data is None:
-                data = self.perform_local_operation(sources)
+                data = evaluate(sources)
             else:
                 data = sources.data
             func = getattr(data, df._saved_func_name_)
@@ -117,23 +339,37 @@ class Executable:
             data = func(*df._saved_args_, **df._saved_kwargs_)
         return data
 
-    def process(self):
+    def process(self, chunksize=None):
         """
         Need to process all prerequisites and update the lineage
+        @param chunksize: if given, the result is not stored but returned as a generator of dataframe chunks
         @return:
         """
         if self.df.data is not None:
-            return self.df.data
+            return iter_chunks(self.df.data, chunksize) if chunksize else self.df.data
 
         for x in self.prereqs:
             x.process()
+        return self.process_node(chunksize)
+
+    def process_node(self, chunksize=None):
+        """
+        Execute this node only, all prerequisites have to be processed already
+        @param chunksize: if given, the result is not stored but returned as a generator of dataframe chunks
+        @return:
+        """
+        if self.df.data is not None:
+            return iter_chunks(self.df.data, chunksize) if chunksize else self.df.data
+
+        if chunksize:
+            return self.stream(chunksize)
 
         # print('process, planned job={}'.format(self.planned_job))
         start = time.time()
         if self.planned_job == LOCAL_DS:
             # local pandas operation
             assert self.to_be_executed_locally(self.df)
-            data = self.perform_local_operation(self.df)
+            data = self.run_local_operation(self.df)
         else:
             # materialize remote table
 
@@ -141,33 +377,100 @@ class Executable:
             print('sql generated: \n{}'.format(sql))
             ds = manager.get_data_source(self.planned_job)
 
-            rs = ds._execute(sql)
+            rs = ds.retrieve_result(sql)
 
             returned = time.time()
-            data = rs.get_result_table()
             # get result table and convert to dataframe
+            data = result_frame(ds, rs)
+            print('sql time = {}, conversion time = {}'.format(returned-start, time.time()-returned))
+        self.clear_lineage()
+        self.df._data_ = block_manager.put(data)
+        ResultCache.store(self.df, self.df._stored_)
+        return data
+
+    def _once(self, coro_func):
+        """
+        run a coroutine function of a node once, an executable shared by several others is awaited by all of them
+        @return: task of the run
+        """
+        task = getattr(self, '_task', None)
+        if task is None:
+            task = self._task = asyncio.ensure_future(coro_func())
+        return task
+
+    async def process_async(self):
+        """
+        Same as process, but independent prerequisites are processed concurrently and the event loop is
+        not blocked while waiting for the data sources
+        @return:
+        """
+        if self.df.data is not None:
+            return self.df.data
+        return await self._once(self._process_async)
+
+    async def _process_async(self):
+        await asyncio.gather(*(x.process_async() for x in self.prereqs))
+        return await self.process_node_async()
+
+    async def process_node_async(self):
+        if self.df.data is not None:
+            return self.df.data
+
+        start = time.time()
+        if self.planned_job == LOCAL_DS:
+            data = await asyncio.to_thread(self.run_local_operation, self.df)
+        else:
+            sql = self.df.genSQL
+            print('sql generated: \n{}'.format(sql))
+            ds = manager.get_data_source(self.planned_job)
+            if hasattr(ds, 'retrieve_result_async'):
+                rs = await ds.retrieve_result_async(sql)
+            else:
+                rs = await asyncio.to_thread(ds.retrieve_result, sql)
+
+            returned = time.time()
+            data = await asyncio.to_thread(result_frame, ds, rs)
             print('sql time = {}, conversion time = {}'.format(returned-start, time.time()-returned))
-            data = pd.DataFrame(data)
         self.clear_lineage()
-        self.df._data_ = data
+        self.df._data_ = block_manager.put(data)
+        ResultCache.store(self.df, self.df._stored_)
         return data
 
+    def stream(self, chunksize):
+        """
+        execute this node and yield its result chunk by chunk, the lineage is kept as the result is not stored
+        @param chunksize: number of rows per chunk
+        @return: generator of dataframes
+        """
+        if self.planned_job == LOCAL_DS:
+            yield from iter_chunks(self.run_local_operation(self.df), chunksize)
+        else:
+            sql = self.df.genSQL
+            print('sql generated: \n{}'.format(sql))
+            ds = manager.get_data_source(self.planned_job)
+            for rs in ds.stream_result(sql, chunksize):
+                yield result_frame(ds, rs)
+
     def plan(self):
         all_paths = []
         if self.prereqs:
             for x in self.prereqs:
-                all_paths.extend(x.plan())
+                # the branch has to know whether its result is sent back before it computes its costs
                 x.rs_required = self.rs_required
+                all_paths.extend(x.plan())
                 return all_paths
         else:
             # as we have no prereqs, all data has to be in the same database. Thus we can directly use genSQL
             if self.df.data_source.job_name != LOCAL_DS:
                 self.estimated_row, self.estimated_width = \
                     self.df.data_source.get_estimation(self.df.genSQL)
+                limit = row_limit(self.df)
+                if limit is not None and self.estimated_row is not None:
+                    self.estimated_row = min(self.estimated_row, limit)
             # if the data is local, then we have the actual data
             else:
                 self.estimated_row = len(self.df._data_)
-                self.estimated_width = len(self.df.columns) * 4 # todo: compute the actual size
+                self.estimated_width = local_width(self.df._data_)
             # total cost = 0, path = job_name
             # todo: explore all possible data sources
             return [(0, Node(self.df.data_source.job_name, None))]
@@ -175,6 +478,18 @@ class Executable:
     def add_prereq(self, *other: list[Executable]):
         self.prereqs.extend(other)
 
+    def is_materialized(self):
+        """
+        whether the result of this node is already available, its prerequisites need not to be processed then
+        """
+        return self.df.data is not None
+
+    def job(self):
+        """
+        @return: the job name of the data source this node runs on, None if the node does no work
+        """
+        return self.planned_job
+
     def clear_lineage(self):
         self.df.clear_lineage()
 
@@ -188,6 +503,8 @@ class TransferExecutable(Executable):
         self.df = df
         self.prereqs = prereqs
         self.dest = dest
+        self.refs = 1
+        self._transferred = False
 
     def transfer(self, src: frame.DataFrame, dest: str):
         """
@@ -206,9 +523,22 @@ class TransferExecutable(Executable):
             dest_ds = manager.get_data_source(dest)
             dest_ds.create_table(src.table_name, scols)
             dest_ds.import_table(src.table_name, scols, src.data)
-            print('transfer takes time {}'.format(start-time.time()))
+            print('transfer takes time {}'.format(time.time()-start))
         # todo: decide if a local stub should be created
 
+    async def transfer_async(self, src: frame.DataFrame, dest: str):
+        if src.data_source.job_name == dest or dest == LOCAL_DS:
+            return
+        dest_ds = manager.get_data_source(dest)
+        if not hasattr(dest_ds, 'import_table_async'):
+            return await asyncio.to_thread(self.transfer, src, dest)
+
+        start = time.time()
+        scols = src.columns
+        await dest_ds.create_table_async(src.table_name, scols)
+        await dest_ds.import_table_async(src.table_name, scols, src.data)
+        print('transfer takes time {}'.format(time.time()-start))
+
     def removable(self):
         # todo: recursively check the tree
         for x in self.prereqs:
@@ -225,9 +555,31 @@ class TransferExecutable(Executable):
         """
         for x in self.prereqs:
             x.process()
+        self.process_node()
 
-        if self.dest is not None:
+    def process_node(self, chunksize=None):
+        # a transfer shared by several joins is done once
+        if self.dest is not None and not self._transferred:
             self.transfer(self.df, self.dest)
+            self._transferred = True
+
+    async def process_async(self):
+        await self._once(self._process_async)
+
+    async def _process_async(self):
+        await asyncio.gather(*(x.process_async() for x in self.prereqs))
+        await self.process_node_async()
+
+    async def process_node_async(self):
+        if self.dest is not None and not self._transferred:
+            await self.transfer_async(self.df, self.dest)
+            self._transferred = True
+
+    def is_materialized(self):
+        return False
+
+    def job(self):
+        return self.dest
 
     def plan(self):
         return
@@ -243,6 +595,10 @@ class RootExecutable(Executable):
     def __init__(self):
         self.prereqs = []
         self.rs_required = True
+        # ids of the executables placed on a data source, a shared executable is placed by its first reader
+        self._placed = set()
+        # (id of executable, destination) -> transfer, the result of a shared executable is sent once per destination
+        self._transfers = {}
 
     def _get_lowest_cost_path(self, paths):
         lowest, opt_path = paths[0]
@@ -253,7 +609,8 @@ class RootExecutable(Executable):
         return opt_path
 
     def _insert_transfer_block(self, cur: Executable, path: Node):
-        if path:
+        if path and id(cur) not in self._placed:
+            self._placed.add(id(cur))
             while not isinstance(cur, ScheduleExecutable):
                 # branches only occurs at the schedule executable block
                 cur.planned_job = path.val
@@ -263,11 +620,17 @@ class RootExecutable(Executable):
                     # reach the end
                     return
 
+            if path.reduce is not None:
+                cur.reduce_branch(path.reduce)
             # insert transfer block at the schedule block
             transfer_blocks = []
             for x, p in zip(cur.prereqs, path.children):
-                te = TransferExecutable(x.df, prereqs=[x], dest=path.val)
-                transfer_blocks.append(te)
+                key = (id(x), path.val)
+                if key not in self._transfers:
+                    self._transfers[key] = TransferExecutable(x.df, prereqs=[x], dest=path.val)
+                te = self._transfers[key]
+                if te not in transfer_blocks:
+                    transfer_blocks.append(te)
                 if cur.prev_ex.planned_job is None:
                     cur.prev_ex.planned_job = path.val
                 # recursively add transfer blocks down the branch
@@ -285,13 +648,19 @@ class RootExecutable(Executable):
             self.pre_process()
         return path
 
-    def process(self):
+    def process(self, chunksize=None):
         """
         Need to process all prerequisites and update the lineage
+        @param chunksize: stream the result of the last prerequisite in chunks of this size
         @return:
         """
-        for x in self.prereqs:
+        for x in self.prereqs[:-1]:
             x.process()
+        return self.prereqs[-1].process(chunksize)
+
+    async def process_async(self):
+        await asyncio.gather(*(x.process_async() for x in self.prereqs[:-1]))
+        return await self.prereqs[-1].process_async()
 
 
 class ScheduleExecutable(Executable):
@@ -310,6 +679,10 @@ class ScheduleExecutable(Executable):
         self.prev_ex = prev_ex
         self.prereqs = []
         self.rs_required = False
+        self.refs = 1
+        self._preprocessed = False
+        # branch index -> (distinct keys of the other branch, join columns of the branch)
+        self._semi_keys = {}
 
     def _traverse2end(self, df: frame.DataFrame):
         """
@@ -361,6 +734,17 @@ class ScheduleExecutable(Executable):
             all_path.append(path)
         return self.find_local_transfer_costs(all_path)
 
+    @staticmethod
+    def _estimate_of(ex: Executable):
+        """
+        @return: estimated (rows, width) of the result of a branch
+        """
+        while getattr(ex, 'estimated_row', None) is None and ex.prereqs:
+            ex = ex.prereqs[0]
+        rows = getattr(ex, 'estimated_row', None) or 0
+        width = getattr(ex, 'estimated_width', None) or 0
+        return rows, width
+
     def _convert_to_width(self, cols: Dict[str, Column]):
         for cname, col in cols:
             kclass = globals()[str(col.dtype)]()
@@ -370,6 +754,8 @@ class ScheduleExecutable(Executable):
         """compute the transfer cost for all possible data transferring at the local level
         all_dest format:
         [cost, all target job destination along the path(e.g. ['job1', 'job2'])]
+        costs are the estimated number of bytes transferred
+        @param prev_dest: the paths of the two branches if they are already planned
         """
         # get the merged point transform
         trans = self.prev.transform
@@ -382,13 +768,24 @@ class ScheduleExecutable(Executable):
             # we calculate the cost for all possible path
             # (for every previous path we compute the transfer cost between it and every possible new destination)
             assert len(self.prereqs) == 2
-            plan1 = self.prereqs[0].plan()
-            plan2 = self.prereqs[1].plan()
+            if prev_dest:
+                plan1, plan2 = prev_dest
+            else:
+                plan1 = self.prereqs[0].plan()
+                plan2 = self.prereqs[1].plan()
 
-            estimate_card = self.estimate_join_card(self.prereqs[0], self.prereqs[1]) if jn_flag else self.estimate_filter_card(trans)
+            if jn_flag:
+                estimate_card = self.estimate_join_card(self.prereqs[0], self.prereqs[1])
+                estimate_width = self._estimate_of(self.prereqs[0])[1] + self._estimate_of(self.prereqs[1])[1]
+            else:
+                estimate_card, estimate_width = self.estimate_filter_card(trans)
+            # a head or tail above the join bounds the rows it returns and sends back
+            limit = row_limit(self.prev_ex.df)
+            if limit is not None:
+                estimate_card = min(estimate_card, limit)
             self.prev_ex.estimated_row = estimate_card
-            # todo: change width
-            self.prev_ex.estimated_width = len(self.prev.columns)*4
+            self.prev_ex.estimated_width = estimate_width
+            result_size = estimate_card * estimate_width
             all_plans = []
             # todo: handle projection where the filter comes from a differebt source
             for cost1, path1 in plan1:
@@ -398,7 +795,7 @@ class ScheduleExecutable(Executable):
                         # the two branches are from the same ds, thus no extra transfer is required
                         job_name = path1.val
                         new_path = Node(job_name, [path1, path2])
-                        new_cost = cost1 + cost2
+                        new_cost = cost1 + cost2 + self.prior_join_cost(self.prereqs[1], path1.val, path2.val, result_size)
                         all_plans.append((new_cost, new_path))
                     else:
                         # currently does not support remote filter as the db does not have an order
@@ -407,62 +804,171 @@ class ScheduleExecutable(Executable):
                         # path separate as there are two possible destinations
                         new_path = Node(path1.val, [path1, path2])
                         # todo: write it in a better way
-                        new_cost = cost1 + cost2 + self.prior_join_cost(self.prereqs[1], path1.val, path2.val, estimate_card)
+                        new_cost = cost1 + cost2 + self.prior_join_cost(self.prereqs[1], path1.val, path2.val, result_size)
                         all_plans.append((new_cost, new_path))
 
                         new_path = Node(path2.val, [path1, path2])
-                        new_cost = cost1 + cost2 + self.prior_join_cost(self.prereqs[0], path2.val, path1.val, estimate_card)
+                        new_cost = cost1 + cost2 + self.prior_join_cost(self.prereqs[0], path2.val, path1.val, result_size)
                         all_plans.append((new_cost, new_path))
+
+                        # only the rows of one branch matching the keys of the other are transferred
+                        paths = (path1, path2)
+                        for small, large in ((0, 1), (1, 0)):
+                            reduced = self.semi_join_cost(small, large)
+                            if reduced is not None:
+                                dest = paths[small].val
+                                new_path = Node(dest, [path1, path2], reduce=large)
+                                new_cost = cost1 + cost2 + reduced + \
+                                    self.prior_join_cost(self.prereqs[large], dest, dest, result_size)
+                                all_plans.append((new_cost, new_path))
         return all_plans
 
-    def prior_join_cost(self, other_table, my_dest, other_dest,  joined_card):
+    def prior_join_cost(self, other_table, my_dest, other_dest, joined_size):
         """
         compute the transferring cost if the other table does not have the same data source destination
         @param other_table: the other table in the join
         @param my_dest: current planned destination
         @param other_dest: the other table's planned destination
-        @param joined_card: joined cardinality
-        @return:
+        @param joined_size: estimated size of the joined result in bytes
+        @return: number of bytes transferred
         """
         if my_dest != other_dest:
-            meta = MetaInfo(other_table.df.columns, other_table.estimated_width, other_table.estimated_row)
-            cost_before = meta.nrows*meta.ncols
+            rows, width = self._estimate_of(other_table)
+            cost_before = MetaInfo(other_table.df.columns, nrows=rows, width=width).size()
         else:
             cost_before = 0
 
-        joined_card = joined_card if self.rs_required and my_dest != LOCAL_DS else 0
+        # the result has to be sent back if it is not computed locally
+        joined_size = joined_size if self.rs_required and my_dest != LOCAL_DS else 0
+
+        return cost_before + joined_size
 
-        return cost_before + joined_card
+    def _join_columns(self, idx):
+        cols = self.prev.transform.join_cols[idx]
+        return [cols] if isinstance(cols, str) else list(cols)
+
+    def semi_join_cost(self, small, large):
+        """
+        cost of a semi join reduction: the distinct join keys of a local branch are sent to the data source of the
+        other branch, which then only sends back its rows matching one of them
+        @param small: index of the local branch providing the keys
+        @param large: index of the branch to be reduced
+        @return: number of bytes transferred, None if the reduction is not possible
+        """
+        trans = self.prev.transform
+        sm, lg = self.prereqs[small], self.prereqs[large]
+        if large not in SEMI_JOIN_SIDES.get(trans._jointype_, ()):
+            return None
+        # the keys have to be known now and the reduced branch has to be a single query on its data source
+        # a shared branch is read by other executables as well, it must not be replaced
+        if sm.df.data is None or lg.prereqs or lg.refs > 1 or lg.df.data is not None \
+                or lg.df.data_source is None or lg.df.data_source.job_name == LOCAL_DS:
+            return None
+        large_cols = self._join_columns(large)
+        keys = sm.df.data[self._join_columns(small)].dropna().drop_duplicates()
+        keys.columns = large_cols
+
+        rows, width = self._estimate_of(lg)
+        selectivity = 1
+        for cname in large_cols:
+            hist = get_hist(lg.df, cname)
+            if hist is None:
+                # assume every key matches one row
+                hist = Histgram(None, 0, max(rows, 1))
+            selectivity *= estimate_semi_join_selectivity(keys[cname].unique(), hist)
+        self._semi_keys[large] = keys, large_cols
+        return len(keys)*local_width(keys) + rows*selectivity*width
+
+    def reduce_branch(self, idx):
+        """
+        replace a branch of the join by its rows matching the keys of the other branch,
+        the keys are sent inline or as a temporary table
+        @param idx: index of the branch to be reduced
+        """
+        keys, cols = self._semi_keys[idx]
+        ex = self.prereqs[idx]
+        target = cols[0] if len(cols) == 1 else '(' + ', '.join(cols) + ')'
+        if len(keys) <= SEMI_JOIN_INLINE_KEYS:
+            values = [sql_literal(row[0]) if len(cols) == 1 else '(' + ', '.join(map(sql_literal, row)) + ')'
+                      for row in keys.itertuples(index=False)]
+            # an empty list is not valid sql, no row matches then
+            reduced = ex.df.query(target + ' IN (' + ', '.join(values) + ')' if values else 'FALSE')
+        else:
+            key_df = frame.DataFrame(data=keys, ds=local_ds)
+            reduced = ex.df.query('{} IN (SELECT {} FROM {})'.format(target, ', '.join(cols), key_df.table_name))
+            ex.add_prereq(TransferExecutable(key_df, prereqs=[], dest=ex.df.data_source.job_name))
+
+        # the join reads the reduced branch, the original dataframe stays as it is
+        from aidac.dataframe.transforms import lineage_changed
+        join = self.prev
+        sides = list(join.transform.sources())
+        sides[idx] = reduced
+        join._transform_ = sides[0].merge(sides[1], **join._saved_kwargs_).transform
+        lineage_changed()
+        ex.df = reduced
 
     def estimate_filter_card(self, trans):
+        """
+        @return: estimated (rows, width) of the filtered result
+        """
         # todo: update the data source to be used
         self.estimated_row, self.estimated_width = \
             self.prev.data_source.get_estimation(trans.genSQL)
-        return self.estimated_row * self.estimated_width
+        return self.estimated_row, self.estimated_width
+
+    def _join_hist(self, tbl: Executable, col: str, rows):
+        """
+        statistics of a join column, the distinct values are bounded by the estimated rows of the branch
+        """
+        hist = get_hist(tbl.df, col)
+        if hist is None:
+            # assume the values are unique
+            return Histgram(tbl.df.table_name, 0, rows)
+        hist.n_distinct = min(hist.n_distinct, rows) if rows else hist.n_distinct
+        return hist
 
     def estimate_join_card(self, tbl1, tbl2):
         """
-        estimate the amount of tuples need to be transferred back and forth
-        @param count_result: whether the result set will be transfered
+        estimate the number of rows of the join result from the statistics of the join columns
+        @param tbl1: left branch
+        @param tbl2: right branch
         @return:
         """
-        meta1 = MetaInfo(tbl1.df.columns, tbl1.estimated_row, tbl1.estimated_width)
-        meta2 = MetaInfo(tbl2.df.columns, tbl2.estimated_row, tbl2.estimated_width)
+        rows1, _ = self._estimate_of(tbl1)
+        rows2, _ = self._estimate_of(tbl2)
 
         trans = self.prev.transform
 
         from aidac.dataframe.transforms import SQLJoinTransform
 
         assert isinstance(trans, SQLJoinTransform)
-        # join1_cols, join2_cols = trans.join_cols
-        # hist1 = get_hist(tbl1.df, join1_cols)
-        # hist2 = get_hist(tbl2.df, join2_cols)
-        # todo: use new estimation
-        rs_card = estimate_join_card(meta1.nrows, meta2.nrows, 0, 0, meta1.nrows, meta2.nrows)
+        if trans._jointype_ == 'cross':
+            return rows1 * rows2
+        join1_cols, join2_cols = trans.join_cols
+        if isinstance(join1_cols, str):
+            join1_cols, join2_cols = [join1_cols], [join2_cols]
+
+        # the join columns are assumed to be independent
+        selectivity = 1
+        for c1, c2 in zip(join1_cols, join2_cols):
+            hist1 = self._join_hist(tbl1, c1, rows1)
+            hist2 = self._join_hist(tbl2, c2, rows2)
+            selectivity *= estimate_join_selectivity(hist1, hist2)
+        rs_card = rows1 * rows2 * selectivity
+
+        # an outer join keeps every row of its preserved side
+        if trans._jointype_ in ('left', 'outer'):
+            rs_card = max(rs_card, rows1)
+        if trans._jointype_ in ('right', 'outer'):
+            rs_card = max(rs_card, rows2)
         return rs_card
 
     # remove redundant transfer blocks if the dest and the origin are the same
     def pre_process(self):
+        # the block may be reached through several readers of a shared branch
+        if self._preprocessed:
+            return
+        self._preprocessed = True
         new_prereqs = []
         should_remove = []
         for x in self.prereqs:
@@ -471,12 +977,30 @@ class ScheduleExecutable(Executable):
                 should_remove.append(x)
                 new_prereqs.extend(child)
         self.prereqs = [x for x in self.prereqs if x not in should_remove]
-        self.prereqs.extend(new_prereqs)
+        for x in new_prereqs:
+            if x not in self.prereqs:
+                self.prereqs.append(x)
 
     def process(self):
         for x in self.prereqs:
             x.process()
 
+    def process_node(self, chunksize=None):
+        # the schedule block only merges its branches, the work is done by its prerequisites
+        return
+
+    async def process_async(self):
+        await self._once(self._process_async)
+
+    async def _process_async(self):
+        await asyncio.gather(*(x.process_async() for x in self.prereqs))
+
+    def is_materialized(self):
+        return False
+
+    def job(self):
+        return None
+
     def clear_lineage(self):
         for x in self.prereqs:
             x.clear_lineage()
@@ -0,0 +1,243 @@
+from __future__ import annotations
+
+import collections
+import numbers
+
+import numpy as np
+import pandas as pd
+
+# rows tested at a time by a head over filters, the scan stops once enough rows passed
+HEAD_SCAN_ROWS = 64 * 1024
+# numpy kinds (bool, int, uint, float) of the columns compared with or computed on numbers
+_NUMERIC_KINDS = 'biuf'
+
+# pandas comparison -> numpy function computing the mask
+_COMPARISONS = {'__eq__': np.equal, '__ne__': np.not_equal, '__gt__': np.greater, '__ge__': np.greater_equal,
+                '__lt__': np.less, '__le__': np.less_equal}
+# pandas operator combining two masks -> numpy function
+_LOGICAL = {'__and__': np.logical_and, '__or__': np.logical_or}
+# pandas arithmetic with a number -> numpy function
+_ARITHMETIC = {'__add__': np.add, '__sub__': np.subtract, '__mul__': np.multiply, '__truediv__': np.true_divide}
+_FUNCS = {**_COMPARISONS, **_LOGICAL, **_ARITHMETIC}
+
+
+def _evaluate(expr, base: pd.DataFrame, rows):
+    """
+    @param expr: ('col', name), ('const', value) or (function name, *argument expressions)
+    @param base: frame the columns are read from
+    @param rows: positions of the rows to compute, None for all rows
+    @return: array of the expression on the rows
+    """
+    kind = expr[0]
+    if kind == 'const':
+        return expr[1]
+    if kind == 'col':
+        series = base[expr[1]]
+        values = series.to_numpy() if isinstance(series.dtype, np.dtype) else series.array
+        return values if rows is None else values[rows]
+    return _FUNCS[kind](*(_evaluate(arg, base, rows) for arg in expr[1:]))
+
+
+def _all(exprs):
+    """
+    @return: expression holding where all the boolean expressions hold, None if there are none
+    """
+    pred = None
+    for expr in exprs:
+        pred = expr if pred is None else ('__and__', pred, expr)
+    return pred
+
+
+class _Chain:
+    """
+    A fused chain of transforms: the rows of a materialized base frame that pass its steps, filters and heads in
+    lineage order, and the output columns as expressions on the base columns
+    """
+    def __init__(self, base: pd.DataFrame, steps=(), exprs=None):
+        self.base = base
+        # ('filter', boolean expression) or ('head', n)
+        self.steps = steps
+        # output column -> expression, None for the columns of the base as they are
+        self.exprs = exprs
+
+    @property
+    def columns(self):
+        if self.exprs is None:
+            return collections.OrderedDict((c, ('col', c)) for c in self.base.columns)
+        return self.exprs
+
+    def derive(self, steps=(), exprs=None) -> _Chain:
+        return _Chain(self.base, self.steps + steps, self.exprs if exprs is None else exprs)
+
+    def evaluate(self) -> pd.DataFrame:
+        if not self.steps and self.exprs is None:
+            return self.base
+        rows = self._rows()
+        index = self.base.index if rows is None else self.base.index[rows]
+        # division by zero gives inf and nan as it does in pandas
+        with np.errstate(divide='ignore', invalid='ignore'):
+            data = collections.OrderedDict((name, _evaluate(expr, self.base, rows))
+                                           for name, expr in self.columns.items())
+        return pd.DataFrame(data, index=index)
+
+    def _rows(self):
+        """
+        @return: positions of the base rows passing the steps, None if all rows pass
+        """
+        rows = None
+        pending = []
+        for kind, arg in self.steps:
+            if kind == 'filter':
+                pending.append(arg)
+            else:
+                rows = self._head(rows, pending, arg)
+                pending = []
+        return self._filter(rows, pending)
+
+    def _filter(self, rows, preds):
+        # each filter is only evaluated on the rows passing the previous ones
+        for pred in preds:
+            mask = _evaluate(pred, self.base, rows)
+            rows = np.flatnonzero(mask) if rows is None else rows[mask]
+        return rows
+
+    def _head(self, rows, preds, n):
+        total = len(self.base) if rows is None else len(rows)
+        if not preds:
+            return np.arange(min(n, total)) if rows is None else rows[:n]
+        found = []
+        count = 0
+        start = 0
+        step = max(n, HEAD_SCAN_ROWS)
+        while start < total and count < n:
+            chunk = np.arange(start, min(start + step, total)) if rows is None else rows[start:start + step]
+            chunk = self._filter(chunk, preds)[:n - count]
+            found.append(chunk)
+            count += len(chunk)
+            start += step
+        return np.concatenate(found) if found else np.empty(0, dtype=np.intp)
+
+
+class FusedExecutor:
+    """
+    Runs a local lineage by fusing consecutive filters, projections, heads and arithmetic with numbers into one
+    vectorized pass over their materialized input: the filters are combined into a selection of rows, only the
+    projected columns are computed, and only on the selected rows, and a head stops scanning once it has its rows.
+    Other transforms are replayed with pandas and start a new chain on their result.
+    """
+    def __init__(self, replay):
+        """
+        @param replay: function(df, evaluate) running the pandas call of a dataframe, its sources are computed
+        by evaluate
+        """
+        self.replay = replay
+        # id of dataframe -> (dataframe, chain), the branches of a filter share the chain of its input
+        self._chains = {}
+
+    def run(self, df):
+        """
+        @param df:
+        @return: the result of the lineage of df
+        """
+        if df.data is not None:
+            return df.data
+        return self._chain(df).evaluate()
+
+    def _chain(self, df) -> _Chain:
+        key = id(df)
+        if key not in self._chains:
+            chain = None if df.data is not None else self._fuse(df)
+            if chain is None:
+                data = df.data if df.data is not None else self.replay(df, self.run)
+                chain = _Chain(data)
+            self._chains[key] = (df, chain)
+        return self._chains[key][1]
+
+    def _source(self, df):
+        """
+        @return: the chain of a source, None if its result cannot be fused on, e.g. a series
+        """
+        chain = self._chain(df)
+        if not isinstance(chain.base, pd.DataFrame) or not chain.base.columns.is_unique:
+            return None
+        return chain
+
+    def _fuse(self, df):
+        """
+        @return: the chain of a dataframe extending the chain of its source, None if its transform is not fused
+        """
+        from aidac.dataframe.transforms import SQLProjectionTransform, SQLFilterTransform, SQLHeadTransform, \
+            SQLBinaryOperationTransform
+        trans = df.transform
+        func = df._saved_func_name_
+        if isinstance(trans, SQLProjectionTransform) and func == '__getitem__':
+            return self._fuse_projection(trans)
+        if isinstance(trans, SQLFilterTransform) and func in _COMPARISONS:
+            return self._fuse_constant(trans._source_, func, trans._other_, numbers.Number, str)
+        if isinstance(trans, SQLFilterTransform) and func in _LOGICAL:
+            return self._fuse_masks(trans._source_, func, trans._other_)
+        if isinstance(trans, SQLBinaryOperationTransform) and func in _ARITHMETIC and trans._is_num_:
+            return self._fuse_constant(trans._source_, func, trans._other_, numbers.Number)
+        if isinstance(trans, SQLHeadTransform) and func == 'head':
+            n = trans._num_
+            chain = self._source(trans._source_)
+            if chain is None or not isinstance(n, numbers.Integral) or n < 0:
+                return None
+            return chain.derive(steps=(('head', int(n)),))
+        return None
+
+    def _fuse_projection(self, trans):
+        if isinstance(trans._source_, (list, tuple)):
+            # selection with a mask computed from the same rows, e.g. df[df['a'] > 5]
+            src, mask = trans._source_
+            chain, masks = self._source(src), self._source(mask)
+            if chain is None or masks is None or masks.base is not chain.base or masks.steps != chain.steps:
+                return None
+            # a mask of several columns keeps the rows where all of them hold, as the generated SQL does
+            pred = _all(masks.columns.values())
+            steps = (('filter', pred),) if pred is not None else ()
+        else:
+            chain = self._source(trans._source_)
+            steps = ()
+            if chain is None:
+                return None
+        keys = list(trans._projcols_)
+        cols = chain.columns
+        if len(set(keys)) != len(keys) or not all(isinstance(k, str) and k in cols for k in keys):
+            return None
+        return chain.derive(steps=steps, exprs=collections.OrderedDict((k, cols[k]) for k in keys))
+
+    def _fuse_constant(self, src, func, other, *const_types):
+        """
+        apply a comparison or arithmetic with a constant to every column of the source
+        """
+        chain = self._source(src)
+        if chain is None or isinstance(other, bool) or not isinstance(other, const_types):
+            return None
+        exprs = collections.OrderedDict()
+        for name, expr in chain.columns.items():
+            if expr[0] == 'col':
+                dtype = chain.base[expr[1]].dtype
+                if not isinstance(dtype, np.dtype):
+                    return None
+                # numbers are compared with numeric columns, text with object columns, as pandas would
+                if isinstance(other, str) != (dtype.kind == 'O') or dtype.kind not in _NUMERIC_KINDS + 'O':
+                    return None
+            elif isinstance(other, str):
+                return None
+            exprs[name] = (func, expr, ('const', other))
+        return chain.derive(exprs=exprs)
+
+    def _fuse_masks(self, src, func, other):
+        chain = self._source(src)
+        masks = self._source(other) if hasattr(other, 'transform') else None
+        if chain is None or masks is None or masks.base is not chain.base or masks.steps != chain.steps:
+            return None
+        if list(chain.columns) == list(masks.columns):
+            exprs = collections.OrderedDict((name, (func, expr, masks.columns[name]))
+                                            for name, expr in chain.columns.items())
+        else:
+            # masks on different columns, e.g. (df['a'] > 1) & (df['b'] < 2), are combined row by row
+            pred = (func, _all(chain.columns.values()), _all(masks.columns.values()))
+            exprs = collections.OrderedDict((name, pred) for name in chain.columns)
+        return chain.derive(exprs=exprs)
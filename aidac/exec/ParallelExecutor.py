@@ -0,0 +1,126 @@
+from __future__ import annotations
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from contextlib import nullcontext
+
+from aidac.data_source.DataSourceManager import manager, LOCAL_DS
+from aidac.exec.Executable import Executable, RootExecutable
+
+DEFAULT_WORKERS = 8
+
+
+class ParallelExecutor:
+    """
+    Execute an Executable DAG with a thread pool. A node is started as soon as all its prerequisites are done,
+    so independent branches (e.g. two remote tables on different data sources) and their transfers run concurrently.
+    The number of nodes running on a data source at the same time is bounded by the size of its connection pool.
+    """
+    def __init__(self, max_workers: int = DEFAULT_WORKERS, source_limits: dict = None):
+        """
+        @param max_workers: number of worker threads
+        @param source_limits: job name -> max number of concurrent nodes, overrides the pool size of the source
+        """
+        self.max_workers = max_workers
+        self.source_limits = source_limits if source_limits is not None else {}
+        self._semaphores = {}
+        self._lock = threading.Lock()
+        # (node description, job name, seconds) of the last run
+        self.timings = []
+
+    def _limit(self, job):
+        """
+        @return: semaphore that bounds the concurrent nodes on a data source, None if there is no bound
+        """
+        if job is None or job == LOCAL_DS:
+            return None
+        with self._lock:
+            if job not in self._semaphores:
+                limit = self.source_limits.get(job)
+                if limit is None:
+                    limit = getattr(manager.get_data_source(job), 'pool_max_size', 1)
+                self._semaphores[job] = threading.BoundedSemaphore(limit)
+            return self._semaphores[job]
+
+    def _run_node(self, node: Executable, chunksize=None):
+        job = node.job()
+        sem = self._limit(job)
+        with sem if sem is not None else nullcontext():
+            start = time.time()
+            result = node.process_node(chunksize)
+            elapsed = time.time() - start
+        if job is not None:
+            with self._lock:
+                self.timings.append((self._describe(node), job, elapsed))
+        return result
+
+    @staticmethod
+    def _describe(node):
+        df = getattr(node, 'df', None)
+        name = getattr(df, 'table_name', None)
+        return '{}({})'.format(type(node).__name__, name) if name else type(node).__name__
+
+    def run_all(self, nodes: list):
+        """
+        process the given nodes and everything they depend on
+        @param nodes:
+        @return:
+        """
+        # id -> [node, ids of unfinished prerequisites]
+        pending = {}
+        # id -> nodes waiting for it
+        waiting = {}
+        stack = list(nodes)
+        while stack:
+            node = stack.pop()
+            if id(node) in pending:
+                continue
+            prereqs = [] if node.is_materialized() else node.prereqs
+            pending[id(node)] = [node, {id(x) for x in prereqs}]
+            for x in prereqs:
+                waiting.setdefault(id(x), []).append(node)
+                stack.append(x)
+
+        with ThreadPoolExecutor(self.max_workers) as pool:
+            running = {}
+
+            def submit_ready():
+                for key, (node, deps) in list(pending.items()):
+                    if not deps:
+                        del pending[key]
+                        running[pool.submit(self._run_node, node)] = key
+
+            submit_ready()
+            while running:
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    key = running.pop(future)
+                    if future.exception() is not None:
+                        for other in running:
+                            other.cancel()
+                        raise future.exception()
+                    for node in waiting.get(key, []):
+                        pending[id(node)][1].discard(key)
+                submit_ready()
+
+    def run(self, root: RootExecutable, chunksize=None):
+        """
+        process a planned execution tree
+        @param root:
+        @param chunksize: stream the final result in chunks of this size
+        @return: result of the last node
+        """
+        self.timings = []
+        final = root.prereqs[-1]
+        nodes = list(root.prereqs[:-1])
+        if not final.is_materialized():
+            nodes.extend(final.prereqs)
+        self.run_all(nodes)
+        result = self._run_node(final, chunksize)
+        self.report()
+        return result
+
+    def report(self):
+        for name, job, elapsed in self.timings:
+            print('{} on {}: {:.4f}s'.format(name, job, elapsed))
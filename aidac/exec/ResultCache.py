@@ -0,0 +1,254 @@
+from __future__ import annotations
+
+import collections
+import collections.abc
+import datetime
+import functools
+import hashlib
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from aidac.common.block_manager import Block, block_manager
+
+# maximum size of the cached results in bytes
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+# seconds a cached result stays valid, None to keep results until they are evicted or invalidated
+DEFAULT_TTL = 300
+
+# attributes of a transform that are caches or sources, they are not part of its definition
+_TRANSFORM_SKIPPED = {'_columns_', '_block_', '_sql_', '_cache_epoch_', '_source_', '_source1_', '_source2_',
+                      '_table_name_'}
+_SCALARS = (str, int, float, bool, type(None), np.generic, datetime.date, datetime.time, datetime.timedelta)
+# collected next to the tables when a lineage reads local data, its fingerprint is then computed again on every
+# lookup as the data may have been changed in place
+_LOCAL_DATA = ('', 'local data')
+
+
+class Uncacheable(Exception):
+    """
+    raised when a lineage contains something without a stable definition, e.g. a lambda
+    """
+
+
+class ResultCache:
+    """
+    Process wide cache of materialized results keyed by the fingerprint of their lineage.
+    The least recently used results are evicted once the cached data exceeds max_bytes. A result is dropped when
+    one of the tables it was computed from changes or after ttl seconds, as tables may also be changed by others.
+    The cache is disabled by default: a table changed outside aidac is only noticed once the ttl expires.
+    """
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES, ttl=DEFAULT_TTL, enabled=False):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.enabled = enabled
+        # fingerprint -> (time stored, data, source tables, size)
+        self._entries = collections.OrderedDict()
+        self._size = 0
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+
+    def configure(self, enabled=True, max_bytes=DEFAULT_MAX_BYTES, ttl=DEFAULT_TTL):
+        with self._lock:
+            self.enabled = enabled
+            self.max_bytes = max_bytes
+            self.ttl = ttl
+            if not enabled:
+                self.clear()
+            while self._size > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+
+    def get(self, key):
+        """
+        @param key: lineage fingerprint
+        @return: the cached result, None if there is none
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self.ttl is not None and time.time() - entry[0] > self.ttl:
+                self._remove(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, data: pd.DataFrame, tables):
+        """
+        @param key: lineage fingerprint
+        @param data: materialized result, a dataframe or a block of the block manager
+        @param tables: (job name, table name) of the tables the result was computed from
+        """
+        if isinstance(data, pd.DataFrame):
+            size = int(data.memory_usage(index=True, deep=False).sum())
+        else:
+            # a block of the block manager
+            size = getattr(data, 'nbytes', 0)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.time(), data, frozenset(tables), size)
+            self._size += size
+            while self._size > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+
+    def _remove(self, key):
+        self._size -= self._entries.pop(key)[3]
+
+    def invalidate_table(self, job: str, table: str):
+        """
+        drop the results computed from a table
+        """
+        with self._lock:
+            for key in [k for k, entry in self._entries.items() if (job, table) in entry[2]]:
+                self._remove(key)
+
+    def invalidate_job(self, job: str):
+        """
+        drop the results computed from any table of a data source
+        """
+        with self._lock:
+            for key in [k for k, entry in self._entries.items() if any(j == job for j, _ in entry[2])]:
+                self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+
+result_cache = ResultCache()
+
+
+def _hash_data(data) -> str:
+    digest = hashlib.sha1()
+    if isinstance(data, pd.DataFrame):
+        digest.update(repr(list(data.columns)).encode())
+        digest.update(repr(list(data.dtypes)).encode())
+    data = pd.Series(data) if isinstance(data, np.ndarray) and data.ndim == 1 else data
+    try:
+        digest.update(pd.util.hash_pandas_object(data, index=True).to_numpy().tobytes())
+    except TypeError:
+        # e.g. cells holding lists
+        raise Uncacheable('unhashable data')
+    return digest.hexdigest()
+
+
+def _canonical(val, tables) -> str:
+    from aidac.dataframe import frame
+    if isinstance(val, frame.DataFrame):
+        return lineage_fingerprint(val, tables)
+    if isinstance(val, (pd.DataFrame, pd.Series)) or isinstance(val, np.ndarray) and val.ndim == 1:
+        return 'data:' + _hash_data(val)
+    if isinstance(val, _SCALARS):
+        return type(val).__name__ + ':' + repr(val)
+    if isinstance(val, dict):
+        return '{' + ', '.join(_canonical(k, tables) + ': ' + _canonical(v, tables) for k, v in val.items()) + '}'
+    if isinstance(val, (list, tuple)):
+        return '[' + ', '.join(_canonical(v, tables) for v in val) + ']'
+    if isinstance(val, functools.partial):
+        return 'partial(' + ', '.join([_canonical(val.func, tables), _canonical(val.args, tables),
+                                       _canonical(val.keywords, tables)]) + ')'
+    if callable(val) and hasattr(val, '__qualname__') and '<' not in val.__qualname__:
+        return 'func:' + getattr(val, '__module__', '') + '.' + val.__qualname__
+    if isinstance(val, (collections.abc.KeysView, collections.abc.ValuesView)):
+        # e.g. column names taken from a dict
+        return _canonical(list(val), tables)
+    if isinstance(val, (set, frozenset)):
+        return '{' + ', '.join(sorted(_canonical(v, tables) for v in val)) + '}'
+    raise Uncacheable(type(val).__name__)
+
+
+def _transform_definition(trans, tables) -> str:
+    params = ['{}={}'.format(k, _canonical(v, tables)) for k, v in sorted(vars(trans).items())
+              if k not in _TRANSFORM_SKIPPED]
+    return type(trans).__name__ + '(' + ', '.join(params) + ')'
+
+
+def lineage_fingerprint(df, tables=None) -> str:
+    """
+    Fingerprint of what a dataframe computes: the definitions of the transforms of its lineage, the database
+    tables and the content of the local data it reads. The fingerprint is kept on the dataframe, its lineage is
+    only rewritten into equivalent ones and its materialized result stays the result of that lineage.
+    @param df:
+    @param tables: set collecting the (job name, table name) of the database tables read by the lineage
+    @return:
+    @raise Uncacheable: if the lineage contains something without a stable definition
+    """
+    tables = set() if tables is None else tables
+    cached = getattr(df, '_fingerprint_', None)
+    if cached is not None and _LOCAL_DATA not in cached[1] and (df._stored_ is None or cached[2] is df._stored_):
+        tables.update(cached[1])
+        return cached[0]
+
+    own_tables = set()
+    if df.transform is not None:
+        sources = df.transform.sources()
+        sources = sources if isinstance(sources, (list, tuple)) else [sources]
+        text = _transform_definition(df.transform, own_tables) + '<-' + _canonical(list(sources), own_tables)
+    elif df.data is not None:
+        own_tables.add(_LOCAL_DATA)
+        text = 'data:' + _hash_data(df.data)
+    elif df._db_persistent:
+        job = df.data_source.job_name
+        own_tables.add((job, df.source_table))
+        text = 'table:{}.{}'.format(job, df.source_table)
+    else:
+        raise Uncacheable(df.table_name)
+    fingerprint = hashlib.sha1(text.encode()).hexdigest()
+    df._fingerprint_ = (fingerprint, frozenset(own_tables), df._stored_)
+    tables.update(own_tables)
+    return fingerprint
+
+
+def lookup(df) -> bool:
+    """
+    replace the lineage of df, or else of the dataframes it reads, by cached results
+    @param df:
+    @return: whether the result of df itself was cached
+    """
+    if not result_cache.enabled:
+        return False
+    hit = False
+    stack = [df]
+    while stack:
+        cur = stack.pop()
+        if cur.data is not None or cur.transform is None:
+            continue
+        try:
+            data = result_cache.get(lineage_fingerprint(cur))
+        except Uncacheable:
+            data = None
+        if data is not None:
+            # every hit gets its own copy, a result changed in place by the user must not change the cached one
+            cur._data_ = block_manager.put(data.copy())
+            cur._fingerprint_ = cur._fingerprint_[:2] + (cur._stored_,)
+            cur.clear_lineage()
+            hit = hit or cur is df
+            continue
+        sources = cur.transform.sources()
+        stack.extend(sources if isinstance(sources, (list, tuple)) else [sources])
+    return hit
+
+
+def store(df, data):
+    """
+    cache the result of a dataframe fingerprinted by lookup
+    """
+    cached = getattr(df, '_fingerprint_', None)
+    if cached is None or not result_cache.enabled:
+        return
+    df._fingerprint_ = cached[:2] + (data,)
+    # the cache keeps a copy, the result handed to the user may be changed in place
+    data = data.get() if isinstance(data, Block) else data
+    result_cache.put(cached[0], data.copy(), cached[1] - {_LOCAL_DATA})
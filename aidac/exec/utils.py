@@ -1,5 +1,9 @@
 from __future__ import annotations
 
+import numbers
+
+from aidac.common.hist import mcv_key
+
 
 def estimate_join_card(card1, card2, null1, null2, distinct1, distinct2):
     """
@@ -18,10 +22,85 @@ def estimate_join_card(card1, card2, null1, null2, distinct1, distinct2):
     return card
 
 
+def estimate_join_selectivity(hist1, hist2):
+    """
+    selectivity of an equi join on one column pair, computed like the eqjoinsel of postgres:
+    the most common values of both sides are matched with their actual frequencies, the remaining values
+    are assumed to be uniformly distributed over the remaining distinct values.
+    Without most common values on both sides this is (1-null1)*(1-null2)*min(1/distinct1, 1/distinct2)
+    @param hist1: Histgram of the left join column
+    @param hist2: Histgram of the right join column
+    @return:
+    """
+    nd1, nd2 = max(hist1.n_distinct, 1), max(hist2.n_distinct, 1)
+    freqs1, freqs2 = hist1.common_freqs(), hist2.common_freqs()
+    if not freqs1 or not freqs2:
+        return (1-hist1.null_frac)*(1-hist2.null_frac)*min(1/nd1, 1/nd2)
+
+    match_freq = sum(f*freqs2[v] for v, f in freqs1.items() if v in freqs2)
+    nmatches = sum(1 for v in freqs1 if v in freqs2)
+    unmatched1 = sum(f for v, f in freqs1.items() if v not in freqs2)
+    unmatched2 = sum(f for v, f in freqs2.items() if v not in freqs1)
+    # frequency of the values that are not in the lists
+    other1 = max(1 - hist1.null_frac - sum(freqs1.values()), 0)
+    other2 = max(1 - hist2.null_frac - sum(freqs2.values()), 0)
+
+    def side_sel(unmatched, other, other_unmatched, other_rest, nd, nvalues):
+        sel = match_freq
+        if nd > nvalues:
+            sel += unmatched*other_rest/(nd-nvalues)
+        if nd > nmatches:
+            sel += other*(other_rest+other_unmatched)/(nd-nmatches)
+        return sel
+
+    sel1 = side_sel(unmatched1, other1, unmatched2, other2, nd2, len(freqs2))
+    sel2 = side_sel(unmatched2, other2, unmatched1, other1, nd1, len(freqs1))
+    return min(sel1, sel2, 1)
+
+
+def estimate_semi_join_selectivity(keys, hist):
+    """
+    fraction of the rows of a column that hold one of the given values: matched common values count with their
+    frequency, the other values with the average frequency of the values that are not common
+    @param keys: distinct values
+    @param hist: Histgram of the column
+    @return:
+    """
+    freqs = hist.common_freqs()
+    matched = [freqs[k] for k in map(mcv_key, keys) if k in freqs]
+    sel = sum(matched)
+    rest = len(keys) - len(matched)
+    nd_rest = hist.n_distinct - len(freqs)
+    if rest and nd_rest > 0:
+        other = max(1 - hist.null_frac - sum(freqs.values()), 0)
+        sel += min(rest, nd_rest)*other/nd_rest
+    return min(sel, 1)
+
+
+def sql_literal(val):
+    """
+    @return: the SQL text of a constant
+    """
+    if hasattr(val, 'item'):
+        # numpy scalar
+        val = val.item()
+    if isinstance(val, bool):
+        return 'TRUE' if val else 'FALSE'
+    if isinstance(val, numbers.Number):
+        return str(val)
+    return "'" + str(val).replace("'", "''") + "'"
+
+
 class Node:
-    def __init__(self, val='', children=None):
+    def __init__(self, val='', children=None, reduce=None):
+        """
+        @param val: job the node is executed on
+        @param children:
+        @param reduce: index of the child reduced by a semi join with the keys of the other child
+        """
         self.val = val
         self.children = children if children else [None, None]
+        self.reduce = reduce
 
     def add_child(self, child: Node, index=0):
         self.children[index] = child
@@ -4,14 +4,56 @@
 #include "numpy/arrayobject.h"
 
 static int init_numpy(void){
-    return _import_array(); 
+    return _import_array();
+}
+
+static PyObject* to_array(PyObject *col_list, int rows, PyObject *decimal_cls){
+    /* Convert one column list to a NumPy array.
+     *
+     *   The type is decided by the first non-null element. If the column
+     *   cannot be converted to that type (e.g. it contains nulls), an object
+     *   array is returned instead.
+    */
+    PyObject *arr = NULL;
+    PyObject *first_element = NULL;
+    int j;
+
+    for (j = 0; j < rows; j++){
+        PyObject *item = PyList_GET_ITEM(col_list, j);
+        if (item != Py_None){
+            first_element = item;
+            break;
+        }
+    }
+
+    if (first_element == NULL){
+        return PyArray_FROM_OTF(col_list, NPY_OBJECT, NPY_IN_ARRAY);
+    }
+
+    if (PyBool_Check(first_element)){
+        arr = PyArray_FROM_OTF(col_list, NPY_OBJECT, NPY_IN_ARRAY);
+    }else if (PyLong_Check(first_element)){
+        arr = PyArray_FROM_OTF(col_list, NPY_INT64, NPY_IN_ARRAY);
+    }else if (PyFloat_Check(first_element) || PyObject_IsInstance(first_element, decimal_cls)){
+        arr = PyArray_FROM_OTF(col_list, NPY_FLOAT64, NPY_IN_ARRAY);
+    }else{
+        arr = PyArray_FROM_OTF(col_list, NPY_OBJECT, NPY_IN_ARRAY);
+    }
+
+    if (arr == NULL){
+        // the column has values that do not fit the inferred type, keep them as objects
+        PyErr_Clear();
+        arr = PyArray_FROM_OTF(col_list, NPY_OBJECT, NPY_IN_ARRAY);
+    }
+    return arr;
 }
 
 static PyObject* convert_func(PyObject *self, PyObject *args){
     /* This function converts a row-based data set to a column-based one.
      *
      *   It takes 4 inputs:
-     *       1. A list of dictionaries that each one contains data for a row.
+     *       1. A list of rows. A row is either a dictionary keyed by column
+     *          name or a sequence (e.g. a tuple) ordered as the column names.
      *       2. A list of column names
      *       3. The number of rows
      *       4. The number of columns
@@ -23,83 +65,101 @@ static PyObject* convert_func(PyObject *self, PyObject *args){
     PyObject *arr;
     PyObject *col_lists;
 
-    // python decimal class
-    PyObject * decimal_mod = PyImport_ImportModule("decimal");
-    PyObject * decimal_cls = PyObject_GetAttrString(decimal_mod, "Decimal");
-
+    // verify if the input objects have correct types.
+    if (!PyArg_ParseTuple(args, "O!O!ii", &PyList_Type, &ob, &PyList_Type, &keys, &rows, &cols)) {
+        PyErr_SetString(PyExc_TypeError, "Input type error.");
+        return NULL;
+    }
+    if (PyList_GET_SIZE(ob) < rows || PyList_GET_SIZE(keys) < cols) {
+        PyErr_SetString(PyExc_ValueError, "Row or column number out of range.");
+        return NULL;
+    }
 
     // init numpy
     int not_init_numpy =  init_numpy();
 
     if(not_init_numpy){
         // numpy is not initiated
+        return NULL;
     }
 
-    // verify if the input objects have correct types.
-    if (!PyArg_ParseTuple(args, "O!O!ii", &PyList_Type, &ob, &PyList_Type, &keys, &rows, &cols)) {
-        PyErr_SetString(PyExc_TypeError, "Input type error.");
+    // python decimal class
+    PyObject * decimal_mod = PyImport_ImportModule("decimal");
+    if (decimal_mod == NULL){
+        return NULL;
+    }
+    PyObject * decimal_cls = PyObject_GetAttrString(decimal_mod, "Decimal");
+    Py_DECREF(decimal_mod);
+    if (decimal_cls == NULL){
         return NULL;
     }
 
     Py_INCREF(ob);
     Py_INCREF(keys);
     dict = PyDict_New();
-
-
-
-
-
-    col_lists = PyDict_New();
+    col_lists = PyList_New( (Py_ssize_t)cols );
 
     for (i = 0; i < cols; i++){
-        PyObject *col_list = PyList_New( (Py_ssize_t)rows );
-        PyObject *key = PyList_GetItem(keys, i);
-        PyDict_SetItem(col_lists, key, col_list);
+        PyList_SET_ITEM(col_lists, i, PyList_New( (Py_ssize_t)rows ));
     }
 
     for (j = 0; j < rows; j++){
-        PyObject *row = PyList_GetItem(ob, j);
-        for (i = 0; i < cols; i++){
-            PyObject *key = PyList_GetItem(keys, i);
-	    Py_INCREF(key);
-            PyObject *col_list = PyDict_GetItem(col_lists, key);
-            PyObject *data = PyDict_GetItem(row, key);
-	    Py_DECREF(key);
-            Py_INCREF(data);
-            PyList_SetItem(col_list, j, data);
+        PyObject *row = PyList_GET_ITEM(ob, j);
+        int is_dict = PyDict_Check(row);
+
+        if (!is_dict && !PySequence_Check(row)){
+            PyErr_SetString(PyExc_TypeError, "A row must be a dictionary or a sequence.");
+            goto error;
         }
-    }
+        for (i = 0; i < cols; i++){
+            PyObject *col_list = PyList_GET_ITEM(col_lists, i);
+            PyObject *data;
 
-    for (i = 0; i < cols; i++){
-        PyObject *key = PyList_GetItem(keys, i);
-        PyObject *col_list = PyDict_GetItem(col_lists, key);
-
-        if (!rows){
-            arr = PyArray_FROM_OTF(col_list, NPY_NOTYPE, NPY_IN_ARRAY);
-        }else{
-            PyObject *first_element = PyList_GetItem(col_list, 0);
-            if(PyLong_Check(first_element)){
-                arr = PyArray_FROM_OTF(col_list, NPY_INT64, NPY_IN_ARRAY);
-            }else if(PyFloat_Check(first_element) || PyObject_IsInstance(first_element,decimal_cls)){
-                arr = PyArray_FROM_OTF(col_list, NPY_FLOAT64, NPY_IN_ARRAY);
+            if (is_dict){
+                // borrowed reference
+                data = PyDict_GetItem(row, PyList_GET_ITEM(keys, i));
+                Py_XINCREF(data);
             }else{
-                arr = PyArray_FROM_OTF(col_list, NPY_OBJECT, NPY_IN_ARRAY);
+                // new reference
+                data = PySequence_GetItem(row, i);
+            }
+            if (data == NULL){
+                if (!PyErr_Occurred()){
+                    PyErr_SetString(PyExc_KeyError, "Column missing in row.");
+                }
+                goto error;
             }
+            // steals the reference
+            PyList_SET_ITEM(col_list, j, data);
         }
+    }
+
+    for (i = 0; i < cols; i++){
+        PyObject *key = PyList_GET_ITEM(keys, i);
+        PyObject *col_list = PyList_GET_ITEM(col_lists, i);
 
-        Py_DECREF(col_list);
+        arr = to_array(col_list, rows, decimal_cls);
+        if (arr == NULL){
+            goto error;
+        }
         PyDict_SetItem(dict, key, arr);
+        Py_DECREF(arr);
     }
-    
-       
 
     Py_DECREF(ob);
     Py_DECREF(keys);
     Py_DECREF(col_lists);
-    Py_DECREF(decimal_mod);
     Py_DECREF(decimal_cls);
 
     return dict;
+
+error:
+    Py_DECREF(ob);
+    Py_DECREF(keys);
+    Py_DECREF(col_lists);
+    Py_DECREF(decimal_cls);
+    Py_DECREF(dict);
+    return NULL;
 }
 
 static PyMethodDef convert_funcs[] = {
@@ -0,0 +1,48 @@
+import time
+from collections import namedtuple
+
+import numpy as np
+
+from aidac.data_source.ResultSet import ResultSet, _c_convert
+
+# mimic the cursor description, type_code is the postgres type oid
+Col = namedtuple('Col', ['name', 'type_code'])
+
+INT, FLOAT, VARCHAR = 23, 701, 1043
+
+
+def make_rows(nrows, ncols):
+    types = [INT, FLOAT, VARCHAR]
+    cols = [Col('c{}'.format(i), types[i % 3]) for i in range(ncols)]
+    columns = []
+    for col in cols:
+        if col.type_code == INT:
+            columns.append(np.random.randint(0, 1000, nrows).tolist())
+        elif col.type_code == FLOAT:
+            columns.append(np.random.rand(nrows).tolist())
+        else:
+            columns.append(['str{}'.format(x) for x in np.random.randint(0, 1000, nrows)])
+    return cols, list(zip(*columns))
+
+
+def measure(name, cols, rows, **kwargs):
+    rs = ResultSet(cols, rows, **kwargs)
+    start = time.time()
+    rs.get_result_table()
+    print('{:<30} {:.4f}s'.format(name, time.time()-start))
+
+
+def compare(title, nrows, ncols):
+    cols, rows = make_rows(nrows, ncols)
+    print('{} ({} rows x {} columns)'.format(title, nrows, ncols))
+    measure('row by row', cols, rows, columnar=False)
+    measure('columnar python', cols, rows, accelerated=False)
+    if _c_convert is not None:
+        measure('columnar C extension', cols, rows, accelerated=True)
+    else:
+        print('convert extension is not installed, see aidac/python_module/README.md')
+
+
+if __name__ == '__main__':
+    compare('wide result set', 10000, 300)
+    compare('tall result set', 1000000, 6)
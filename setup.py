@@ -8,4 +8,5 @@ setup(
    author_email='suri980702@gmail.com',
    packages=['aidac'],  #same as name
    install_requires=['wheel', 'numpy', 'pandas', 'psycopg'], #external packages as dependencies
+   extras_require={'arrow': ['pyarrow']},  # arrow backed results
 )
\ No newline at end of file
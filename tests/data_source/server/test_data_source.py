@@ -26,6 +26,11 @@ class DataSourceTest(unittest.TestCase):
         self.ds.import_table('temp1', cols, generator(df))
         print(self.ds.ls_tables())
 
+    def test_temp_table_listed(self):
+        cols = {'col1': Column('col1', np.float64)}
+        self.ds.create_table('temp2', cols)
+        self.assertIn('temp2', self.ds.ls_tables())
+
     def test_meta_data(self):
         meta = self.ds.table_columns('station')
         self.assertEqual(len(meta), 5)
@@ -0,0 +1,96 @@
+import datetime
+import struct
+import unittest
+from unittest.mock import patch
+
+import numpy as np
+import psycopg2 as p2
+
+from aidac.data_source.BinaryCopyReader import BinaryCopyReader, SIGNATURE
+
+
+def _stream(rows):
+    """
+    build a binary copy stream, each value is given as already encoded bytes or None for null
+    """
+    buf = SIGNATURE + struct.pack('>ii', 0, 0)
+    for row in rows:
+        buf += struct.pack('>h', len(row))
+        for val in row:
+            if val is None:
+                buf += struct.pack('>i', -1)
+            else:
+                buf += struct.pack('>i', len(val)) + val
+    return buf + struct.pack('>h', -1)
+
+
+def _numeric(ndigits, weight, sign, digits):
+    return struct.pack('>hhHH', ndigits, weight, sign, 0) + struct.pack('>{}h'.format(len(digits)), *digits)
+
+
+class BinaryCopyTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.int_col = p2.extensions.Column('id', 23)
+        self.float_col = p2.extensions.Column('val', 701)
+        self.str_col = p2.extensions.Column('name', 1043)
+
+    def test_fixed_layout(self):
+        rows = [(struct.pack('>i', i), struct.pack('>d', i / 2)) for i in range(5)]
+        table = BinaryCopyReader([self.int_col, self.float_col]).read(_stream(rows))
+        self.assertEqual(table['id'].dtype, np.int32)
+        np.testing.assert_array_equal(table['id'], np.arange(5))
+        np.testing.assert_array_equal(table['val'], np.arange(5) / 2)
+
+    def test_nulls_and_text(self):
+        rows = [(struct.pack('>i', 1), 'a'.encode()), (None, None), (struct.pack('>i', 3), 'ccé'.encode())]
+        table = BinaryCopyReader([self.int_col, self.str_col]).read(_stream(rows))
+        self.assertEqual(table['id'].dtype, np.float64)
+        self.assertTrue(np.isnan(table['id'][1]))
+        self.assertEqual(table['id'][2], 3)
+        self.assertEqual(list(table['name']), ['a', None, 'ccé'])
+
+    def test_streamed_in_blocks(self):
+        rows = [(None if i % 7 == 3 else struct.pack('>i', i), struct.pack('>d', i / 2)) for i in range(500)]
+        buf = _stream(rows)
+        reader = BinaryCopyReader([self.int_col, self.float_col])
+        with patch('aidac.data_source.BinaryCopyReader.CHUNK_BYTES', 100):
+            for pos in range(0, len(buf), 37):
+                if reader.feed(buf[pos:pos + 37]):
+                    reader.decode()
+                    self.assertLess(len(reader._pending), 100)
+        table = reader.finish()
+        expected = np.array([np.nan if i % 7 == 3 else i for i in range(500)])
+        np.testing.assert_array_equal(table['id'], expected)
+        np.testing.assert_array_equal(table['val'], np.arange(500) / 2)
+
+    def test_date_and_numeric(self):
+        date_col = p2.extensions.Column('d', 1082)
+        num_col = p2.extensions.Column('n', 1700)
+        rows = [(struct.pack('>i', 1), _numeric(2, 0, 0, [12, 3400])),
+                (struct.pack('>i', 0), _numeric(1, 1, 0x4000, [5])),
+                (None, _numeric(0, 0, 0, []))]
+        table = BinaryCopyReader([date_col, num_col]).read(_stream(rows))
+        self.assertEqual(list(table['d']), [datetime.date(2000, 1, 2), datetime.date(2000, 1, 1), None])
+        np.testing.assert_allclose(table['n'], [12.34, -50000, 0])
+
+    def test_numeric_exact(self):
+        # 3.14159 is 3 and 1415 9000 in base 10000, summing the scaled digits misses the nearest float
+        num_col = p2.extensions.Column('n', 1700)
+        table = BinaryCopyReader([num_col]).read(_stream([(_numeric(3, 0, 0, [3, 1415, 9000]),)]))
+        self.assertEqual(table['n'][0], 3.14159)
+
+    def test_numeric_special_values(self):
+        num_col = p2.extensions.Column('n', 1700)
+        rows = [(_numeric(0, 0, 0xD000, []),), (_numeric(0, 0, 0xF000, []),), (_numeric(0, 0, 0xC000, []),)]
+        table = BinaryCopyReader([num_col]).read(_stream(rows))
+        self.assertEqual(list(table['n'][:2]), [np.inf, -np.inf])
+        self.assertTrue(np.isnan(table['n'][2]))
+
+    def test_supported(self):
+        self.assertTrue(BinaryCopyReader.supported([self.int_col, p2.extensions.Column('n', 1700)]))
+        self.assertTrue(BinaryCopyReader.supported([self.int_col, self.str_col]))
+        self.assertFalse(BinaryCopyReader.supported([p2.extensions.Column('js', 114)]))
+
+
+if __name__ == '__main__':
+    unittest.main()
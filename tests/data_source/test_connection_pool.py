@@ -0,0 +1,148 @@
+import asyncio
+import threading
+import unittest
+
+from aidac.data_source.ConnectionPool import ConnectionPool, AsyncConnectionPool
+from aidac.data_source.exceptions import DataSourceException
+
+
+class FakeConnection:
+    def __init__(self):
+        self.closed = False
+        self.broken = False
+        self.pings = 0
+
+    def execute(self, qry):
+        if self.broken:
+            raise ConnectionError
+        self.pings += 1
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+
+class ConnectionPoolTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.opened = []
+
+    def _connect(self):
+        conn = FakeConnection()
+        self.opened.append(conn)
+        return conn
+
+    def test_min_size(self):
+        pool = ConnectionPool(self._connect, min_size=2, max_size=3)
+        self.assertEqual(len(self.opened), 2)
+        with pool.connection() as conn:
+            self.assertIn(conn, self.opened)
+        self.assertEqual(len(self.opened), 2)
+
+    def test_max_size(self):
+        pool = ConnectionPool(self._connect, min_size=0, max_size=2, timeout=0.1)
+        c1, c2 = pool.getconn(), pool.getconn()
+        self.assertIsNot(c1, c2)
+        self.assertRaises(DataSourceException, pool.getconn)
+        # a waiting request gets the connection that is returned
+        res = []
+        t = threading.Thread(target=lambda: res.append(pool.getconn()))
+        pool.timeout = 5
+        t.start()
+        pool.putconn(c1)
+        t.join()
+        self.assertIs(res[0], c1)
+
+    def test_connect_outside_lock(self):
+        pool = ConnectionPool(self._connect, min_size=0, max_size=2, timeout=0.1)
+        started, release = threading.Event(), threading.Event()
+
+        def slow_connect():
+            started.set()
+            release.wait(5)
+            return self._connect()
+        pool._connect = slow_connect
+        t = threading.Thread(target=pool.getconn)
+        t.start()
+        started.wait(5)
+        # a slow connect does not block the connections returned and handed out meanwhile
+        pool._connect = self._connect
+        conn = pool.getconn()
+        pool.putconn(conn)
+        self.assertIs(pool.getconn(), conn)
+        self.assertRaises(DataSourceException, pool.getconn)
+        release.set()
+        t.join()
+        self.assertEqual(len(self.opened), 2)
+
+    def test_failed_connect_frees_slot(self):
+        pool = ConnectionPool(self._connect, min_size=0, max_size=1, timeout=0.1)
+        pool._connect = lambda: (_ for _ in ()).throw(ConnectionError)
+        self.assertRaises(ConnectionError, pool.getconn)
+        pool._connect = self._connect
+        self.assertIs(pool.getconn(), self.opened[0])
+
+    def test_broken_replaced(self):
+        pool = ConnectionPool(self._connect, min_size=1, max_size=1)
+        conn = pool.getconn()
+        conn.broken = True
+        pool.putconn(conn)
+        self.assertTrue(conn.closed)
+        self.assertIsNot(pool.getconn(), conn)
+
+    def test_health_check(self):
+        pool = ConnectionPool(self._connect, min_size=2, max_size=2, check_interval=None)
+        self.opened[0].broken = True
+        self.assertEqual(pool.check(), 1)
+        self.assertEqual(len(self.opened), 3)
+        self.assertEqual(self.opened[1].pings, 1)
+
+    def test_close(self):
+        pool = ConnectionPool(self._connect, min_size=2, max_size=2)
+        pool.close()
+        self.assertTrue(all(c.closed for c in self.opened))
+        self.assertRaises(DataSourceException, pool.getconn)
+
+
+class AsyncFakeConnection(FakeConnection):
+    async def execute(self, qry):
+        FakeConnection.execute(self, qry)
+
+    async def rollback(self):
+        pass
+
+    async def close(self):
+        self.closed = True
+
+
+class AsyncConnectionPoolTest(unittest.TestCase):
+    def test_max_size(self):
+        opened = []
+
+        async def connect():
+            opened.append(AsyncFakeConnection())
+            return opened[-1]
+
+        async def borrow(pool, active, peak):
+            async with pool.connection():
+                active[0] += 1
+                peak[0] = max(peak[0], active[0])
+                await asyncio.sleep(0.01)
+                active[0] -= 1
+
+        async def run():
+            pool = AsyncConnectionPool(connect, min_size=1, max_size=2)
+            await pool.open()
+            active, peak = [0], [0]
+            await asyncio.gather(*(borrow(pool, active, peak) for _ in range(6)))
+            await pool.close()
+            return peak[0]
+
+        self.assertEqual(asyncio.run(run()), 2)
+        self.assertEqual(len(opened), 2)
+        self.assertTrue(all(c.closed for c in opened))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,18 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from aidac.common.DataIterator import generator
+
+
+class DataIteratorTest(unittest.TestCase):
+    def test_rows_as_text(self):
+        df = pd.DataFrame({'a': [1, 2], 'b': [0.5, np.nan]})
+        self.assertEqual(list(generator(df)), [('1', '0.5'), ('2', None)])
+        df = pd.DataFrame({'a': np.array([1, 2], dtype=np.int32), 'b': ['x', None]})
+        self.assertEqual(list(generator(df)), [('1', 'x'), ('2', None)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,82 @@
+import asyncio
+import threading
+import unittest
+from unittest import mock
+
+from aidac.data_source.MetaCatalog import MetaCatalog, COLUMNS, ROW_COUNT, HIST, ESTIMATE
+
+
+class MetaCatalogTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.catalog = MetaCatalog(ttl=10)
+        self.calls = 0
+
+    def _loader(self, value):
+        def load():
+            self.calls += 1
+            return value
+        return load
+
+    def test_cached(self):
+        self.assertEqual(self.catalog.get(COLUMNS, 't1', self._loader(['a'])), ['a'])
+        self.assertEqual(self.catalog.get(COLUMNS, 't1', self._loader(['b'])), ['a'])
+        self.assertEqual(self.calls, 1)
+
+    def test_expired(self):
+        with mock.patch('aidac.data_source.MetaCatalog.time.time', return_value=100):
+            self.catalog.get(ROW_COUNT, 't1', self._loader(5))
+        with mock.patch('aidac.data_source.MetaCatalog.time.time', return_value=111):
+            self.assertEqual(self.catalog.get(ROW_COUNT, 't1', self._loader(6)), 6)
+        self.assertEqual(self.calls, 2)
+
+    def test_invalidate_table(self):
+        self.catalog.get(ROW_COUNT, 't1', self._loader(5))
+        self.catalog.get(ROW_COUNT, 't2', self._loader(7))
+        self.catalog.get(HIST, ('t1', 'a'), self._loader([]))
+        self.catalog.get(ESTIMATE, 'select * from t2', self._loader((1, 2)))
+        self.catalog.invalidate_table('t1')
+        self.calls = 0
+        self.catalog.get(ROW_COUNT, 't1', self._loader(5))
+        self.catalog.get(HIST, ('t1', 'a'), self._loader([]))
+        self.catalog.get(ESTIMATE, 'select * from t2', self._loader((1, 2)))
+        self.catalog.get(ROW_COUNT, 't2', self._loader(7))
+        self.assertEqual(self.calls, 3)
+
+    def test_concurrent_invalidation(self):
+        errors = []
+
+        def invalidate():
+            try:
+                for _ in range(200):
+                    self.catalog.invalidate_table('t1')
+            except Exception as e:
+                errors.append(e)
+
+        def load():
+            for i in range(200):
+                self.catalog.get(ROW_COUNT, 't{}'.format(i % 5), self._loader(i))
+                self.catalog.get(ESTIMATE, 'select {}'.format(i), self._loader(i))
+        threads = [threading.Thread(target=f) for f in (invalidate, invalidate, load, load)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(errors, [])
+
+    def test_async_load_invalidated(self):
+        async def load():
+            # the table changes while its metadata is loaded
+            self.catalog.invalidate_table('t1')
+            return 5
+        self.assertEqual(asyncio.run(self.catalog.get_async(ROW_COUNT, 't1', load)), 5)
+        self.assertEqual(self.catalog.get(ROW_COUNT, 't1', self._loader(6)), 6)
+
+    def test_local_data_source(self):
+        from aidac.data_source.DataSource import local_ds
+        self.assertIsInstance(local_ds.catalog, MetaCatalog)
+        self.assertEqual(local_ds.job_name, '_local_ds')
+        local_ds.invalidate_metadata()
+
+
+if __name__ == '__main__':
+    unittest.main()
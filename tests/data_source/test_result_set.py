@@ -1,8 +1,10 @@
 import unittest
 
+import numpy as np
 import psycopg2 as p2
 
-from aidac.data_source.ResultSet import ResultSet
+from aidac.common import arrow_utils
+from aidac.data_source.ResultSet import ResultSet, _c_convert
 
 
 class MyTestCase(unittest.TestCase):
@@ -16,6 +18,50 @@ class MyTestCase(unittest.TestCase):
         rs = ResultSet(self.cols, self.data)
         self.assertEqual(rs.get_result_ls(), ['val1', 'val2'])  # add assertion here
 
+    def test_columnar_result_table(self):
+        rs = ResultSet(self.cols, self.data)
+        table = rs.get_result_table()
+        self.assertEqual(list(table.keys()), ['col1', 'col2'])
+        self.assertEqual(table['col1'].dtype, object)
+        self.assertEqual(table['col2'].dtype, np.int32)
+        np.testing.assert_array_equal(table['col2'], [1, 2])
+
+    def test_columnar_nullable(self):
+        rs = ResultSet(self.cols, [('val1', None), (None, 2)])
+        table = rs.get_result_table()
+        self.assertIsNone(table['col1'][1])
+        self.assertEqual(table['col2'].dtype, np.float64)
+        self.assertTrue(np.isnan(table['col2'][0]))
+
+    def test_columnar_empty(self):
+        table = ResultSet(self.cols, []).get_result_table()
+        self.assertEqual(len(table['col2']), 0)
+        self.assertEqual(table['col2'].dtype, np.int32)
+
+    @unittest.skipIf(_c_convert is None, 'convert extension is not installed')
+    def test_accelerated_matches_python(self):
+        data = [('val1', None), (None, 2), ('val3', 3)]
+        fast = ResultSet(self.cols, data, accelerated=True).get_result_table()
+        slow = ResultSet(self.cols, data, accelerated=False).get_result_table()
+        for name in ['col1', 'col2']:
+            self.assertEqual(fast[name].dtype, slow[name].dtype)
+            np.testing.assert_array_equal(fast[name], slow[name])
+
+    def test_frame_without_arrow(self):
+        df = ResultSet(self.cols, self.data).to_frame()
+        self.assertEqual(list(df.columns), ['col1', 'col2'])
+        self.assertEqual(df['col2'].dtype, np.int32)
+
+    @unittest.skipIf(not arrow_utils.available(), 'pyarrow is not installed')
+    def test_arrow_frame(self):
+        rs = ResultSet(self.cols, [('val1', None), (None, 2)])
+        df = rs.to_frame(arrow=True)
+        self.assertEqual(str(df['col1'].dtype), 'string[pyarrow]')
+        self.assertEqual(df['col2'].isna().tolist(), [True, False])
+        self.assertTrue(arrow_utils.is_arrow_backed(df))
+        csv = b''.join(arrow_utils.csv_chunks(df, 1))
+        self.assertEqual(csv, b'"val1",\n,2\n')
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,52 @@
+import gc
+import os
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from aidac.common.block_manager import BlockManager
+
+
+class BlockManagerTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.dir = tempfile.TemporaryDirectory()
+        n = 200000
+        self.data = pd.DataFrame({'id': np.arange(n), 'val': np.arange(n) * 0.5,
+                                  'name': np.array(['x', 'y'] * (n // 2), dtype=object)})
+        self.size = int(self.data.memory_usage(index=True).sum())
+
+    def tearDown(self) -> None:
+        self.dir.cleanup()
+
+    def test_small_data_not_managed(self):
+        manager = BlockManager(self.size, self.dir.name)
+        small = self.data.head(10)
+        self.assertIs(manager.put(small), small)
+
+    def test_spill_and_read_back(self):
+        manager = BlockManager(self.size, self.dir.name)
+        first = manager.put(self.data)
+        second = manager.put(self.data.copy())
+        self.assertTrue(first.spilled)
+        self.assertFalse(second.spilled)
+        self.assertEqual(manager.used, second.nbytes)
+
+        back = first.get()
+        pd.testing.assert_frame_equal(back, self.data)
+        # numeric columns are read through the mapped files
+        self.assertIsInstance(back['id'].values.base, np.memmap)
+
+    def test_files_removed(self):
+        manager = BlockManager(0, self.dir.name)
+        block = manager.put(self.data)
+        manager.put(self.data.copy())
+        self.assertEqual(len(os.listdir(self.dir.name)), 1)
+        del block
+        gc.collect()
+        self.assertEqual(os.listdir(self.dir.name), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,6 +1,9 @@
 import unittest
 
+import pandas as pd
+
 from tests.dataframe.test_dataframe_base import TestDataFrameBase
+from aidac.common.hist import Histgram
 from aidac.exec.Executable import *
 
 class MyTestCase(TestDataFrameBase):
@@ -12,5 +15,33 @@ class MyTestCase(TestDataFrameBase):
         self.assertEqual(hist1.null_frac, hist2.null_frac)
 
 
+class JoinSelectivityTest(unittest.TestCase):
+    def test_local_hist(self):
+        hist = Histgram.from_values('t', pd.Series([3] * 6 + [1, 2, None, None]))
+        self.assertEqual(hist.n_distinct, 3)
+        self.assertAlmostEqual(hist.null_frac, 0.2)
+        self.assertEqual(hist.common_freqs(), {3.0: 0.6})
+
+    def test_uniform(self):
+        hist1 = Histgram('a', 0, 10)
+        hist2 = Histgram('b', 0.5, 100)
+        self.assertAlmostEqual(estimate_join_selectivity(hist1, hist2), 0.005)
+
+    def test_skewed(self):
+        # 90% of the left rows join with a value holding 1/7 of the right rows,
+        # the other left rows are spread over 99 values of which 6 are on the right
+        left = Histgram('a', 0, 100, [3], [0.9])
+        right = Histgram('b', 0, 7, ['3', '1', '2', '4', '5', '6', '0'], [1 / 7] * 7)
+        sel = estimate_join_selectivity(left, right)
+        self.assertAlmostEqual(sel, 0.9 / 7 + 0.1 * 6 / 99 / 7)
+        self.assertGreater(sel, 1 / 100)
+
+    def test_semi_join(self):
+        hist = Histgram('b', 0.1, 12, ['1', '2'], [0.5, 0.2])
+        # a common value with its frequency, the others share the remaining 20% over 10 values
+        self.assertAlmostEqual(estimate_semi_join_selectivity([1, 7, 8], hist), 0.5 + 2 * 0.02)
+        self.assertEqual(sql_literal("it's"), "'it''s'")
+
+
 if __name__ == '__main__':
     unittest.main()
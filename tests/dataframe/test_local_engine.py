@@ -0,0 +1,109 @@
+import unittest
+from unittest.mock import Mock
+
+import numpy as np
+import pandas as pd
+
+from aidac.common.column import Column
+from aidac.data_source.DataSource import local_ds
+from aidac.data_source.SQLiteEngine import supported, sqlite_engine
+from aidac.dataframe.frame import DataFrame
+from aidac.exec.Executable import Executable
+
+
+class LocalEngineTest(unittest.TestCase):
+    def remote_table(self, name, cols):
+        ds = Mock()
+        ds.job_name = 'mock job'
+        df = DataFrame(ds=ds, table_name=name, db_persistent=True)
+        df._columns_ = {c: Column(c, int, name, name, False) for c in cols}
+        return df
+
+    def setUp(self) -> None:
+        self.orders = self.remote_table('orders', ['oid', 'cust', 'price'])
+        self.lineitem = self.remote_table('lineitem', ['lid', 'qty'])
+
+    def tearDown(self) -> None:
+        local_ds.set_engine('pandas')
+
+    def materialize(self):
+        # the inputs are materialized after the lineage was built, e.g. fetched from their data sources
+        self.orders._data_ = pd.DataFrame({'oid': [1, 2, 3], 'cust': [1, 1, 2], 'price': [5.0, 20.0, 30.0]})
+        self.lineitem._data_ = pd.DataFrame({'lid': [1, 2, 2, 3], 'qty': [1, 2, 3, 4]})
+
+    def test_sqlite_matches_pandas(self):
+        res = self.orders.query('price > 10')[['oid', 'price']]
+        self.materialize()
+        ex = Executable(res)
+
+        local_ds.set_engine('sqlite')
+        self.assertIsNotNone(ex._run_local_sql(res))
+        fused = ex.run_local_operation(res)
+        local_ds.set_engine('pandas')
+        replayed = ex.run_local_operation(res)
+        pd.testing.assert_frame_equal(fused, replayed.reset_index(drop=True))
+
+    def test_join_replayed_with_pandas(self):
+        # both inputs have a price, pandas suffixes them while the generated SQL keeps one of them
+        other = self.remote_table('other', ['oid', 'price'])
+        res = self.orders.merge(other, on='oid', how='inner')
+        self.materialize()
+        other._data_ = pd.DataFrame({'oid': [3, 1, 2, 2], 'price': [1.0, 2.0, 3.0, 4.0]})
+        ex = Executable(res)
+
+        local_ds.set_engine('sqlite')
+        self.assertIsNone(ex._run_local_sql(res))
+        data = ex.run_local_operation(res)
+        expected = self.orders.data.merge(other.data, on='oid', how='inner')
+        self.assertEqual(list(data.columns), ['oid', 'cust', 'price_x', 'price_y'])
+        pd.testing.assert_frame_equal(data, expected)
+
+    def test_nulls_replayed_with_pandas(self):
+        res = self.orders.query('price != 2.0')
+        self.orders._data_ = pd.DataFrame({'oid': [1, 2, 3], 'cust': [1, 1, 2], 'price': [1.0, 2.0, np.nan]})
+        ex = Executable(res)
+
+        local_ds.set_engine('sqlite')
+        # a null never matches in SQL, while pandas keeps it for <>
+        self.assertIsNone(ex._run_local_sql(res))
+        pd.testing.assert_frame_equal(ex.run_local_operation(res), ex.perform_local_operation(res))
+        self.assertEqual(len(ex.run_local_operation(res)), 2)
+
+    def test_tables_loaded_once(self):
+        res = self.orders.query('price > 10')
+        self.materialize()
+        ex = Executable(res)
+        local_ds.set_engine('sqlite')
+        first = ex.run_local_operation(res)
+        loaded = sqlite_engine._loaded['orders']
+        pd.testing.assert_frame_equal(ex.run_local_operation(res), first)
+        self.assertIs(sqlite_engine._loaded['orders'], loaded)
+
+    def test_fused_matches_pandas(self):
+        jn = self.orders.merge(self.lineitem, left_on='oid', right_on='lid', how='inner')
+        scaled = (jn[['qty', 'price']] * 2) > 30
+        selected = jn[(jn['qty'] > 1) & (jn['price'] < 30)][['oid', 'qty']].head(2)
+        self.materialize()
+        ex = Executable(scaled)
+
+        local_ds.set_engine('fused')
+        fused = ex.run_local_operation(scaled)
+        local_ds.set_engine('pandas')
+        pd.testing.assert_frame_equal(fused, ex.run_local_operation(scaled))
+
+        local_ds.set_engine('fused')
+        data = jn.data if jn.data is not None else ex.perform_local_operation(jn)
+        expected = data[(data['qty'] > 1) & (data['price'] < 30)][['oid', 'qty']].head(2)
+        pd.testing.assert_frame_equal(ex.run_local_operation(selected), expected)
+
+    def test_unsupported_input(self):
+        self.assertTrue(supported(pd.DataFrame({'a': [1, 2], 'b': ['x', None]})))
+        self.assertFalse(supported(pd.DataFrame({'a': pd.to_datetime(['2020-01-01'])})))
+
+    def test_unknown_engine(self):
+        with self.assertRaises(ValueError):
+            local_ds.set_engine('duckdb')
+
+
+if __name__ == '__main__':
+    unittest.main()
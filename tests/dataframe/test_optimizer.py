@@ -0,0 +1,168 @@
+import unittest
+from unittest.mock import Mock
+
+import numpy as np
+
+import aidac
+from aidac.common.column import Column
+from aidac.dataframe.frame import DataFrame
+from aidac.dataframe.optimizer import push_down_filters, prune_columns, reorder_joins, \
+    push_down_partial_aggregates, share_common_inputs, push_down_limits
+from aidac.dataframe.transforms import SQLJoinTransform, SQLProjectionTransform, SQLGroupedAggTransform
+from aidac.exec.Executable import row_limit
+
+
+class OptimizerTest(unittest.TestCase):
+    def remote_table(self, name, cols, job='mock job', rows=1000):
+        ds = Mock()
+        ds.job_name = job
+        ds.get_estimation.return_value = (rows, 8 * len(cols))
+        ds.get_hist.return_value = None
+        df = DataFrame(ds=ds, table_name=name, db_persistent=True)
+        df._columns_ = {c: Column(c, int, name, name, False) for c in cols}
+        return df
+
+    def setUp(self) -> None:
+        self.orders = self.remote_table('orders', ['oid', 'cust', 'price'])
+        self.lineitem = self.remote_table('lineitem', ['lid', 'qty'])
+
+    def test_filter_through_join(self):
+        jn = self.orders.merge(self.lineitem, left_on='oid', right_on='lid', how='inner')
+        flt = jn[(jn['price'] > 10) & (jn['price'] < 100)]
+        flt = flt[flt['qty'] == 3]
+        push_down_filters(flt)
+
+        self.assertIsInstance(flt.transform, SQLJoinTransform)
+        left, right = flt.transform.sources()
+        self.assertIn('WHERE (price > 10) AND (price < 100)', left.genSQL)
+        self.assertIn('WHERE qty = 3', right.genSQL)
+        self.assertEqual(list(flt.columns), ['oid', 'cust', 'price', 'lid', 'qty'])
+
+    def test_outer_side_kept(self):
+        jn = self.orders.merge(self.lineitem, left_on='oid', right_on='lid', how='left')
+        flt = jn[jn['qty'] == 3]
+        push_down_filters(flt)
+        # a filter on the null supplying side must stay above the join
+        self.assertIsInstance(flt.transform.sources()[0].transform, SQLJoinTransform)
+
+    def test_query_through_projection(self):
+        proj = self.orders[['oid', 'price']]
+        q = proj.query('price > 10')
+        push_down_filters(q)
+        self.assertIsInstance(q.transform, SQLProjectionTransform)
+        self.assertEqual(q.genSQL, 'SELECT oid AS oid, price AS price FROM orders WHERE price > 10')
+
+    def test_local_side_filtered_before_transfer(self):
+        local = aidac.from_dict({'lid': np.arange(10), 'qty': np.arange(10) % 3})._tail_frame
+        jn = self.orders.merge(local, left_on='oid', right_on='lid', how='inner')
+        flt = jn[jn['qty'] == 1]
+        push_down_filters(flt)
+        right = flt.transform.sources()[1]
+        self.assertIsNotNone(right.data)
+        self.assertEqual(list(right.data['lid']), [1, 4, 7])
+
+    def test_prune_join_inputs(self):
+        jn = self.orders.merge(self.lineitem, left_on='oid', right_on='lid', how='inner')
+        jn = jn.query('qty > 1')
+        proj = jn[['oid', 'price']]
+        prune_columns(proj)
+
+        query = proj.transform.sources()
+        left, right = query.transform.sources().transform.sources()
+        self.assertEqual(list(left.columns), ['oid', 'price'])
+        self.assertEqual(list(right.columns), ['lid', 'qty'])
+        self.assertEqual(left.genSQL, 'SELECT oid AS oid, price AS price FROM orders')
+        self.assertEqual(list(proj.columns), ['oid', 'price'])
+
+    def test_prune_local_input(self):
+        local = aidac.from_dict({'lid': np.arange(4), 'qty': np.arange(4), 'note': np.arange(4)})._tail_frame
+        jn = self.orders.merge(local, left_on='oid', right_on='lid', how='inner')
+        proj = jn[['cust', 'lid']]
+        prune_columns(proj)
+        left, right = proj.transform.sources().transform.sources()
+        # the local input is narrowed before it is transferred
+        self.assertEqual(list(right.data.columns), ['lid'])
+        self.assertEqual(list(left.columns), ['oid', 'cust'])
+
+    def test_prune_keeps_shared_names(self):
+        other = self.remote_table('other', ['lid', 'price'])
+        jn = self.orders.merge(other, left_on='oid', right_on='lid', how='inner')
+        proj = jn[['oid']]
+        prune_columns(proj)
+        self.assertIs(proj.transform.sources(), jn)
+
+    def test_small_local_table_joined_first(self):
+        orders = self.remote_table('orders', ['oid', 'cust', 'price'], rows=10000)
+        lineitem = self.remote_table('lineitem', ['lid', 'qty'], rows=40000)
+        local = aidac.from_dict({'cid': np.arange(5), 'name': np.arange(5)})._tail_frame
+        jn = orders.merge(lineitem, left_on='oid', right_on='lid', how='inner')
+        jn = jn.merge(local, left_on='cust', right_on='cid', how='inner')
+        cols = list(jn.columns)
+        reorder_joins(jn)
+
+        self.assertIsInstance(jn.transform, SQLProjectionTransform)
+        self.assertEqual(list(jn.columns), cols)
+        top = jn.transform.sources().transform
+        inner = [s for s in top.sources() if isinstance(s.transform, SQLJoinTransform)]
+        self.assertEqual(len(inner), 1)
+        self.assertEqual({s.table_name for s in inner[0].transform.sources()}, {'orders', local.table_name})
+
+    def test_written_order_kept(self):
+        orders = self.remote_table('orders', ['oid', 'cust', 'price'], rows=10000)
+        lineitem = self.remote_table('lineitem', ['lid', 'qty'], rows=40000)
+        customer = self.remote_table('customer', ['cid', 'name'], rows=100)
+        jn = orders.merge(customer, left_on='cust', right_on='cid', how='inner')
+        jn = jn.merge(lineitem, left_on='oid', right_on='lid', how='inner')
+        trans = jn.transform
+        reorder_joins(jn)
+        self.assertIs(jn.transform, trans)
+
+    def test_partial_aggregate_below_join(self):
+        lineitem = self.remote_table('lineitem', ['lid', 'qty'], job='other', rows=40000)
+        lineitem.data_source.get_hist.return_value = ('lineitem', 0, 100, None, None)
+        jn = self.orders.merge(lineitem, left_on='oid', right_on='lid', how='inner')
+        agg = jn.groupby('cust').agg({'qty': 'sum', 'price': 'max'})
+        push_down_partial_aggregates(agg)
+
+        self.assertIsInstance(agg.transform, SQLGroupedAggTransform)
+        partial = agg.transform.sources().transform.sources()[1]
+        self.assertEqual(partial.genSQL, 'SELECT lid AS lid, sum(qty) AS aidac_sum_qty, count(*) AS aidac_rows '
+                                         'FROM lineitem GROUP BY lid')
+        self.assertEqual(list(agg.columns), ['qty', 'price', 'cust'])
+        self.assertIn('sum({0}.aidac_sum_qty) AS qty, max(orders.price) AS price'.format(partial.table_name),
+                      agg.genSQL)
+
+    def test_common_inputs_shared(self):
+        customer = self.remote_table('customer', ['cid', 'name'])
+        left = self.orders.merge(customer[['cid']], left_on='cust', right_on='cid', how='inner')
+        right = self.lineitem.merge(customer[['cid']], left_on='lid', right_on='cid', how='inner')
+        jn = left.merge(right, left_on='oid', right_on='lid', how='inner', suffixes=('_l', '_r'))
+        share_common_inputs(jn)
+
+        first = left.transform.sources()[1]
+        self.assertIs(right.transform.sources()[1], first)
+        self.assertIn('ON lineitem.lid = {}.cid'.format(first.table_name), right.genSQL)
+
+    def test_top_n_below_outer_join(self):
+        lineitem = self.remote_table('lineitem', ['lid', 'qty'], job='other')
+        jn = self.orders.merge(lineitem, left_on='oid', right_on='lid', how='left')
+        top = jn.sort_values('price', ascending=False)[['oid', 'price', 'qty']].head(10)
+        push_down_limits(top)
+
+        join = top.transform.sources().transform.sources().transform.sources()
+        self.assertIsInstance(join.transform, SQLJoinTransform)
+        left, right = join.transform.sources()
+        self.assertEqual(left.genSQL, 'SELECT * FROM orders ORDER BY price desc LIMIT 10')
+        self.assertIs(right, lineitem)
+        self.assertEqual(row_limit(top), 10)
+        self.assertIsNone(row_limit(join))
+
+        # the null supplying side of the join is not limited
+        jn = self.orders.merge(lineitem, left_on='oid', right_on='lid', how='left')
+        top = jn.sort_values('qty').head(10)
+        push_down_limits(top)
+        self.assertIs(top.transform.sources().transform.sources(), jn)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+import threading
+import time
+import unittest
+
+from aidac.exec.Executable import RootExecutable
+from aidac.exec.ParallelExecutor import ParallelExecutor
+
+
+class SleepNode:
+    def __init__(self, name, job, prereqs=(), seconds=0.2, log=None):
+        self.name = name
+        self.planned_job = job
+        self.prereqs = list(prereqs)
+        self.seconds = seconds
+        self.log = log
+
+    def is_materialized(self):
+        return False
+
+    def job(self):
+        return self.planned_job
+
+    def process_node(self, chunksize=None):
+        self.log.append(('start', self.name, time.time()))
+        time.sleep(self.seconds)
+        self.log.append(('end', self.name, time.time()))
+        return self.name
+
+
+class ParallelExecutorTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.log = []
+
+    def _tree(self, job1, job2):
+        n1 = SleepNode('n1', job1, log=self.log)
+        n2 = SleepNode('n2', job2, log=self.log)
+        final = SleepNode('final', job1, [n1, n2], seconds=0, log=self.log)
+        root = RootExecutable()
+        root.add_prereq(final)
+        return root
+
+    def _times(self, name):
+        return [t for ev, n, t in self.log if n == name]
+
+    def test_independent_branches(self):
+        executor = ParallelExecutor(source_limits={'a': 2, 'b': 2})
+        start = time.time()
+        self.assertEqual(executor.run(self._tree('a', 'b')), 'final')
+        self.assertLess(time.time() - start, 0.35)
+        # the final node only starts after both branches are done
+        self.assertGreaterEqual(self._times('final')[0], max(self._times('n1')[1], self._times('n2')[1]))
+        self.assertEqual(len(executor.timings), 3)
+
+    def test_source_limit(self):
+        executor = ParallelExecutor(source_limits={'a': 1})
+        executor.run(self._tree('a', 'a'))
+        n1, n2 = self._times('n1'), self._times('n2')
+        # the two branches on the same source must not overlap
+        self.assertTrue(n1[1] <= n2[0] or n2[1] <= n1[0])
+
+    def test_error(self):
+        class FailNode(SleepNode):
+            def process_node(self, chunksize=None):
+                raise ValueError('failed')
+        root = RootExecutable()
+        root.add_prereq(SleepNode('final', 'a', [FailNode('f', 'a', log=self.log)], log=self.log))
+        self.assertRaises(ValueError, ParallelExecutor(source_limits={'a': 1}).run, root)
+        self.assertEqual(self.log, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
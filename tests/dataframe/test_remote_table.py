@@ -41,19 +41,17 @@ class MyTestCase(unittest.TestCase):
         self.assertTrue(isinstance(proj1.transform, SQLProjectionTransform))
         sql1 = proj1.transform.genSQL
         self.assertEqual(sql1,
-                         'SELECT couple_id AS couple_id, hcardid AS hcardid, sid AS sid FROM (SELECT * FROM couple) couple')
+                         'SELECT couple_id AS couple_id, hcardid AS hcardid, sid AS sid FROM couple')
 
         proj2 = proj1['sid']
         sql2 = proj2.transform.genSQL
-        expected = 'SELECT sid AS sid FROM ({})'.format(sql1)
-        self.assertRegex(sql2, re.escape(expected))
+        self.assertEqual(sql2, 'SELECT sid AS sid FROM couple')
 
     def test_numerical_operation(self):
         ad = self.midwife_['prac_id'] + 1
         mul = self.midwife_['prac_id'] * ad
         sql = mul.genSQL
-        self.assertRegex(sql, r'SELECT \(\(1\+prac_id\)\*prac_id\) AS prac_id FROM \(SELECT prac_id AS prac_id FROM'
-                    ' \(SELECT \* FROM midwife\) midwife\) SQLProjectionTransform\d')
+        self.assertEqual(sql, 'SELECT ((1+prac_id)*prac_id) AS prac_id FROM midwife')
 
     def test_set_item1(self):
         self.midwife_['new_id'] = (self.midwife_['prac_id'] + 1 ) * self.midwife_['prac_id']
@@ -61,7 +59,7 @@ class MyTestCase(unittest.TestCase):
         sql = self.midwife_.genSQL
         self.assertEqual(sql,     'SELECT prac_id AS prac_id, email AS email, name AS name, '
                                 'phone AS phone, iid AS iid, (prac_id*(1+prac_id)) AS new_id '
-                                  'FROM (SELECT * FROM midwife) midwife')
+                                  'FROM midwife')
 
         self.assertEqual(len(self.midwife_._frame_stubs), 2)
         self.assertTrue(self.midwife_._frame_stubs[0].transform is None)
@@ -73,7 +71,7 @@ class MyTestCase(unittest.TestCase):
         sql = self.midwife_.genSQL
         self.assertEqual(sql,     'SELECT prac_id AS prac_id, email AS email, name AS name, '
                                 'phone AS phone, iid AS iid, 1 AS const_id1, \'str1\' AS const_id2 '
-                                  'FROM (SELECT * FROM midwife) midwife')
+                                  'FROM midwife')
         self.midwife_.materialize()
 
     def test_remote_join(self):
@@ -82,7 +80,7 @@ class MyTestCase(unittest.TestCase):
         self.assertEqual(sql,
                          'SELECT users.userid AS userid_x, users.uname AS uname, users.email AS email, users.dateofbirth AS dateofbirth, '
                          'review.userid AS userid_y, review.movid AS movid, review.reviewdate AS reviewdate, review.rating AS rating, review.reviewtxt AS reviewtxt '
-                         'FROM (SELECT * FROM users) users INNER JOIN (SELECT * FROM review) review ON users.userid = review.userid')
+                         'FROM users INNER JOIN review ON users.userid = review.userid')
         jn.materialize()
         dd = jn._data_
         print(dd)
@@ -99,19 +97,19 @@ class MyTestCase(unittest.TestCase):
 
         self.assertTrue(isinstance(group_by.transform, SQLGroupByTransform))
         sql = group_by.transform.genSQL
-        self.assertEqual(sql, 'SELECT sid AS sid FROM (SELECT * FROM couple) couple GROUP BY sid ORDER BY sid')
+        self.assertEqual(sql, 'SELECT sid AS sid FROM couple GROUP BY sid ORDER BY sid')
         gb = self.midwife_.groupby(["iid", "email"])
         self.assertTrue(isinstance(gb.transform, SQLGroupByTransform))
         sql = gb.transform.genSQL
         self.assertEqual(sql,
-                         "SELECT email AS email, iid AS iid FROM (SELECT * FROM midwife) midwife GROUP BY iid, email ORDER BY iid, email")
+                         "SELECT email AS email, iid AS iid FROM midwife GROUP BY iid, email ORDER BY iid, email")
 
     def test_fillna(self):
         fillna = self.coup_.fillna()
         self.assertTrue(isinstance(fillna.transform, SQLFillNA))
         sql = fillna.transform.genSQL
         self.assertEqual(sql,
-                         "SELECT  coalesce( couple_id,'0')  AS couple_id, coalesce( hcardid,'0')  AS hcardid, coalesce( sid,'0')  AS sid FROM (SELECT * FROM couple) couple")
+                         "SELECT coalesce(couple_id, '0') AS couple_id, coalesce(hcardid, '0') AS hcardid, coalesce(sid, '0') AS sid FROM couple")
         #
 
     def test_dropduplicate(self):
@@ -119,7 +117,7 @@ class MyTestCase(unittest.TestCase):
         self.assertTrue(isinstance(dd.transform, SQLDropduplicateTransform))
         print(f"current transform is {dd.transform}")
         sql = dd.transform.genSQL
-        self.assertEqual(sql, 'SELECT DISTINCT couple_id, hcardid, sid FROM (SELECT * FROM couple) couple')
+        self.assertEqual(sql, 'SELECT DISTINCT couple_id AS couple_id, hcardid AS hcardid, sid AS sid FROM couple')
 
     def test_drop_na(self):
         dn = self.coup_.dropna()
@@ -162,7 +160,7 @@ class MyTestCase(unittest.TestCase):
                               " CASE WHEN 1 <> 1 THEN TRUE ELSE FALSE END AS email, CASE WHEN "
                               "1 <> 1 THEN TRUE ELSE FALSE END AS name, CASE WHEN phone = 6 THEN"
                               " TRUE ELSE FALSE END AS phone, CASE WHEN iid = 6 THEN TRUE ELSE F"
-                              "ALSE END AS iid FROM (SELECT * FROM midwife) midwife")
+                              "ALSE END AS iid FROM midwife")
 
     def test_ne(self):
         ne = self.midwife_ != 6
@@ -172,7 +170,7 @@ class MyTestCase(unittest.TestCase):
                               " CASE WHEN 1 = 1 THEN TRUE ELSE FALSE END AS email, CASE WHEN 1"
                               " = 1 THEN TRUE ELSE FALSE END AS name, CASE WHEN phone <> 6 THEN "
                               "TRUE ELSE FALSE END AS phone, CASE WHEN iid <> 6 THEN TRUE ELSE FA"
-                              "LSE END AS iid FROM (SELECT * FROM midwife) midwife")
+                              "LSE END AS iid FROM midwife")
 
     def test_gt(self):
         gt = self.midwife_ > 6
@@ -182,7 +180,7 @@ class MyTestCase(unittest.TestCase):
                               " CASE WHEN 1 <> 1 THEN TRUE ELSE FALSE END AS email, CASE WHEN 1"
                               " <> 1 THEN TRUE ELSE FALSE END AS name, CASE WHEN phone > 6 THEN "
                               "TRUE ELSE FALSE END AS phone, CASE WHEN iid > 6 THEN TRUE ELSE FA"
-                              "LSE END AS iid FROM (SELECT * FROM midwife) midwife")
+                              "LSE END AS iid FROM midwife")
 
     def test_ge(self):
         ge = self.midwife_ >= 6
@@ -192,7 +190,7 @@ class MyTestCase(unittest.TestCase):
                               " CASE WHEN 1 <> 1 THEN TRUE ELSE FALSE END AS email, CASE WHEN 1"
                               " <> 1 THEN TRUE ELSE FALSE END AS name, CASE WHEN phone >= 6 THEN "
                               "TRUE ELSE FALSE END AS phone, CASE WHEN iid >= 6 THEN TRUE ELSE FA"
-                              "LSE END AS iid FROM (SELECT * FROM midwife) midwife")
+                              "LSE END AS iid FROM midwife")
 
     def test_le(self):
         le = self.midwife_ <= 6
@@ -202,13 +200,13 @@ class MyTestCase(unittest.TestCase):
                               " CASE WHEN 1 <> 1 THEN TRUE ELSE FALSE END AS email, CASE WHEN 1"
                               " <> 1 THEN TRUE ELSE FALSE END AS name, CASE WHEN phone <= 6 THEN "
                               "TRUE ELSE FALSE END AS phone, CASE WHEN iid <= 6 THEN TRUE ELSE FA"
-                              "LSE END AS iid FROM (SELECT * FROM midwife) midwife")
+                              "LSE END AS iid FROM midwife")
 
     def test_agg(self):
         ag = self.midwife_.agg("count", ["name", "iid"])
         self.assertTrue(isinstance(ag.transform, SQLAGG_Transform))
         sql = ag.transform.genSQL
-        self.assertEqual(sql, "SELECT count(name) AS count_name, count(iid) AS count_iid FROM (SELECT * FROM midwife) midwife")
+        self.assertEqual(sql, "SELECT count(name) AS count_name, count(iid) AS count_iid FROM midwife")
 
     def test_lt(self):
         ge = self.midwife_ < 6
@@ -218,7 +216,7 @@ class MyTestCase(unittest.TestCase):
                               " CASE WHEN 1 <> 1 THEN TRUE ELSE FALSE END AS email, CASE WHEN 1"
                               " <> 1 THEN TRUE ELSE FALSE END AS name, CASE WHEN phone < 6 THEN "
                               "TRUE ELSE FALSE END AS phone, CASE WHEN iid < 6 THEN TRUE ELSE FA"
-                              "LSE END AS iid FROM (SELECT * FROM midwife) midwife")
+                              "LSE END AS iid FROM midwife")
 
     def test_group_agg(self):
         gag = self.midwife_.groupby("iid").agg(func="count")
@@ -227,7 +225,7 @@ class MyTestCase(unittest.TestCase):
         sql = gag.transform.genSQL
         self.assertEqual(sql, "SELECT count(prac_id) AS prac_id, count(email) AS email,"
                               " count(name) AS name, count(phone) AS phone, count(iid) "
-                              "AS iid FROM (SELECT * FROM midwife)midwife GROUP BY iid ORDER "
+                              "AS iid FROM midwife GROUP BY iid ORDER "
                               "BY iid")
         #
         gag2 = self.midwife_.groupby("iid").agg(collist=
@@ -237,7 +235,7 @@ class MyTestCase(unittest.TestCase):
         sql2 = gag2.transform.genSQL
         self.assertEqual(sql2,"SELECT count(prac_id) AS count_prac_id, max(prac_id) AS max_prac_id,"
                               " count(email) AS email, count(iid) AS count_iid, avg(iid) AS avg_iid, "
-                              "iid AS iid FROM (SELECT * FROM midwife)midwife GROUP BY iid ORDER BY iid")
+                              "iid AS iid FROM midwife GROUP BY iid ORDER BY iid")
 
         gag2 = self.midwife_.groupby("iid").agg(collist=
                                                 {"prac_id": ["count", "max"],
@@ -264,8 +262,7 @@ class MyTestCase(unittest.TestCase):
         self.assertEqual(sql, "SELECT CASE WHEN 1 <> 1 THEN TRUE ELSE FALSE END AS session_id, "
                               "CASE WHEN date > '1999-01-01' THEN TRUE ELSE FALSE END AS date, "
                               "CASE WHEN 1 <> 1 THEN TRUE ELSE FALSE END AS language, CASE WHEN"
-                              " 1 <> 1 THEN TRUE ELSE FALSE END AS prac_id FROM (SELECT * FROM "
-                              "info_session) info_session")
+                              " 1 <> 1 THEN TRUE ELSE FALSE END AS prac_id FROM info_session")
 
     def test_yrs(self):
         is_ = self.info_session_ > datetime.date(1999, 1, 1).year
@@ -279,7 +276,7 @@ class MyTestCase(unittest.TestCase):
 
         mw_sql = mw_series.genSQL
 
-        self.assertEqual(mw_sql, "SELECT email AS email FROM (SELECT * FROM midwife) midwife")
+        self.assertEqual(mw_sql, "SELECT email AS email FROM midwife")
 
         mw_contains_1 = mw_series.contains("w", regex=True, case=True)
         mw_contains_2 = mw_series.contains("WFW", regex=True, case=False)
@@ -291,18 +288,13 @@ class MyTestCase(unittest.TestCase):
         mw_sql3 = mw_contains_3.genSQL
         mw_sql4 = mw_contains_4.genSQL
 
-        self.assertEqual(mw_sql1, "SELECT * FROM (SELECT email AS email FROM (SELECT * FROM midwife"
-                                  ") midwife) SQLProjectionTransform8 WHERE email LIKE '%w%'")
+        self.assertEqual(mw_sql1, "SELECT email AS email FROM midwife WHERE email LIKE '%w%'")
 
-        self.assertEqual(mw_sql2, "SELECT * FROM (SELECT email AS email FROM (SELECT * FROM midwife"
-                                  ") midwife) SQLProjectionTransform8 WHERE LOWER(email) LIKE '%wfw"
-                                  "%'")
+        self.assertEqual(mw_sql2, "SELECT email AS email FROM midwife WHERE LOWER(email) LIKE '%wfw%'")
 
-        self.assertEqual(mw_sql3, "SELECT * FROM (SELECT email AS email FROM (SELECT * FROM midwife"
-                                  ") midwife) SQLProjectionTransform8 WHERE email LIKE '%WW%'")
+        self.assertEqual(mw_sql3, "SELECT email AS email FROM midwife WHERE email LIKE '%WW%'")
 
-        self.assertEqual(mw_sql4, "SELECT * FROM (SELECT email AS email FROM (SELECT * FROM midwife"
-                                  ") midwife) SQLProjectionTransform8 WHERE LOWER(email) LIKE '%ewfw%'")
+        self.assertEqual(mw_sql4, "SELECT email AS email FROM midwife WHERE LOWER(email) LIKE '%ewfw%'")
 
 
 
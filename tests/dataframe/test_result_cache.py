@@ -0,0 +1,101 @@
+import unittest
+from unittest.mock import Mock, patch
+
+import pandas as pd
+
+from aidac.common.column import Column
+from aidac.dataframe.frame import DataFrame
+from aidac.exec import ResultCache as cache_module
+from aidac.exec.ResultCache import ResultCache, Uncacheable, lineage_fingerprint
+
+
+class ResultCacheTest(unittest.TestCase):
+    def remote_table(self, name, cols, job='mock job'):
+        ds = Mock()
+        ds.job_name = job
+        df = DataFrame(ds=ds, table_name=name, db_persistent=True)
+        df._columns_ = {c: Column(c, int, name, name, False) for c in cols}
+        return df
+
+    def setUp(self) -> None:
+        self.orders = self.remote_table('orders', ['oid', 'cust', 'price'])
+        self.lineitem = self.remote_table('lineitem', ['lid', 'qty'])
+
+    def query(self, price):
+        jn = self.orders.merge(self.lineitem, left_on='oid', right_on='lid', how='inner')
+        return jn[jn['price'] > price][['oid', 'qty']]
+
+    def test_fingerprint(self):
+        tables = set()
+        fp = lineage_fingerprint(self.query(10), tables)
+        self.assertEqual(fp, lineage_fingerprint(self.query(10)))
+        self.assertNotEqual(fp, lineage_fingerprint(self.query(20)))
+        self.assertEqual(tables, {('mock job', 'orders'), ('mock job', 'lineitem')})
+
+    def test_uncacheable(self):
+        jn = self.orders.merge(self.lineitem, left_on='oid', right_on='lid', how='inner')
+        with self.assertRaises(Uncacheable):
+            lineage_fingerprint(jn.apply(lambda x: x))
+
+    def test_lru_eviction(self):
+        data = pd.DataFrame({'a': range(100)})
+        size = data.memory_usage(index=True).sum()
+        cache = ResultCache(max_bytes=2 * size)
+        cache.put('k1', data, [('j', 't1')])
+        cache.put('k2', data, [('j', 't2')])
+        cache.get('k1')
+        cache.put('k3', data, [('j', 't3')])
+        self.assertIsNotNone(cache.get('k1'))
+        self.assertIsNone(cache.get('k2'))
+        self.assertIsNotNone(cache.get('k3'))
+
+    def test_invalidate_table(self):
+        data = pd.DataFrame({'a': range(10)})
+        cache = ResultCache()
+        cache.put('k1', data, [('j', 't1'), ('j', 't2')])
+        cache.put('k2', data, [('j', 't3')])
+        cache.invalidate_table('j', 't2')
+        self.assertIsNone(cache.get('k1'))
+        self.assertIsNotNone(cache.get('k2'))
+        cache.invalidate_job('j')
+        self.assertEqual(len(cache), 0)
+
+    def local_query(self, data):
+        df = DataFrame(data=data)
+        return df[df['a'] > 2]
+
+    def test_disabled_by_default(self):
+        self.assertFalse(ResultCache().enabled)
+        cache_module.result_cache.clear()
+        q = self.local_query(pd.DataFrame({'a': range(10)}))
+        self.assertFalse(cache_module.lookup(q))
+        cache_module.store(q, pd.DataFrame({'a': range(3, 10)}))
+        self.assertEqual(len(cache_module.result_cache), 0)
+
+    def test_hit_returns_copy(self):
+        cache = ResultCache(enabled=True)
+        with patch.object(cache_module, 'result_cache', cache):
+            jn = self.orders.merge(self.lineitem, left_on='oid', right_on='lid', how='inner')
+            first = jn[['oid', 'qty']]
+            self.assertFalse(cache_module.lookup(first))
+            result = pd.DataFrame({'oid': [1, 2], 'qty': [3, 4]})
+            cache_module.store(first, result)
+            result['qty'] = 0
+            for _ in range(2):
+                again = jn[['oid', 'qty']]
+                self.assertTrue(cache_module.lookup(again))
+                self.assertEqual(list(again.data['qty']), [3, 4])
+                again.data['qty'] = -1
+
+    def test_local_data_changed_in_place(self):
+        cache = ResultCache(enabled=True)
+        data = pd.DataFrame({'a': range(10)})
+        with patch.object(cache_module, 'result_cache', cache):
+            source = DataFrame(data=data)
+            fp = lineage_fingerprint(source)
+            data.loc[0, 'a'] = 100
+            self.assertNotEqual(fp, lineage_fingerprint(source))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+import unittest
+from unittest.mock import Mock
+
+from aidac.common.column import Column
+from aidac.dataframe.frame import DataFrame
+from aidac.dataframe.sql_builder import substitute, parenthesize
+
+
+class SQLBuilderTest(unittest.TestCase):
+    def remote_table(self, name, cols):
+        ds = Mock()
+        ds.job_name = 'mock job'
+        df = DataFrame(ds=ds, table_name=name, db_persistent=True)
+        df._columns_ = {c: Column(c, 'int', name, name, False) for c in cols}
+        return df
+
+    def setUp(self) -> None:
+        self.orders = self.remote_table('orders', ['oid', 'cust', 'price'])
+        self.lineitem = self.remote_table('lineitem', ['lid', 'qty'])
+
+    def test_substitute(self):
+        self.assertEqual(substitute("price > 10 AND cust = 'price'", {'price': '(p + 1)'}),
+                         "(p + 1) > 10 AND cust = 'price'")
+        self.assertEqual(parenthesize('(a + 1) * (b + 1)'), '((a + 1) * (b + 1))')
+        self.assertEqual(parenthesize('(a + 1)'), '(a + 1)')
+
+    def test_merge_layers(self):
+        df = self.orders.query('price > 10')[['oid', 'price']].sort_values('oid').head(5)
+        self.assertEqual(df.genSQL, 'SELECT oid AS oid, price AS price FROM orders WHERE price > 10 '
+                                    'ORDER BY oid asc LIMIT 5')
+
+    def test_expression_substituted(self):
+        df = self.orders[['oid', 'price']]
+        df = (df['price'] + 1).query('price > 5')
+        self.assertEqual(df.genSQL, 'SELECT (1+price) AS price FROM orders WHERE (1+price) > 5')
+
+    def test_filter_after_limit(self):
+        df = self.orders.head(5).query('price > 10')
+        self.assertEqual(df.genSQL, 'SELECT * FROM (SELECT * FROM orders LIMIT 5) {} WHERE price > 10'
+                         .format(df.transform.sources().table_name))
+
+    def test_filter_after_aggregate(self):
+        agg = self.orders[['price']].sum()
+        df = agg.query('price > 10')
+        self.assertEqual(df.genSQL, 'SELECT * FROM (SELECT sum(price) AS price FROM orders) {} WHERE price > 10'
+                         .format(agg.table_name))
+
+    def test_ordered_tail_reversed(self):
+        df = self.orders.sort_values('price')[['oid', 'price']].tail(3)
+        self.assertEqual(df.genSQL, 'SELECT * FROM (SELECT oid AS oid, price AS price FROM orders '
+                                    'ORDER BY price desc LIMIT 3) {} ORDER BY price asc'
+                         .format(df.transform.sources().table_name))
+        # the order key is not an output column, the rows are counted instead
+        df = self.orders.sort_values('price')[['oid']].tail(3)
+        self.assertIn('OFFSET GREATEST((SELECT COUNT(*) FROM orders) - 3, 0)', df.genSQL)
+
+    def test_unordered_tail_offset_not_negative(self):
+        df = self.orders.query('price > 10').tail(5)
+        self.assertEqual(df.genSQL, 'SELECT * FROM orders WHERE price > 10 LIMIT 5 '
+                                    'OFFSET GREATEST((SELECT COUNT(*) FROM orders WHERE price > 10) - 5, 0)')
+
+    def test_join_inlined(self):
+        jn = self.orders.query('price > 10').merge(self.lineitem, left_on='oid', right_on='lid', how='inner')
+        left = jn.transform.sources()[0].table_name
+        self.assertEqual(jn[['cust', 'qty']].genSQL,
+                         'SELECT {0}.cust AS cust, lineitem.qty AS qty FROM orders {0} INNER JOIN lineitem '
+                         'ON {0}.oid = lineitem.lid WHERE {0}.price > 10'.format(left))
+
+    def test_null_supplying_side_kept(self):
+        right = self.lineitem.query('qty > 1')
+        jn = self.orders.merge(right, left_on='oid', right_on='lid', how='left')
+        self.assertIn('LEFT OUTER JOIN (SELECT * FROM lineitem WHERE qty > 1) ' + right.table_name, jn.genSQL)
+        self.assertNotIn('WHERE', jn.genSQL.split(')')[-1])
+
+
+if __name__ == '__main__':
+    unittest.main()